@@ -0,0 +1,321 @@
+"""Benchmarks Hierarchy.simStep and Agent.simStep.
+
+Two fixed workloads are timed:
+
+    pred    Hierarchy on the demo sequence of MiniNeoRL_Pred_Demo.py, with every
+            4-bit entry tiled to the input width
+    pong    Agent on the Pong environment, with every observation bin encoded
+            into inputWidth / 5 bins as in MiniNeoRL_RL_Demo.py
+
+For each case the script reports steps per second, per-step latency percentiles
+and the peak memory traced during construction plus a short run. The default
+sweep varies one of layer size, depth, activeRatio and input width at a time
+around a base case; --grid runs every combination instead. --schedulers repeats
+every case with the layers run on a thread pool, see neo/Scheduler.py, and
+--layouts separate,fused with the fused weight layout, see neo/Layer.py.
+
+Results are written as JSON. Two result files can be compared case by case:
+
+    python MiniNeoRL_Benchmark.py run --output before.json
+    (change something)
+    python MiniNeoRL_Benchmark.py run --output after.json
+    python MiniNeoRL_Benchmark.py compare before.json after.json
+"""
+
+from neo.Agent import Agent
+from neo.Encoder import Encoder
+from neo.Hierarchy import Hierarchy
+from neo.Pong import Pong
+from neo.Scheduler import Scheduler
+from neo.Sequences import demoSequence
+import argparse
+import datetime
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import numpy as np
+
+resultFormatVersion = 1
+
+# Fields that identify a case, used to match cases between result files
+caseFields = [ "workload", "layerSize", "depth", "activeRatio", "inputWidth", "batchSize", "sparseLearn", "inPlace", "dtype", "scheduler", "threads", "fused" ]
+
+# Values of case fields added after results were first recorded, used for older result files
+caseFieldDefaults = { "fused": False }
+
+def parseList(convert):
+    return lambda text: [ convert(v) for v in text.split(",") ]
+
+class PredWorkload:
+    def __init__(self, case):
+        self._case = case
+
+        repeats = -(-case["inputWidth"] // 4)
+
+        sequence = np.array(demoSequence, dtype=np.float64)
+
+        self._inputs = np.repeat(np.tile(sequence, (1, repeats))[:, :case["inputWidth"], None], case["batchSize"], axis=2)
+
+        self._model = Hierarchy(case["inputWidth"], [ case["layerSize"] ] * case["depth"], -0.01, 0.01, case["activeRatio"], case["batchSize"], True, case["sparseLearn"], case["inPlace"], np.dtype(case["dtype"]), fused=case["fused"])
+
+        self._t = 0
+
+    def step(self):
+        self._model.simStep(self._inputs[self._t % len(self._inputs)], 0.0001, 0.0001, 0.001, 0.001, 0.95)
+
+        self._t += 1
+
+class PongWorkload:
+    def __init__(self, case):
+        self._case = case
+
+        self._encoder = Encoder(Pong.numObservations, max(1, case["inputWidth"] // Pong.numObservations))
+
+        self._env = Pong(case["batchSize"], 0)
+
+        self._input = np.zeros((self._encoder.getNumOutputs(), case["batchSize"]))
+
+        self._model = Agent(len(self._input), 1, [ case["layerSize"] ] * case["depth"], -0.1, 0.1, case["activeRatio"], case["batchSize"], True, case["sparseLearn"], case["inPlace"], np.dtype(case["dtype"]), fused=case["fused"])
+
+    def step(self):
+        observations, rewards = self._env.step(self._model.getActions()[0])
+
+        self._encoder.encode(observations, out=self._input)
+
+        self._model.simStep(rewards, 0.001, 0.95, 0.05, self._input, 0.001, 0.001, 0.01, 0.01, 0.92)
+
+workloads = { "pred": PredWorkload, "pong": PongWorkload }
+
+def createWorkload(case):
+    workload = workloads[case["workload"]](case)
+
+    if case["scheduler"] != "none":
+        workload._model.setScheduler(Scheduler(case["scheduler"], case["threads"]))
+
+    return workload
+
+def runCase(case, numSteps, numWarmupSteps, numMemorySteps):
+    np.random.seed(0)
+
+    workload = createWorkload(case)
+
+    for i in range(0, numWarmupSteps):
+        workload.step()
+
+    latencies = np.zeros(numSteps)
+
+    start = time.perf_counter()
+
+    for i in range(0, numSteps):
+        stepStart = time.perf_counter()
+
+        workload.step()
+
+        latencies[i] = time.perf_counter() - stepStart
+
+    total = time.perf_counter() - start
+
+    # Shuts down the scheduler's threads
+    workload._model.setScheduler(None)
+
+    # Memory is traced in a separate run, since tracing slows the steps down
+    np.random.seed(0)
+
+    tracemalloc.start()
+
+    workload = createWorkload(case)
+
+    constructionPeak = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.reset_peak()
+
+    base = tracemalloc.get_traced_memory()[0]
+
+    for i in range(0, numMemorySteps):
+        workload.step()
+
+    stepPeak = tracemalloc.get_traced_memory()[1] - base
+
+    tracemalloc.stop()
+
+    workload._model.setScheduler(None)
+
+    result = dict(case)
+
+    result["steps"] = numSteps
+    result["stepsPerSecond"] = numSteps / total
+    result["instanceStepsPerSecond"] = numSteps * case["batchSize"] / total
+    result["latencyMs"] = { name: float(np.percentile(latencies, q)) * 1000.0 for name, q in [ ("p50", 50), ("p90", 90), ("p99", 99), ("max", 100) ] }
+    result["peakMemoryBytes"] = constructionPeak
+    result["peakStepMemoryBytes"] = stepPeak
+
+    return result
+
+def sweepCases(args):
+    base = { "layerSize": args.base_size, "depth": args.base_depth, "activeRatio": args.base_active_ratio, "inputWidth": args.base_input_width }
+
+    axes = { "layerSize": args.sizes, "depth": args.depths, "activeRatio": args.active_ratios, "inputWidth": args.input_widths }
+
+    points = []
+
+    if args.grid:
+        for values in itertools.product(*axes.values()):
+            points.append(dict(zip(axes.keys(), values)))
+    else:
+        points.append(base)
+
+        for name, values in axes.items():
+            for value in values:
+                point = dict(base)
+                point[name] = value
+
+                if point not in points:
+                    points.append(point)
+
+    cases = []
+
+    for workload in args.workloads:
+        for point in points:
+            case = { "workload": workload }
+            case.update(point)
+            case.update({ "batchSize": args.batch_size, "sparseLearn": args.sparse_learn, "inPlace": args.in_place, "dtype": args.dtype })
+
+            for scheduler in args.schedulers:
+                for layout in args.layouts:
+                    schedulerCase = dict(case)
+                    schedulerCase.update({ "scheduler": scheduler, "threads": args.threads if scheduler != "none" else 1, "fused": layout == "fused" })
+
+                    cases.append(schedulerCase)
+
+    return cases
+
+def revision():
+    try:
+        return subprocess.check_output([ "git", "rev-parse", "--short", "HEAD" ], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run(args):
+    cases = sweepCases(args)
+
+    results = []
+
+    for i in range(0, len(cases)):
+        result = runCase(cases[i], args.steps, args.warmup, args.memory_steps)
+
+        results.append(result)
+
+        print("[%d/%d] %s size %d depth %d ratio %g width %d %s: %.1f steps/s, p50 %.3f ms, p99 %.3f ms, peak %.1f MB" % (i + 1, len(cases),
+            result["workload"], result["layerSize"], result["depth"], result["activeRatio"], result["inputWidth"], result["scheduler"] + (" fused" if result["fused"] else ""),
+            result["stepsPerSecond"], result["latencyMs"]["p50"], result["latencyMs"]["p99"], result["peakMemoryBytes"] / 1e6))
+
+    output = {
+        "version": resultFormatVersion,
+        "meta": {
+            "revision": revision(),
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "platform": platform.platform()
+        },
+        "results": results
+    }
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=1)
+
+def caseKey(result):
+    return tuple(result.get(k, caseFieldDefaults.get(k)) for k in caseFields)
+
+def compare(args):
+    with open(args.before) as f:
+        before = json.load(f)
+
+    with open(args.after) as f:
+        after = json.load(f)
+
+    beforeCases = { caseKey(r): r for r in before["results"] }
+
+    print("%-44s %12s %12s %8s %10s %10s" % ("case", "before/s", "after/s", "speedup", "p50 ms", "p99 ms"))
+
+    numRegressions = 0
+
+    for r in after["results"]:
+        key = caseKey(r)
+
+        if key not in beforeCases:
+            continue
+
+        b = beforeCases[key]
+
+        speedup = r["stepsPerSecond"] / b["stepsPerSecond"]
+
+        flag = ""
+
+        if speedup < 1.0 - args.threshold:
+            flag = " slower"
+
+            numRegressions += 1
+        elif speedup > 1.0 + args.threshold:
+            flag = " faster"
+
+        name = "%s s%d d%d r%g w%d %s" % (r["workload"], r["layerSize"], r["depth"], r["activeRatio"], r["inputWidth"], r["scheduler"] + (" fused" if r.get("fused") else ""))
+
+        print("%-44s %12.1f %12.1f %7.2fx %4.3f->%-4.3f %4.3f->%-4.3f%s" % (name, b["stepsPerSecond"], r["stepsPerSecond"], speedup,
+            b["latencyMs"]["p50"], r["latencyMs"]["p50"], b["latencyMs"]["p99"], r["latencyMs"]["p99"], flag))
+
+    print("%s (%s) -> %s (%s): %d regression(s) beyond %d%%" % (args.before, before["meta"]["revision"], args.after, after["meta"]["revision"], numRegressions, args.threshold * 100))
+
+    return 1 if numRegressions > 0 else 0
+
+def main():
+    """Parses the command line and runs or compares, returning the exit status"""
+    parser = argparse.ArgumentParser(description="Benchmarks Hierarchy.simStep and Agent.simStep")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    runParser = commands.add_parser("run", help="run the benchmark sweep")
+    runParser.add_argument("--output", help="JSON file to write the results to")
+    runParser.add_argument("--workloads", type=parseList(str), default=[ "pred", "pong" ])
+    runParser.add_argument("--sizes", type=parseList(int), default=[ 50, 200, 800 ])
+    runParser.add_argument("--depths", type=parseList(int), default=[ 1, 2, 4 ])
+    runParser.add_argument("--active-ratios", type=parseList(float), default=[ 0.05, 0.1, 0.2 ])
+    runParser.add_argument("--input-widths", type=parseList(int), default=[ 4, 50, 200 ])
+    runParser.add_argument("--base-size", type=int, default=200)
+    runParser.add_argument("--base-depth", type=int, default=2)
+    runParser.add_argument("--base-active-ratio", type=float, default=0.1)
+    runParser.add_argument("--base-input-width", type=int, default=50)
+    runParser.add_argument("--grid", action="store_true", help="run every combination instead of one axis at a time")
+    runParser.add_argument("--batch-size", type=int, default=1)
+    runParser.add_argument("--sparse-learn", action="store_true")
+    runParser.add_argument("--in-place", action="store_true")
+    runParser.add_argument("--dtype", default="float64")
+    runParser.add_argument("--schedulers", type=parseList(str), default=[ "none" ], help="comma separated: none, concurrentLearn, pipelined")
+    runParser.add_argument("--threads", type=int, default=4, help="threads per scheduler")
+    runParser.add_argument("--layouts", type=parseList(str), default=[ "separate" ], help="comma separated weight layouts: separate, fused")
+    runParser.add_argument("--steps", type=int, default=500, help="timed steps per case")
+    runParser.add_argument("--warmup", type=int, default=50, help="untimed steps before timing")
+    runParser.add_argument("--memory-steps", type=int, default=20, help="steps run under tracemalloc")
+
+    compareParser = commands.add_parser("compare", help="compare two result files")
+    compareParser.add_argument("before")
+    compareParser.add_argument("after")
+    compareParser.add_argument("--threshold", type=float, default=0.1, help="relative change reported as faster or slower")
+
+    args = parser.parse_args()
+
+    if args.command == "run":
+        run(args)
+
+        return 0
+
+    return compare(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+"""Trains one Agent on Pong with many worker processes sharing its weights, see neo/Hogwild.py.
+
+Examples:
+
+    python MiniNeoRL_Hogwild.py --workers 8 --time-limit 600 --save pong.npz
+    python MiniNeoRL_Hogwild.py --workers 1,2,4,8 --target-reward 0.2 --time-limit 1800
+
+With a list of worker counts every count trains a fresh agent from the same
+seed, and the wall-clock times to the target reward are compared at the end.
+"""
+
+from neo import Hogwild
+from neo import Sweep
+from neo.Agent import Agent
+from neo.Encoder import Encoder
+from neo.Pong import Pong
+import argparse
+import os
+
+def report(window):
+    print("%7.1fs %10d steps %8.0f steps/s  average reward %.4f" % (window["time"], window["steps"], window["stepsPerSecond"], window["averageReward"]))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hogwild training of an Agent on Pong over worker processes")
+
+    parser.add_argument("--workers", type=lambda text: [ int(v) for v in text.split(",") ], default=[ os.cpu_count() ], help="worker count, or comma separated counts to compare")
+    parser.add_argument("--steps", type=int, help="stop after this many environment steps of all workers")
+    parser.add_argument("--target-reward", type=float, help="stop once a report window reaches this average reward")
+    parser.add_argument("--time-limit", type=float, help="stop after this many seconds")
+    parser.add_argument("--locks", action="store_true", help="serialize the updates of every layer with a lock")
+    parser.add_argument("--batch-size", type=int, default=1, help="games stepped at once by every worker")
+    parser.add_argument("--fused", action="store_true")
+    parser.add_argument("--sparse-learn", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-interval", type=float, default=5.0, help="seconds between reports")
+    parser.add_argument("--blas-threads", type=int, default=1, help="BLAS threads per worker")
+    parser.add_argument("--save", help="checkpoint to write the trained agent to")
+
+    args = parser.parse_args()
+
+    if args.steps is None and args.target_reward is None and args.time_limit is None:
+        parser.error("give at least one of --steps, --target-reward and --time-limit")
+
+    config = Sweep.pongDefaults
+
+    results = []
+
+    for numWorkers in args.workers:
+        encoder = Encoder(Pong.numObservations, config["encoderSize"])
+
+        agent = Agent(encoder.getNumOutputs(), 1, config["layerSizes"], config["initMinWeight"], config["initMaxWeight"], config["activeRatio"], args.batch_size,
+            sparseLearn=args.sparse_learn, fused=args.fused, seed=args.seed)
+
+        print("%d worker(s)" % numWorkers)
+
+        metrics = Hogwild.train(agent, numWorkers, config, args.steps, args.target_reward, args.time_limit, args.locks, args.report_interval, args.seed, report, args.blas_threads)
+
+        print("%d steps in %.1fs (%.0f steps/s), average reward %.4f, steps per worker %s" % (metrics["steps"], metrics["seconds"], metrics["stepsPerSecond"], metrics["averageReward"], metrics["workerSteps"]))
+
+        results.append((numWorkers, metrics))
+
+        if args.save is not None:
+            agent.save(args.save)
+
+    if len(results) > 1:
+        print("%8s %12s %12s %16s" % ("workers", "steps/s", "reward", "time to target"))
+
+        for numWorkers, metrics in results:
+            timeToTarget = "%.1fs" % metrics["timeToTarget"] if metrics["timeToTarget"] is not None else "-"
+
+            print("%8d %12.0f %12.4f %16s" % (numWorkers, metrics["stepsPerSecond"], metrics["averageReward"], timeToTarget))
@@ -0,0 +1,117 @@
+"""Checks that reduced precision storage keeps learning comparable to float64.
+
+Runs the prediction task of MiniNeoRL_Pred_Demo.py and a small reinforcement
+learning task with the same seeds in three configurations:
+
+    float64                   the reference
+    float32                   float32 weights, states, traces and temporaries
+    float32 + float16 traces  float32 compute with float16 trace storage
+
+and prints the running average prediction error and average reward at regular
+intervals, averaged over several seeds. The exact trajectories differ (a single
+flipped winner in the inhibition changes everything after it), so the check
+compares learning curves rather than states. For each task and configuration
+the script prints the deviation of the second half mean (averaged over seeds)
+from the float64 one, and the allowed deviation: tolerance below (0.05) or
+twice the standard deviation of the float64 second half means across seeds,
+whichever is larger. A configuration is comparable when both its prediction
+error and its reward deviations are within their allowed values, and the
+script exits with status 1 if any configuration is not.
+
+Usage: python MiniNeoRL_Precision_Check.py [numSteps] [numSeeds]
+"""
+
+from neo.Agent import Agent
+from neo.Hierarchy import Hierarchy
+from neo.Sequences import demoSequence
+import numpy as np
+import sys
+
+numSteps = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+numSeeds = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+reportInterval = numSteps // 10
+
+# Smallest allowed deviation of the second half means from float64
+tolerance = 0.05
+
+configurations = [
+        ("float64", np.float64, None),
+        ("float32", np.float32, None),
+        ("float32 + float16 traces", np.float32, np.float16)
+    ]
+
+def predictionCurve(dtype, traceDtype, seed):
+    np.random.seed(seed)
+
+    h = Hierarchy(4, [ 40, 40, 40 ], -0.01, 0.01, 0.1, dtype=dtype, traceDtype=traceDtype)
+
+    sequence = np.array(demoSequence)
+
+    averageError = 0.0
+
+    curve = []
+
+    for i in range(0, numSteps):
+        h.simStep(sequence[i % len(sequence)].reshape(-1, 1), 0.0001, 0.0001, 0.001, 0.001, 0.95)
+
+        error = 0.0 if np.array_equal(h.getPrediction().ravel() > 0.5, sequence[(i + 1) % len(sequence)] > 0.5) else 1.0
+
+        averageError = 0.99 * averageError + 0.01 * error
+
+        if (i + 1) % reportInterval == 0:
+            curve.append(averageError)
+
+    return np.array(curve)
+
+def rewardCurve(dtype, traceDtype, seed):
+    """Average reward on a task that pays when the action sign matches a target side that switches every 50 steps"""
+    np.random.seed(seed)
+
+    a = Agent(2, 1, [ 40, 40 ], -0.1, 0.1, 0.1, dtype=dtype, traceDtype=traceDtype)
+
+    averageReward = 0.0
+
+    curve = []
+
+    for i in range(0, numSteps):
+        target = 1.0 if (i // 50) % 2 == 0 else -1.0
+
+        reward = 1.0 if a.getActions().item(0) * target > 0.0 else 0.0
+
+        a.simStep(reward, 0.01, 0.95, 0.05, np.array([[ target < 0.0 ], [ target > 0.0 ]], dtype=np.float64), 0.001, 0.001, 0.01, 0.01, 0.92)
+
+        averageReward = 0.99 * averageReward + 0.01 * reward
+
+        if (i + 1) % reportInterval == 0:
+            curve.append(averageReward)
+
+    return np.array(curve)
+
+# (configuration, seed, report) curves
+errorCurves = np.array([ [ predictionCurve(dtype, traceDtype, seed) for seed in range(0, numSeeds) ] for name, dtype, traceDtype in configurations ])
+rewardCurves = np.array([ [ rewardCurve(dtype, traceDtype, seed) for seed in range(0, numSeeds) ] for name, dtype, traceDtype in configurations ])
+
+print("step      " + "".join("%28s" % name for name, dtype, traceDtype in configurations))
+
+for i in range(0, errorCurves.shape[2]):
+    print("%-10d" % ((i + 1) * reportInterval) + "".join("%14.3f err %5.3f rew" % (errorCurves[c, :, i].mean(), rewardCurves[c, :, i].mean()) for c in range(0, len(configurations))))
+
+def deviation(curves, c):
+    """Difference of the second half means of configuration c from float64, and the allowed difference"""
+    secondHalf = curves[:, :, curves.shape[2] // 2:].mean(axis=2)
+
+    return abs(secondHalf[c].mean() - secondHalf[0].mean()), max(tolerance, 2.0 * secondHalf[0].std())
+
+comparable = True
+
+for c in range(1, len(configurations)):
+    errorDeviation, errorAllowed = deviation(errorCurves, c)
+    rewardDeviation, rewardAllowed = deviation(rewardCurves, c)
+
+    ok = errorDeviation <= errorAllowed and rewardDeviation <= rewardAllowed
+
+    comparable = comparable and ok
+
+    print("%s: error deviation %.3f (allowed %.3f), reward deviation %.3f (allowed %.3f) -> %s" % (configurations[c][0], errorDeviation, errorAllowed, rewardDeviation, rewardAllowed, "comparable" if ok else "NOT comparable"))
+
+sys.exit(0 if comparable else 1)
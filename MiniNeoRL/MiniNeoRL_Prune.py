@@ -0,0 +1,86 @@
+"""Prunes a trained Hierarchy and reports memory, inference speed and accuracy, see neo/Prune.py.
+
+Examples:
+
+    python MiniNeoRL_Prune.py --method magnitude --amounts 0.5,0.8,0.9,0.95
+    python MiniNeoRL_Prune.py --load trained.npz --data sequence.npy --method topk --amounts 64,32,16
+
+The hierarchy is trained on the demo sequence for --train-steps (or loaded
+from --load) and evaluated on the next --holdout steps. With --data the last
+--holdout input vectors are held out and the rest is used for training. Every
+pruned copy starts from the trained state, and is compared with the dense
+hierarchy stepped from the same state.
+
+Pruning saves memory at any layer size, but the sparse products only infer
+faster than dense ones for large layers pruned to about 10% of their weights or
+fewer (at the default sizes pruned inference is slower), see neo/LayerSparse.py.
+A checkpoint written with --save can be loaded and pruned further.
+"""
+
+from neo.Hierarchy import Hierarchy
+from neo.Sequences import demoSequence
+from neo import Prune
+import argparse
+import numpy as np
+
+def parseList(convert):
+    return lambda text: [ convert(v) for v in text.split(",") ]
+
+def numWeights(hierarchy):
+    return sum(layer.getNumWeights() if hasattr(layer, "getNumWeights") else sum(getattr(layer, name).size for name in layer._parameterNames()) for layer in hierarchy._layers)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prunes a trained Hierarchy and compares it with the dense one")
+
+    parser.add_argument("--method", choices=[ "magnitude", "topk" ], default="magnitude")
+    parser.add_argument("--amounts", type=parseList(float), default=[ 0.5, 0.8, 0.9, 0.95 ], help="fractions dropped (magnitude) or weights kept per row (topk)")
+    parser.add_argument("--load", help="checkpoint of a trained hierarchy")
+    parser.add_argument("--data", help=".npy input sequence, one input vector per row")
+    parser.add_argument("--layer-sizes", type=parseList(int), default=[ 40, 40, 40 ])
+    parser.add_argument("--train-steps", type=int, default=20000)
+    parser.add_argument("--holdout", type=int, default=2000, help="held-out steps to evaluate on")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="checkpoint to write the last pruned hierarchy to")
+
+    args = parser.parse_args()
+
+    if args.data is not None:
+        data = np.load(args.data, mmap_mode="r")
+
+        train, holdout = data[:-args.holdout], data[-args.holdout:]
+    else:
+        data = np.array(demoSequence, dtype=np.float64)[np.arange(args.train_steps + args.holdout) % len(demoSequence)]
+
+        train, holdout = data[:args.train_steps], data[args.train_steps:]
+
+    if args.load is not None:
+        h = Hierarchy.load(args.load)
+    else:
+        h = Hierarchy(train.shape[1], args.layer_sizes, -0.01, 0.01, 0.1, seed=args.seed)
+
+        print("Training on %d steps" % len(train))
+
+        h.fit(train, 0.0001, 0.0001, 0.001, 0.001, 0.95, reportInterval=None)
+
+    dense = h.fork().evaluate(holdout)
+
+    denseBytes = Prune.weightBytes(h)
+    denseWeights = numWeights(h)
+
+    print("%-12s %12s %10s %10s %12s %8s %10s %10s" % ("amount", "weights", "MB", "memory", "steps/s", "speedup", "error", "bit error"))
+    print("%-12s %12d %10.3f %9.1f%% %12.0f %7.2fx %10.4f %10.4f" % ("dense", denseWeights, denseBytes / 1e6, 100.0, dense["stepsPerSecond"], 1.0, dense["errorRate"], dense["bitErrorRate"]))
+
+    for amount in args.amounts:
+        pruned = h.prune(args.method, int(amount) if args.method == "topk" else amount)
+
+        metrics = pruned.evaluate(holdout)
+
+        prunedBytes = Prune.weightBytes(pruned)
+
+        print("%-12g %12d %10.3f %9.1f%% %12.0f %7.2fx %10.4f %10.4f" % (amount, numWeights(pruned), prunedBytes / 1e6, 100.0 * prunedBytes / denseBytes,
+            metrics["stepsPerSecond"], metrics["stepsPerSecond"] / dense["stepsPerSecond"], metrics["errorRate"], metrics["bitErrorRate"]))
+
+    print("Pruning saves memory at any size, but only speeds up inference of large layers (hundreds of units) pruned to about 10% of their weights or fewer")
+
+    if args.save is not None:
+        pruned.save(args.save)
@@ -1,145 +1,165 @@
-from neo.Agent import Agent
-from neo.Hierarchy import Hierarchy
-import numpy as np
-import pygame
-
-# The environment
-displayWidth = 600
-displayHeight = 600
-
-ballPosition = np.array([ np.random.rand(), np.random.rand() * 0.5 + 0.5 ])
-
-ballVelocity = np.array([ 0.353, 1.0 ]) * 0.04
-
-paddleX = 0.5
-
-ballRadius = 16.0 / displayWidth
-paddleRadius = 64.0 / displayWidth
-
-encoderSize = 10
-numInputs = 5
-numActions = 1
-
-a = Agent(numInputs * encoderSize, numActions, [ 50, 50 ], -0.1, 0.1, 0.1)
-
-averageReward = 0.0
-
-reward = 0.0
-prevReward = 0.0
-
-rewardPunishmentTime = 2.0
-punishmentTimer = 0.0
-rewardTimer = 0.0
-
-# Resources
-ballImage = pygame.image.load("ball.png")
-paddleImage = pygame.image.load("paddle.png")
-
-# Game setup
-pygame.init()
-
-display = pygame.display.set_mode((displayWidth, displayHeight))
-clock = pygame.time.Clock()
-done = False
-
-dir = 1.0
-
-timer = 0.0
-
-while not done:
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            done = True
-        
-        if event.type == pygame.KEYDOWN:
-            if event.key == pygame.K_LEFT:
-                dir = -1.0
-            if event.key == pygame.K_RIGHT:
-                dir = 1.0
-
-    # Update physics
-    ballPosition += ballVelocity
-    #timer += 1.0
-    #ballPosition[0] = np.sin(timer * 0.05) * 0.5 + 0.5
-    #ballPosition[1] = 0.5
-
-    if ballPosition[0] < 0.0:
-        ballPosition[0] = 0.0
-        ballVelocity[0] *= -1.0
-    elif ballPosition[0] > 1.0:
-        ballPosition[0] = 1.0
-        ballVelocity[0] *= -1.0
-
-    if ballPosition[1] < 32.0 / displayWidth:       
-        # If hit paddle
-        if ballPosition[0] + ballRadius > paddleX - paddleRadius and ballPosition[0] - ballRadius < paddleX + paddleRadius:
-            rewardTimer = rewardPunishmentTime
-
-            # Bounce ball
-            ballPosition[1] = 32.0 / displayWidth
-            ballVelocity[1] *= -1.0
-        else:
-            punishmentTimer = rewardPunishmentTime
-
-            # Reset ball
-            ballPosition = np.array([ np.random.rand(), np.random.rand() * 0.5 + 0.5 ])
-
-            if np.random.rand() < 0.5:
-                ballVelocity = np.array([ 0.353, 1.0 ]) * 0.04
-            else:
-                ballVelocity = np.array([ -0.353, 1.0 ]) * 0.04
-
-    elif ballPosition[1] > 1.0:
-        ballPosition[1] = 1.0
-        ballVelocity[1] *= -1.0
-
-    reward = (rewardTimer > 0.0)# - (punishmentTimer > 0.0)
-
-    #reward = reward * 0.5 + 0.5
-
-    averageReward = 0.99 * averageReward + 0.01 * reward
-
-    # Control
-    inputs = [ paddleX * 2.0 - 1.0, ballPosition[0] * 2.0 - 1.0, ballPosition[1] * 2.0 - 1.0, ballVelocity[0] * 30.0, ballVelocity[1] * 30.0 ]
-
-    assert(len(inputs) == numInputs)
-
-    inputArr = []
-
-    encoderSharpness = 30.0
-
-    for v in inputs:
-        for i in range(0, encoderSize):
-            center = i / encoderSize * 2.0 - 1.0
-            delta = center - v
-            #intensity = np.exp(-delta * delta * encoderSharpness)
-
-            intensity = np.absolute(delta) < 0.5 / encoderSize
-
-            inputArr.append(intensity)
-
-    #reward = dir * paddleX * 0.01
-
-    #reward = np.abs(paddleX - ballPosition[0]) < 0.1
-
-    a.simStep(reward, 0.001, 0.95, 0.05, np.matrix([inputArr]).T, 0.001, 0.001, 0.01, 0.01, 0.92)
-
-    print(a._prevValue)
-
-    prevReward = reward
-
-    if rewardTimer > 0.0:
-        rewardTimer -= 1.0
-    if punishmentTimer > 0.0:
-        punishmentTimer -= 1.0
-
-    paddleX = np.minimum(1.0, np.maximum(0.0, paddleX + 0.2 * np.sum(a.getActions()) / numActions))
-
-    # Render
-    display.fill((255,255,255))
-
-    display.blit(paddleImage, (displayWidth * paddleX - 64.0, displayHeight - 32.0))
-    display.blit(ballImage, (displayWidth * ballPosition[0] - 16.0, displayHeight * (1.0 - ballPosition[1]) - 16.0))
-
-    pygame.display.flip()
-    clock.tick(60)
+"""An Agent learning to play Pong, see neo/Pong.py.
+
+By default the agent and the game run as fast as they can on a simulation
+thread. The main thread draws the latest game state in the window at its frame
+rate, taking a copy of the positions every --render-interval steps, and prints
+the progress every --log-interval steps. Neither waits for the other, so the
+display and the terminal do not slow training down.
+
+    python MiniNeoRL_RL_Demo.py                      watch while training at full speed
+    python MiniNeoRL_RL_Demo.py --realtime           one step per frame at 60 fps, to watch the game at its speed
+    python MiniNeoRL_RL_Demo.py --headless --steps 1000000 --save pong.npz
+"""
+
+from neo.Agent import Agent
+from neo.Encoder import Encoder
+from neo.Pong import Pong
+import argparse
+import queue
+import threading
+import time
+import numpy as np
+
+encoderSize = 10
+numInputs = Pong.numObservations
+numActions = 1
+
+class Demo:
+    """The game, the agent and the progress shared with the main thread"""
+
+    def __init__(self, load = None):
+        self._env = Pong()
+
+        # Bin code of every observation, pass gaussian=True for a Gaussian code
+        self._encoder = Encoder(numInputs, encoderSize)
+        self._encoded = np.zeros((self._encoder.getNumOutputs(), 1))
+
+        self._agent = Agent.load(load) if load is not None else Agent(self._encoder.getNumOutputs(), numActions, [ 50, 50 ], -0.1, 0.1, 0.1)
+
+        self._averageReward = 0.0
+
+        self._numSteps = 0
+
+        self._logStart = (time.perf_counter(), 0)
+
+        # The positions to draw, replaced as a whole by the simulation thread
+        self._frame = self.positions()
+
+        # Log lines for the main thread to print
+        self._log = queue.Queue()
+
+    def step(self):
+        # Update physics
+        inputs, rewards = self._env.step(np.sum(self._agent.getActions(), axis=0) / numActions)
+
+        reward = rewards.item(0)
+
+        self._averageReward = 0.99 * self._averageReward + 0.01 * reward
+
+        # Control
+        self._agent.simStep(reward, 0.001, 0.95, 0.05, self._encoder.encode(inputs, out=self._encoded), 0.001, 0.001, 0.01, 0.01, 0.92)
+
+        self._numSteps += 1
+
+    def positions(self):
+        """Paddle and ball positions of the game"""
+        return (float(self._env._paddleX[0]), float(self._env._ballX[0]), float(self._env._ballY[0]))
+
+    def logLine(self):
+        """Progress since the previous log line"""
+        now = time.perf_counter()
+
+        start, startStep = self._logStart
+
+        self._logStart = (now, self._numSteps)
+
+        return "Step %d value %.4f average reward %.4f steps/s %.0f" % (self._numSteps, self._agent._prevValue.item(0), self._averageReward, (self._numSteps - startStep) / max(now - start, 1e-9))
+
+    def simulate(self, numSteps, renderInterval, logInterval, stop):
+        """Steps until numSteps (0 runs until stop is set), publishing a frame and a log line at their intervals"""
+        while not stop.is_set() and (numSteps == 0 or self._numSteps < numSteps):
+            self.step()
+
+            if renderInterval > 0 and self._numSteps % renderInterval == 0:
+                self._frame = self.positions()
+
+            if logInterval > 0 and self._numSteps % logInterval == 0:
+                self._log.put(self.logLine())
+
+        stop.set()
+
+    def printLog(self):
+        while not self._log.empty():
+            print(self._log.get())
+
+    def runRealtime(self, renderer, numSteps, logInterval):
+        """One step per frame on the main thread"""
+        while numSteps == 0 or self._numSteps < numSteps:
+            self.step()
+
+            if logInterval > 0 and self._numSteps % logInterval == 0:
+                print(self.logLine())
+
+            # Render
+            if not renderer.render(self._env):
+                break
+
+    def runThreaded(self, renderer, numSteps, renderInterval, logInterval):
+        """Simulates on a thread while the main thread renders (if a renderer is given) and prints the log"""
+        stop = threading.Event()
+
+        simulation = threading.Thread(target=self.simulate, args=(numSteps, renderInterval, logInterval, stop))
+        simulation.start()
+
+        try:
+            while not stop.is_set():
+                if renderer is not None:
+                    if not renderer.renderPositions(*self._frame):
+                        stop.set()
+                else:
+                    stop.wait(0.1)
+
+                self.printLog()
+        finally:
+            stop.set()
+
+            simulation.join()
+
+        self.printLog()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="An Agent learning to play Pong")
+
+    parser.add_argument("--headless", action="store_true", help="no window, only the log")
+    parser.add_argument("--realtime", action="store_true", help="step once per frame at 60 fps on the main thread")
+    parser.add_argument("--fps", type=int, default=60, help="frame rate of the window")
+    parser.add_argument("--render-interval", type=int, default=1, help="steps between copies of the game state for the window")
+    parser.add_argument("--log-interval", type=int, default=1000, help="steps between log lines, 0 for none")
+    parser.add_argument("--steps", type=int, default=0, help="steps to run, 0 until the window is closed or interrupted")
+    parser.add_argument("--load", help="checkpoint of the agent to continue from")
+    parser.add_argument("--save", help="checkpoint to write the agent to at the end")
+
+    args = parser.parse_args()
+
+    demo = Demo(args.load)
+
+    renderer = None
+
+    if not args.headless:
+        from neo.PongRenderer import PongRenderer
+
+        renderer = PongRenderer(600, 600, args.fps)
+
+    try:
+        if args.realtime and renderer is not None:
+            demo.runRealtime(renderer, args.steps, args.log_interval)
+        else:
+            demo.runThreaded(renderer, args.steps, args.render_interval, args.log_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if renderer is not None:
+            renderer.close()
+
+    if args.save is not None:
+        demo._agent.save(args.save)
@@ -0,0 +1,64 @@
+"""Hyperparameter sweeps over worker processes, see neo/Sweep.py.
+
+Examples:
+
+    python MiniNeoRL_Sweep.py pred --grid "{\"activeRatio\": [0.05, 0.1, 0.2], \"learnDecoderRate\": [0.001, 0.01]}" --output pred.csv
+    python MiniNeoRL_Sweep.py pong --grid grid.json --seeds 0,1,2,3 --steps 20000 --processes 8
+
+--grid is a JSON object of parameter names to lists of values (or the name of a
+file holding one). Parameters that are not in the grid keep the demo defaults.
+The pred workload trains on --data (a .npy array of input vectors, one per row)
+or on the demo sequence repeated to --steps.
+"""
+
+from neo import Sweep
+from neo.Sequences import demoSequence
+import argparse
+import json
+import os
+import numpy as np
+
+def parseGrid(text):
+    if os.path.isfile(text):
+        with open(text) as f:
+            return json.load(f)
+
+    return json.loads(text)
+
+def report(numDone, numTasks):
+    print("%d/%d runs done" % (numDone, numTasks))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs Hierarchy or Agent configurations over a process pool")
+
+    parser.add_argument("workload", choices=[ "pred", "pong" ])
+    parser.add_argument("--grid", type=parseGrid, default={}, help="JSON object (or file) of parameter name to list of values")
+    parser.add_argument("--seeds", type=lambda text: [ int(v) for v in text.split(",") ], default=[ 0, 1, 2 ])
+    parser.add_argument("--steps", type=int, default=10000)
+    parser.add_argument("--report-interval", type=int, default=1000)
+    parser.add_argument("--data", help=".npy input sequence for the pred workload, memory mapped")
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--blas-threads", type=int, default=1, help="BLAS threads per worker")
+    parser.add_argument("--output", default="sweep.csv", help="CSV results table")
+
+    args = parser.parse_args()
+
+    configurations = Sweep.gridConfigurations(args.workload, args.grid)
+
+    data = None
+
+    if args.workload == "pred":
+        if args.data is not None:
+            data = np.load(args.data, mmap_mode="r")
+        else:
+            data = np.array(demoSequence, dtype=np.float64)[np.arange(args.steps) % len(demoSequence)]
+
+    rows = Sweep.runSweep(args.workload, configurations, args.seeds, args.steps, args.report_interval, data, args.processes, args.blas_threads, report)
+
+    Sweep.writeCsv(rows, args.output)
+
+    # Best configurations first
+    rows.sort(key=lambda row: row["final"], reverse=args.workload == "pong")
+
+    for row in rows:
+        print("final %.4f +- %.4f  %s" % (row["final"], row["finalStd"], { name: row[name] for name in args.grid }))
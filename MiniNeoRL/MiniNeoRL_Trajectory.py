@@ -0,0 +1,108 @@
+"""Records Agent runs on Pong to a trajectory file and replays them offline, see neo/Trajectory.py.
+
+Examples:
+
+    python MiniNeoRL_Trajectory.py record pong.traj --steps 100000 --save recorded.npz
+    python MiniNeoRL_Trajectory.py replay pong.traj --save pretrained.npz
+
+record runs a fresh agent (or --load one) on the headless Pong and appends every
+step to the trajectory. replay steps a fresh agent (or --load one) through the
+trajectory with the logged actions and reports the replay speed and how far the
+agent's own actions are from the logged ones.
+"""
+
+from neo import Sweep
+from neo import Trajectory
+from neo.Agent import Agent
+from neo.Encoder import Encoder
+from neo.Pong import Pong
+import argparse
+import time
+import numpy as np
+
+def createAgent(args, encoder):
+    if args.load is not None:
+        return Agent.load(args.load)
+
+    config = Sweep.pongDefaults
+
+    return Agent(encoder.getNumOutputs(), 1, config["layerSizes"], config["initMinWeight"], config["initMaxWeight"], config["activeRatio"], args.batch_size, seed=args.seed)
+
+def record(args):
+    config = Sweep.pongDefaults
+
+    encoder = Encoder(Pong.numObservations, config["encoderSize"])
+
+    agent = createAgent(args, encoder)
+
+    batchSize = agent._batchSize
+
+    env = Pong(batchSize, args.seed)
+
+    encoded = np.zeros((encoder.getNumOutputs(), batchSize))
+
+    rewardSum = 0.0
+
+    start = time.perf_counter()
+
+    with Trajectory.TrajectoryWriter(args.trajectory, encoder.getNumOutputs(), 1, batchSize) as writer:
+        for t in range(0, args.steps):
+            observations, rewards = env.step(agent.getActions()[0])
+
+            encoder.encode(observations, out=encoded)
+
+            agent.simStep(rewards, config["qAlpha"], config["qGamma"], config["exploration"], encoded,
+                config["learnEncoderRate"], config["learnRecurrentRate"], config["learnDecoderRate"], config["learnBiasRate"], config["traceDecay"])
+
+            writer.write(encoded, rewards, agent.getActions())
+
+            rewardSum += np.mean(rewards)
+
+    print("recorded %d steps in %.1fs, average reward %.4f" % (args.steps, time.perf_counter() - start, rewardSum / max(1, args.steps)))
+
+    if args.save is not None:
+        agent.save(args.save)
+
+def replay(args):
+    config = Sweep.pongDefaults
+
+    reader = Trajectory.TrajectoryReader(args.trajectory)
+
+    encoder = Encoder(Pong.numObservations, config["encoderSize"])
+
+    agent = createAgent(args, encoder)
+
+    metrics = Trajectory.replay(agent, reader, config["qAlpha"], config["qGamma"],
+        config["learnEncoderRate"], config["learnRecurrentRate"], config["learnDecoderRate"], config["learnBiasRate"], config["traceDecay"], args.start, args.count)
+
+    print("replayed %d steps in %.1fs (%.0f steps/s), action error %.4f" % (metrics["steps"], metrics["seconds"], metrics["stepsPerSecond"], metrics["actionError"]))
+
+    if args.save is not None:
+        agent.save(args.save)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Records and replays Agent trajectories on Pong")
+
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recordParser = commands.add_parser("record", help="run an agent on Pong and append its steps to a trajectory")
+    recordParser.add_argument("trajectory")
+    recordParser.add_argument("--steps", type=int, default=10000)
+
+    replayParser = commands.add_parser("replay", help="step an agent through a trajectory with the logged actions")
+    replayParser.add_argument("trajectory")
+    replayParser.add_argument("--start", type=int, default=0, help="first record to replay")
+    replayParser.add_argument("--count", type=int, help="records to replay, all remaining by default")
+
+    for subParser in (recordParser, replayParser):
+        subParser.add_argument("--load", help="checkpoint of the agent to start from")
+        subParser.add_argument("--save", help="checkpoint to write the agent to afterwards")
+        subParser.add_argument("--batch-size", type=int, default=1)
+        subParser.add_argument("--seed", type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args)
+    else:
+        replay(args)
@@ -1,150 +1,342 @@
-import numpy as np
-from neo.Layer import Layer
-from neo.LayerRL import LayerRL
-
-class Agent:
-    """A hierarchy of fully connected NeoRL layers that functions as a reinforcement learning agent"""
-
-    def __init__(self, numInputs, numActions, layerSizes, initMinWeight, initMaxWeight, activeRatio):
-        self._layers = []
-
-        self._numInputs = numInputs
-        self._numActions = numActions
-
-        self._actions = np.zeros((numActions, 1))
-        self._actionsExploratory = np.zeros((numActions, 1))
-
-        self._qPredictiveWeights = np.random.rand(1, layerSizes[0])
-        self._qPredictiveTraces = np.zeros((1, layerSizes[0]))
-
-        self._qFeedBackWeights = np.random.rand(1, layerSizes[0])
-        self._qFeedBackTraces = np.zeros((1, layerSizes[0]))
-
-        self._averageAbsTDError = 1.0
-
-        mask = []
-
-        for i in range(0, self._numInputs):
-            mask.append(0.0)
-
-        for i in range(0, self._numActions):
-            mask.append(1.0)
-
-        self._actionMask = np.matrix([mask]).T
-
-        self._prevValue = 0.0
-
-        # Create layers
-        for l in range(0, len(layerSizes)):
-            layer = None
-
-            if l == 0:
-                if l < len(layerSizes) - 1:
-                    layer = LayerRL(numInputs + numActions, layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio)
-                else:
-                    layer = LayerRL(numInputs + numActions, layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio)
-            else:
-                if l < len(layerSizes) - 1:
-                    layer = LayerRL(layerSizes[l - 1], layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio)
-                else:
-                    layer = LayerRL(layerSizes[l - 1], layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio)
-
-            self._layers.append(layer)
-
-    def simStep(self, reward, qAlpha, qGamma, exploration, input, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
-        assert(len(input) == self._numInputs)
-
-        usedInputArr = []
-
-        for i in range(0, self._numInputs):
-            usedInputArr.append(input.item(i))
-
-        for i in range(0, self._numActions):
-            usedInputArr.append(self._actionsExploratory.item(i))
-
-        usedInput = np.matrix([ usedInputArr ]).T
-
-        # Up pass
-        for l in range(0, len(self._layers)):
-            if l == 0:
-                self._layers[l].upPass(usedInput)
-            else:
-                self._layers[l].upPass(self._layers[l - 1]._states)
-
-        # Down pass
-        for l in range(0, len(self._layers)):
-            rl = len(self._layers) - 1 - l
-
-            if rl < len(self._layers) - 1:
-                if rl == 0:
-                    self._layers[rl].downPass(self._layers[rl + 1]._predictions, False)
-                else:
-                    self._layers[rl].downPass(self._layers[rl + 1]._predictions, True)
-            else:
-                if rl == 0:
-                    self._layers[rl].downPass(np.matrix([[ 0 ]]), False)
-                else:
-                    self._layers[rl].downPass(np.matrix([[ 0 ]]), True)
-
-        # Get Q
-        q = 0.0
-
-        if len(self._layers) > 1:
-            q = np.dot(self._qPredictiveWeights, self._layers[0]._states) + np.dot(self._qFeedBackWeights, self._layers[1]._predictions)
-        else:
-            q = np.dot(self._qPredictiveWeights, self._layers[0]._states)
-
-        tdError = reward + qGamma * q.item(0) - self._prevValue
-
-        self._qPredictiveWeights += qAlpha * tdError * self._qPredictiveTraces
-
-        self._qPredictiveTraces = self._qPredictiveTraces * traceDecay + self._layers[0]._states.T
-
-        if len(self._layers) > 1:
-            self._qFeedBackWeights += qAlpha * tdError * self._qFeedBackTraces
-
-            self._qFeedBackTraces = self._qFeedBackTraces * traceDecay + self._layers[1]._predictions.T
-
-        predInputExpArr = []
-
-        for i in range(0, self._numInputs):
-            predInputExpArr.append(input.item(i))
-
-        for i in range(0, self._numActions):
-            predInputExpArr.append(self._actionsExploratory.item(i))
-
-        predInputExp = np.matrix([ predInputExpArr ]).T
-
-        reinforce = np.sign(tdError) * 0.5 + 0.5
-
-        # Learn
-        for l in range(0, len(self._layers)):
-            if l == 0:
-                if l < len(self._layers) - 1:
-                    self._layers[l].learn(reinforce, predInputExp, self._layers[l + 1]._predictionsPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-                else:
-                    self._layers[l].learn(reinforce, predInputExp, np.matrix([[ 0 ]]), learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-            else:
-                if l < len(self._layers) - 1:
-                    self._layers[l].learn(reinforce, self._layers[l - 1]._states, self._layers[l + 1]._predictionsPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-                else:
-                    self._layers[l].learn(reinforce, self._layers[l - 1]._states, np.matrix([[ 0 ]]), learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-
-        # Determine action
-        for i in range(0, self._numActions):
-            self._actions[i] = np.minimum(1.0, np.maximum(-1.0, self.getPrediction().item(self._numInputs + i)))
-
-            if np.random.rand() < exploration:
-                self._actionsExploratory[i] = np.random.rand() * 2.0 - 1.0
-            else:
-                self._actionsExploratory[i] = self._actions[i]
-
-        self._prevValue = q.item(0)
-
-    def getPrediction(self):
-        return self._layers[0]._predictions
-
-    def getActions(self):
-        return self._actionsExploratory
-          
-       
\ No newline at end of file
+import numpy as np
+from neo.Layer import Layer
+from neo.LayerRL import LayerRL
+from neo.LayerLocalRL import LayerLocalRL
+from neo.Workspace import Workspace
+from neo.RandomStream import RandomStream
+from neo import Batch
+from neo import Checkpoint
+from neo import Fork
+
+class Agent:
+    """A hierarchy of fully connected NeoRL layers that functions as a reinforcement learning agent
+
+    With batchSize > 1, simStep takes one reward per instance and a
+    (numInputs, batchSize) input array, and steps all instances together. The
+    value estimates and actions then have one column per instance, see LayerRL.
+    sparseLearn switches every layer to the active-unit learning path, and
+    inPlace makes every layer reuse its buffers between steps, see Layer.
+    Weights, states and temporaries use dtype (e.g. np.float32), traces are
+    stored as traceDtype (e.g. np.float16) and default to dtype.
+    Given a connectivity (see Connectivity) the layers are locally connected,
+    see LayerLocalRL.
+    fused (dense layers only) stores the weights of every layer in two blocks,
+    see Layer.
+    The initial weights and the exploration are drawn from the agent's own
+    RandomStream, seeded by seed.
+
+    infer() steps without learning. fork() makes a cheap inference-only copy
+    that shares the weights, for looking ahead from the current state, see Fork.
+    save() and load() checkpoint the full state, see Checkpoint.
+    setProfiler() attaches a Profiler that times every phase of every layer.
+    setScheduler() runs the layers concurrently on threads, see Scheduler.
+    """
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_workspace', '_profiler', '_scheduler', '_pipeline')
+
+    def __init__(self, numInputs, numActions, layerSizes, initMinWeight, initMaxWeight, activeRatio, batchSize = 1, sharedWeights = True, sparseLearn = False, inPlace = False, dtype = np.float64, traceDtype = None, connectivity = None, fused = False, seed = None):
+        self._layers = []
+
+        traceDtype = dtype if traceDtype is None else traceDtype
+
+        self._numInputs = numInputs
+        self._numActions = numActions
+
+        self._batchSize = batchSize
+
+        # Draws the initial weights and the exploration
+        self._random = RandomStream(seed)
+
+        self._actions = np.zeros((numActions, batchSize), dtype)
+        self._actionsExploratory = np.zeros((numActions, batchSize), dtype)
+
+        self._qPredictiveWeights = Batch.initWeights(batchSize, sharedWeights, 1, layerSizes[0], 0.0, 1.0, dtype, self._random.getGenerator())
+        self._qPredictiveTraces = Batch.perInstanceZeros(batchSize, sharedWeights, 1, layerSizes[0], traceDtype)
+
+        self._qFeedBackWeights = Batch.initWeights(batchSize, sharedWeights, 1, layerSizes[0], 0.0, 1.0, dtype, self._random.getGenerator())
+        self._qFeedBackTraces = Batch.perInstanceZeros(batchSize, sharedWeights, 1, layerSizes[0], traceDtype)
+
+        # The value traces are stored divided by this
+        self._qTraceScale = 1.0
+
+        self._averageAbsTDError = 1.0
+
+        self._actionMask = np.zeros((numInputs + numActions, 1), dtype)
+        self._actionMask[numInputs:] = 1.0
+
+        self._prevValue = np.zeros((1, batchSize), dtype)
+
+        self._zeroFeedBack = np.zeros((1, batchSize), dtype)
+
+        # Observation followed by the previous (exploratory) actions
+        self._usedInput = np.zeros((numInputs + numActions, batchSize), dtype)
+
+        self._dtype = np.dtype(dtype)
+
+        self._createScratch()
+
+        # Locally connected layers when a connectivity is given
+        layerType = LayerRL if connectivity is None else lambda *args: LayerLocalRL(*args, connectivity=connectivity)
+
+        # Create layers
+        for l in range(0, len(layerSizes)):
+            layer = None
+
+            if l == 0:
+                if l < len(layerSizes) - 1:
+                    layer = layerType(numInputs + numActions, layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+                else:
+                    layer = layerType(numInputs + numActions, layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+            else:
+                if l < len(layerSizes) - 1:
+                    layer = layerType(layerSizes[l - 1], layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+                else:
+                    layer = layerType(layerSizes[l - 1], layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+
+            self._layers.append(layer)
+
+    def simStep(self, reward, qAlpha, qGamma, exploration, input, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay, actions = None):
+        """Steps the agent on the reward for its last actions and the new input.
+
+        actions, if given, replaces the exploratory actions the agent would take
+        next (as when replaying a Trajectory), no exploration is drawn then.
+        """
+        assert(len(input) == self._numInputs)
+
+        # Observation followed by the previous (exploratory) actions, this is also the layer 0 prediction target
+        usedInput = self._usedInput
+
+        np.copyto(usedInput[:self._numInputs], np.reshape(input, (self._numInputs, self._batchSize)))
+        np.copyto(usedInput[self._numInputs:], self._actionsExploratory)
+
+        if self._scheduler is not None and self._scheduler.getMode() == 'pipelined':
+            self._simStepPipelined(reward, qAlpha, qGamma, exploration, usedInput, (learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay), actions)
+
+            return
+
+        # Up pass
+        for l in range(0, len(self._layers)):
+            if l == 0:
+                self._layers[l].upPass(usedInput)
+            else:
+                self._layers[l].upPass(self._layers[l - 1]._states)
+
+        # Down pass
+        for l in range(0, len(self._layers)):
+            rl = len(self._layers) - 1 - l
+
+            if rl < len(self._layers) - 1:
+                if rl == 0:
+                    self._layers[rl].downPass(self._layers[rl + 1]._predictions, False)
+                else:
+                    self._layers[rl].downPass(self._layers[rl + 1]._predictions, True)
+            else:
+                if rl == 0:
+                    self._layers[rl].downPass(self._zeroFeedBack, False)
+                else:
+                    self._layers[rl].downPass(self._zeroFeedBack, True)
+
+        q, reinforce = self._updateQ(reward, qAlpha, qGamma, traceDecay)
+
+        # Learn
+        rates = (learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
+
+        if self._scheduler is None:
+            for l in range(0, len(self._layers)):
+                self._learnLayer(l, reinforce, usedInput, rates)
+        else:
+            self._scheduler.map(lambda l: self._learnLayer(l, reinforce, usedInput, rates), len(self._layers))
+
+        # Determine action
+        self._selectActions(exploration, actions)
+
+        np.copyto(self._prevValue, q)
+
+    def infer(self, input, exploration = 0.0, actions = None):
+        """simStep without learning, the weights, traces and biases are left alone. Returns the value estimate.
+
+        The agent's own actions are greedy unless exploration is given, and
+        replaced by actions if those are given, as in simStep.
+        """
+        assert(len(input) == self._numInputs)
+
+        usedInput = self._usedInput
+
+        np.copyto(usedInput[:self._numInputs], np.reshape(input, (self._numInputs, self._batchSize)))
+        np.copyto(usedInput[self._numInputs:], self._actionsExploratory)
+
+        # Up pass
+        for l in range(0, len(self._layers)):
+            if l == 0:
+                self._layers[l].inferUp(usedInput)
+            else:
+                self._layers[l].inferUp(self._layers[l - 1]._states)
+
+        # Down pass
+        for l in range(0, len(self._layers)):
+            rl = len(self._layers) - 1 - l
+
+            if rl < len(self._layers) - 1:
+                self._layers[rl].inferDown(self._layers[rl + 1]._predictions, rl != 0)
+            else:
+                self._layers[rl].inferDown(self._zeroFeedBack, rl != 0)
+
+        np.copyto(self._prevValue, self._value())
+
+        self._selectActions(exploration, actions)
+
+        return self._prevValue
+
+    def fork(self):
+        """A copy of the per-step state that shares the weights read-only, to be stepped with infer(), see Fork"""
+        return Fork.fork(self)
+
+    def getPrediction(self):
+        return self._layers[0]._predictions
+
+    def getActions(self):
+        return self._actionsExploratory
+
+    def setProfiler(self, profiler):
+        """Attaches a Profiler to the agent and its layers, or detaches the current one with None"""
+        if self._profiler is not None:
+            self._profiler.detach()
+
+        self._profiler = profiler
+
+        if profiler is not None:
+            profiler.attach(self)
+
+    def setScheduler(self, scheduler):
+        """Runs the layers on the threads of a Scheduler from now on, or one after another again with None. A replaced scheduler is shut down."""
+        if self._scheduler is not None and self._scheduler is not scheduler:
+            self._scheduler.shutdown()
+
+        self._scheduler = scheduler
+
+        if scheduler is not None and scheduler.getMode() == 'pipelined':
+            self._pipeline = scheduler.createPipeline(self._layers, self._zeroFeedBack)
+        else:
+            self._pipeline = None
+
+    def save(self, path):
+        """Writes the weights, traces, states, value estimate and random state to a checkpoint file"""
+        Checkpoint.save(self, path)
+
+    @staticmethod
+    def load(path, mmapMode = None):
+        """Reads an Agent written by save(), optionally memory mapping the weights ('r' or 'c')"""
+        agent = Checkpoint.load(path, mmapMode)
+
+        assert(isinstance(agent, Agent))
+
+        return agent
+
+    def _parameterNames(self):
+        """Attributes that hold learned weights, which a checkpoint can memory map"""
+        return ('_qPredictiveWeights', '_qFeedBackWeights')
+
+    def _frozenNames(self):
+        """Attributes only learning changes, which a fork shares read-only"""
+        return self._parameterNames() + ('_qPredictiveTraces', '_qFeedBackTraces')
+
+    def _createScratch(self):
+        self._workspace = Workspace(self._dtype)
+
+        self._profiler = None
+
+        self._scheduler = None
+
+        # Signals of the previous step for a pipelined scheduler, see setScheduler
+        self._pipeline = None
+
+    def _learnLayer(self, l, reinforce, usedInput, rates):
+        if l == 0:
+            target = usedInput
+        else:
+            target = self._layers[l - 1]._states
+
+        if l < len(self._layers) - 1:
+            feedBackPrev = self._layers[l + 1]._predictionsPrev
+        else:
+            feedBackPrev = self._zeroFeedBack
+
+        self._layers[l].learn(reinforce, target, feedBackPrev, *rates)
+
+    def _simStepPipelined(self, reward, qAlpha, qGamma, exploration, usedInput, rates, actions):
+        """Runs the up and down passes of all layers at once on the signals of the previous step, then Q, then all learn calls at once"""
+        self._scheduler.mapPipelined(self._layers, self._pipeline, usedInput)
+
+        q, reinforce = self._updateQ(reward, qAlpha, qGamma, rates[-1])
+
+        def learnLayer(l):
+            layer = self._layers[l]
+
+            # The feed back copied from the previous step by mapPipelined
+            layer.learn(reinforce, layer._input, self._pipeline[l][2], *rates)
+
+        self._scheduler.map(learnLayer, len(self._layers))
+
+        self._selectActions(exploration, actions)
+
+        np.copyto(self._prevValue, q)
+
+    def _profiledPhases(self):
+        """(method, phase) pairs of the agent itself timed by a Profiler"""
+        return (('_updateQ', 'qUpdate'), ('_selectActions', 'actionSelection'))
+
+    def _updateQ(self, reward, qAlpha, qGamma, traceDecay):
+        """Updates the value weights and traces from the new value estimate q, returns q and the reinforcement signal"""
+        q = self._value()
+
+        tdError = np.multiply(qGamma, q, out=self._workspace.like('tdError', self._prevValue))
+        tdError += np.reshape(reward, (1, -1))
+        tdError -= self._prevValue
+
+        self._qPredictiveWeights += Batch.weightedSum(qAlpha * self._qTraceScale, tdError, self._qPredictiveTraces, self._qPredictiveWeights, out=self._workspace.like('qUpdate', self._qPredictiveWeights))
+
+        if len(self._layers) > 1:
+            self._qFeedBackWeights += Batch.weightedSum(qAlpha * self._qTraceScale, tdError, self._qFeedBackTraces, self._qFeedBackWeights, out=self._workspace.like('qUpdate', self._qFeedBackWeights))
+
+        # Both value traces decay lazily through one scale, see Batch.decayTraces
+        self._qTraceScale = Batch.decayTraces([ self._qPredictiveTraces, self._qFeedBackTraces ], self._qTraceScale, traceDecay)
+
+        self._qPredictiveTraces += np.divide(Batch.rows(self._layers[0]._states, self._qPredictiveTraces), self._qTraceScale, out=self._workspace.like('qTrace', self._qPredictiveTraces))
+
+        if len(self._layers) > 1:
+            self._qFeedBackTraces += np.divide(Batch.rows(self._layers[1]._predictions, self._qFeedBackTraces), self._qTraceScale, out=self._workspace.like('qTrace', self._qFeedBackTraces))
+
+        reinforce = np.sign(tdError, out=self._workspace.like('reinforce', self._prevValue))
+        reinforce *= 0.5
+        reinforce += 0.5
+
+        return q, reinforce
+
+    def _value(self):
+        """The value estimate q of the current states and predictions"""
+        q = Batch.matVec(self._qPredictiveWeights, self._layers[0]._states, out=self._workspace.like('q', self._prevValue))
+
+        if len(self._layers) > 1:
+            q += Batch.matVec(self._qFeedBackWeights, self._layers[1]._predictions, out=self._workspace.like('qFeedBack', self._prevValue))
+
+        return q
+
+    def _selectActions(self, exploration, forcedActions = None):
+        np.clip(self.getPrediction()[self._numInputs:], -1.0, 1.0, out=self._actions)
+
+        if forcedActions is not None:
+            np.copyto(self._actionsExploratory, np.reshape(forcedActions, self._actionsExploratory.shape))
+
+            return
+
+        # One draw decides which actions explore, a second one gives their random values
+        draws = self._random.random(2 * self._actions.size).reshape((2,) + self._actions.shape)
+
+        explore = np.less(draws[0], exploration, out=self._workspace.get('explore', self._actions.shape, bool))
+
+        randomActions = np.multiply(draws[1], 2.0, out=self._workspace.like('randomActions', self._actions))
+        randomActions -= 1.0
+
+        np.copyto(self._actionsExploratory, self._actions)
+        np.copyto(self._actionsExploratory, randomActions, where=explore)
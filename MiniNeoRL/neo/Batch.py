@@ -0,0 +1,249 @@
+"""Helpers for running layers on a batch of independent instances.
+
+States, traces and predictions are (numUnits, batchSize) column arrays. Weights
+are either shared by the whole batch, stored as a 2-D (numOut, numIn) matrix,
+or independent per instance, stacked into a 3-D (batchSize, numOut, numIn)
+array. Per-instance matrices such as eligibility traces use the same 3-D
+layout. With a batch size of 1 and shared weights every helper reduces to the
+plain column vector products used before batching.
+
+Throughput scales with the batch only for shared weights, where one matrix
+product serves every instance. Independent weights, and the per-instance
+traces of LayerRL and Agent, cost one matrix update per instance per step
+whatever the layout, so batching them mostly saves the Python overhead of
+separate models: it is there for running many independent models as one, not
+for speed. Their updates are added one instance at a time (see addProducts) to
+avoid a batch-sized temporary.
+
+Weights and traces may be stored in narrower types than they are computed in
+(e.g. float16 traces next to float32 weights). Products are then computed at
+the wider precision and rounded when written back.
+"""
+
+import numpy as np
+
+def initWeights(batchSize, sharedWeights, numOut, numIn, initMinWeight, initMaxWeight, dtype = np.float64, generator = None):
+    """Uniformly initialized shared (2-D) or independent (3-D) weights, drawn from generator or else the global np.random state"""
+    random = np.random if generator is None else generator
+
+    if sharedWeights:
+        weights = random.random((numOut, numIn)) * (initMaxWeight - initMinWeight) + initMinWeight
+    else:
+        weights = random.random((batchSize, numOut, numIn)) * (initMaxWeight - initMinWeight) + initMinWeight
+
+    return weights.astype(dtype, copy=False)
+
+def perInstanceZeros(batchSize, sharedWeights, numOut, numIn, dtype = np.float64):
+    """Zeroed per-instance matrices (e.g. traces), 2-D only for a single shared instance"""
+    if sharedWeights and batchSize == 1:
+        return np.zeros((numOut, numIn), dtype)
+
+    return np.zeros((batchSize, numOut, numIn), dtype)
+
+def matVec(weights, vectors, out = None):
+    """weights times each column of vectors, giving a (numOut, batchSize) array"""
+    if weights.ndim == 2:
+        return np.dot(weights, vectors, out=out)
+
+    if out is None:
+        return np.matmul(weights, np.asarray(vectors).T[:, :, np.newaxis])[:, :, 0].T
+
+    np.matmul(weights, vectors.T[:, :, np.newaxis], out=out.T[:, :, np.newaxis])
+
+    return out
+
+def outer(post, pre, like, out = None):
+    """Outer products post * pre.T shaped like the matrix they will be added to.
+
+    For a 2-D target the products are averaged over the batch, for a 3-D target
+    one product is kept per instance.
+    """
+    if like.ndim == 3:
+        return np.multiply(np.asarray(post).T[:, :, np.newaxis], np.asarray(pre).T[:, np.newaxis, :], out=out)
+
+    out = np.dot(post, pre.T, out=out)
+
+    if post.shape[1] > 1:
+        out /= post.shape[1]
+
+    return out
+
+def projectBack(states, weights, out = None):
+    """states.T times weights, a row per instance (averaged over the batch for shared weights).
+
+    out is a (batchSize, numIn) array for shared and a (batchSize, 1, numIn) array for independent weights.
+    """
+    if weights.ndim == 3:
+        return np.matmul(states.T[:, np.newaxis, :], weights, out=out)
+
+    projected = np.dot(states.T, weights, out=out)
+
+    if states.shape[1] == 1:
+        return projected
+
+    return np.mean(projected, axis=0, keepdims=True)
+
+def rows(vectors, like):
+    """Columns of vectors as rows, shaped to be added to per-instance traces like like"""
+    if like.ndim == 3:
+        return vectors.T[:, np.newaxis, :]
+
+    return vectors.T
+
+def weightedSum(rate, scales, traces, like, out = None):
+    """Per-instance traces scaled by rate times per-instance scales, reduced to the shape of like"""
+    if traces.ndim == 2:
+        return np.multiply(rate * np.ravel(scales)[0], traces, out=out, dtype=like.dtype)
+
+    scales = rate * np.ravel(scales)
+
+    if like.ndim == 3:
+        return np.multiply(scales[:, np.newaxis, np.newaxis], traces, out=out, dtype=like.dtype)
+
+    out = np.einsum('b,bij->ij', scales, traces, out=out, dtype=like.dtype)
+
+    out /= len(scales)
+
+    return out
+
+def meanColumns(vectors, like):
+    """Columns of vectors averaged over the batch unless like keeps one column per instance"""
+    if vectors.shape[1] == like.shape[1]:
+        return vectors
+
+    return np.mean(vectors, axis=1, keepdims=True)
+
+# Entries of 3-D weights below which addProducts takes all products at once
+productSize = 1 << 16
+
+def addProducts(weights, left, right, workspace):
+    """In place weights[b] += left[b] times right[b] for every instance b of 3-D weights.
+
+    Larger products are taken one instance at a time with np.dot, so the
+    scratch array is the size of one matrix and stays in cache, and thin
+    products (such as outer products) still run through BLAS, which matmul
+    skips. Small weights are updated with one matmul over the whole batch.
+    """
+    if weights.size <= productSize:
+        weights += np.matmul(left, right, out=workspace.get('products', weights.shape, np.result_type(left, right)))
+
+        return
+
+    product = workspace.get('product', weights.shape[1:], np.result_type(left, right))
+
+    for b in range(0, len(weights)):
+        np.dot(left[b], right[b], out=product)
+
+        weights[b] += product
+
+def learnCompetitiveInstances(weights, post, pre, rate, workspace):
+    """learnCompetitive for 3-D weights, as one rank-2 product [post, -1] times rate * [pre, post.T * weights] per instance"""
+    left = workspace.get('competitiveLeft', (post.shape[1], weights.shape[1], 2), weights.dtype)
+
+    left[:, :, 0] = post.T
+    left[:, :, 1] = -1.0
+
+    right = workspace.get('competitiveRight', (post.shape[1], 2, weights.shape[2]), weights.dtype)
+
+    right[:, 0, :] = pre.T
+
+    projectBack(post, weights, out=right[:, 1:2, :])
+
+    right *= rate
+
+    addProducts(weights, left, right, workspace)
+
+def learnCompetitive(weights, post, pre, rate, workspace):
+    """In place weights += rate * (post * pre.T - post.T * weights), rate being a scalar or a row of per-column rates"""
+    if weights.ndim == 3:
+        learnCompetitiveInstances(weights, post, pre, rate, workspace)
+
+        return
+
+    update = workspace.view('update', weights.shape, weights.dtype)
+
+    projected = workspace.get('projected', (post.shape[1], weights.shape[1]), weights.dtype)
+
+    outer(post, pre, weights, out=update)
+
+    update -= projectBack(post, weights, out=projected)
+    update *= rate
+
+    weights += update
+
+def learnCompetitiveColumns(weights, post, pre, rates, workspace):
+    """learnCompetitive with a (1, numIn) row of per-column rates, applied to pre and the projection instead of the whole update"""
+    if weights.ndim == 3:
+        learnCompetitiveInstances(weights, post, pre, rates, workspace)
+
+        return
+
+    update = workspace.view('update', weights.shape, weights.dtype)
+
+    projected = workspace.get('projected', (post.shape[1], weights.shape[1]), weights.dtype)
+
+    projected = projectBack(post, weights, out=projected)
+    projected *= rates
+
+    outer(post, np.multiply(pre, rates.T, out=workspace.get('scaledPre', pre.shape, np.result_type(pre, rates))), weights, out=update)
+
+    update -= projected
+
+    weights += update
+
+def learnOuter(weights, post, pre, rate, workspace):
+    """In place weights += rate * post * pre.T, computed at the precision of post and pre when weights are stored narrower"""
+    if weights.ndim == 3:
+        # One rank-1 product per instance, with rate applied to the short pre rows
+        scaledPre = workspace.get('scaledPreRows', (pre.shape[1], 1, pre.shape[0]), np.result_type(weights, post, pre))
+
+        np.multiply(pre.T[:, np.newaxis, :], rate, out=scaledPre)
+
+        # Contiguous columns, so the products take the BLAS path
+        postColumns = workspace.get('postColumns', (post.shape[1], post.shape[0], 1), scaledPre.dtype)
+
+        postColumns[:, :, 0] = post.T
+
+        addProducts(weights, postColumns, scaledPre, workspace)
+
+        return
+
+    update = workspace.view('update', weights.shape, np.result_type(weights, post, pre))
+
+    outer(post, pre, weights, out=update)
+
+    update *= rate
+
+    weights += update
+
+def minTraceScale(dtype):
+    """Smallest scale of lazily decayed traces stored as dtype before it is moved into them, see decayTraces"""
+    # Narrow types would overflow holding traces divided by a small scale
+    return 1e-3 if np.dtype(dtype).itemsize >= 4 else 0.1
+
+def decayTraces(traces, scale, traceDecay):
+    """Lazily decays traces (a list of arrays) by traceDecay and returns their new scale.
+
+    Lazily decayed traces are stored divided by a shared scale, so a decay only
+    shrinks the scale and new contributions are added divided by it. Once the
+    scale falls below minTraceScale it is multiplied into the stored traces and
+    reset to 1, which keeps the stored values bounded over any number of steps.
+    """
+    scale *= traceDecay
+
+    if scale < minTraceScale(traces[0].dtype):
+        for t in traces:
+            t *= scale
+
+        scale = 1.0
+
+    return scale
+
+def concatenate(top, bottom, workspace, name):
+    """Columns of top stacked on those of bottom in one (numTop + numBottom, batchSize) workspace array"""
+    out = workspace.get(name, (len(top) + len(bottom), top.shape[1]), top.dtype)
+
+    out[:len(top)] = top
+    out[len(top):] = bottom
+
+    return out
@@ -0,0 +1,126 @@
+import numpy as np
+
+class CSC:
+    """A compressed sparse column matrix
+
+    The nonzero entries of every column are stored one column after another in
+    data, with their row indices in indices. Column c holds the entries
+    indptr[c]:indptr[c + 1]. Memory grows with the number of stored entries
+    instead of numRows * numColumns.
+
+    Products are taken with (numColumns, batchSize) column arrays as in Batch,
+    one column at a time, and only visit the columns of the nonzero entries of
+    the vector: the entries of those columns are gathered, scaled by the vector
+    entries and summed per row. For the sparsely active states of a layer that
+    skips most columns. When the nonzero columns hold most of the entries
+    anyway, and for small matrices, a product goes through all entries in order
+    instead, which takes fewer numpy calls.
+    """
+
+    # Fraction of the entries above which a product visits all entries instead of gathering those of the nonzero columns
+    denseFraction = 0.5
+
+    # Entries up to which a product always visits all entries, as finding the nonzero columns costs more
+    smallSize = 1 << 12
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_columnCounts',)
+
+    def __init__(self, data, indices, indptr, shape):
+        self._data = data
+        self._indices = indices
+        self._indptr = indptr
+
+        self._numRows, self._numColumns = shape
+
+        self._createScratch()
+
+    @staticmethod
+    def fromDense(dense, mask = None):
+        """The entries of a 2-D array where mask is set (everywhere by default), without the zeros"""
+        assert(dense.ndim == 2)
+
+        keep = dense != 0.0
+
+        if mask is not None:
+            keep &= mask
+
+        # Column-major order, so the entries of a column are stored together
+        columns, rows = np.nonzero(keep.T)
+
+        indptr = np.zeros(dense.shape[1] + 1, np.int64)
+
+        np.cumsum(np.bincount(columns, minlength=dense.shape[1]), out=indptr[1:])
+
+        return CSC(dense[rows, columns], rows.astype(np.int32), indptr, dense.shape)
+
+    def getShape(self):
+        return (self._numRows, self._numColumns)
+
+    def getNumEntries(self):
+        return len(self._data)
+
+    def getNumBytes(self):
+        """Bytes of the stored entries, row indices and column pointers"""
+        return self._data.nbytes + self._indices.nbytes + self._indptr.nbytes
+
+    def toDense(self):
+        dense = np.zeros(self.getShape(), self._data.dtype)
+
+        columns = np.repeat(np.arange(self._numColumns), np.diff(self._indptr))
+
+        dense[self._indices, columns] = self._data
+
+        return dense
+
+    def matVec(self, vectors, out):
+        """The matrix times each column of vectors, written into the (numRows, batchSize) array out"""
+        for b in range(0, vectors.shape[1]):
+            out[:, b] = self._product(vectors[:, b])
+
+        return out
+
+    def _product(self, vector):
+        """The matrix times one vector, from the stored entries of its nonzero columns"""
+        if len(self._data) <= self.smallSize:
+            return self._productAll(vector)
+
+        columns = np.flatnonzero(vector)
+
+        starts = self._indptr[columns]
+        counts = self._indptr[columns + 1] - starts
+
+        ends = np.cumsum(counts)
+
+        numGathered = ends[-1] if len(ends) > 0 else 0
+
+        if numGathered == 0:
+            return np.zeros(self._numRows, self._data.dtype)
+
+        # When most entries are needed anyway, going through all of them in order is cheaper than gathering
+        if numGathered >= self.denseFraction * len(self._data):
+            return self._productAll(vector)
+
+        # Indices of the gathered entries: each range shifted to start at its column's first entry
+        entries = np.repeat(starts - (ends - counts), counts)
+        entries += np.arange(numGathered)
+
+        values = self._data[entries]
+        values *= np.repeat(vector[columns], counts)
+
+        return np.bincount(self._indices[entries], values, minlength=self._numRows)
+
+    def _productAll(self, vector):
+        """The matrix times one vector, going through all stored entries in order"""
+        return np.bincount(self._indices, self._data * np.repeat(vector, self._columnCounts), minlength=self._numRows)
+
+    def _parameterNames(self):
+        """Attributes that hold the matrix, which a checkpoint can memory map"""
+        return ('_data', '_indices', '_indptr')
+
+    def _frozenNames(self):
+        """Attributes a fork shares read-only, see Fork"""
+        return self._parameterNames()
+
+    def _createScratch(self):
+        self._columnCounts = np.diff(self._indptr)
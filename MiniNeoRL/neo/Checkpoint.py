@@ -0,0 +1,200 @@
+"""Saving and restoring a Hierarchy or Agent.
+
+A checkpoint is one uncompressed .npz file. It holds every array of the model
+(weights, traces, biases, states, ...) as its own .npy member, plus a JSON
+description of the object tree (classes, scalars, dtypes, the state of owned
+random generators) and the format version. The global np.random state is not
+part of a model and is neither saved nor changed by loading: every Hierarchy
+and Agent saves the state of its own RandomStream.
+
+Members of an uncompressed .npz are stored contiguously, so the parameter
+arrays (the weights listed by an object's _parameterNames()) can be memory
+mapped straight out of the file. Loading then only reads the small state
+arrays, and processes that map the same checkpoint share its pages. With
+mmapMode 'r' the weights are read-only (inference only), with 'c' they are
+copy-on-write, so a process only pays for the pages it changes.
+
+Scratch objects (Inhibitor, Workspace) and arrays that are views into other
+arrays (an object's _viewNames()) are not saved. They are rebuilt on load by the
+object's _createScratch().
+"""
+
+import importlib
+import json
+import os
+import struct
+import zipfile
+import numpy as np
+
+formatName = "MiniNeoRL checkpoint"
+formatVersion = 1
+
+# Key of the JSON description inside the .npz
+descriptionKey = "checkpoint"
+
+def save(model, path):
+    """Writes model to path, replacing any previous file only once the new one is complete"""
+    arrays = {}
+
+    description = {
+        "format": formatName,
+        "version": formatVersion,
+        "model": _describe(model, "", arrays)
+    }
+
+    arrays[descriptionKey] = np.array(json.dumps(description))
+
+    tempPath = path + ".tmp"
+
+    with open(tempPath, "wb") as f:
+        np.savez(f, **arrays)
+
+    os.replace(tempPath, path)
+
+def load(path, mmapMode = None):
+    """Reads a model saved by save().
+
+    mmapMode None reads every array into memory, 'r' or 'c' memory map the
+    parameter arrays read-only or copy-on-write.
+    """
+    assert(mmapMode in (None, 'r', 'c'))
+
+    with np.load(path, allow_pickle=False) as npz:
+        description = json.loads(npz[descriptionKey].item())
+
+        if description.get("format") != formatName:
+            raise ValueError("%s is not a MiniNeoRL checkpoint" % path)
+
+        if description["version"] > formatVersion:
+            raise ValueError("%s has checkpoint version %d, this version reads up to %d" % (path, description["version"], formatVersion))
+
+        mapped = _mapParameters(path, description["model"], mmapMode) if mmapMode is not None else {}
+
+        # Checkpoints of earlier revisions also hold the global random state, which is ignored
+        model = _restore(description["model"], npz, mapped)
+
+    return model
+
+def _describe(obj, prefix, arrays):
+    """JSON description of obj, storing its arrays in arrays under prefix + attribute name"""
+    scratch = getattr(obj, "_scratchNames", ())
+
+    # Views into other arrays (such as the weights of a fused layer) are rebuilt as well
+    if hasattr(obj, "_viewNames"):
+        scratch = tuple(scratch) + tuple(obj._viewNames())
+
+    description = {
+        "class": type(obj).__module__ + "." + type(obj).__name__,
+        "parameters": list(obj._parameterNames()) if hasattr(obj, "_parameterNames") else [],
+        "arrays": [],
+        "scalars": {},
+        "dtypes": {},
+        "lists": {},
+        "objects": {},
+        "generators": {}
+    }
+
+    for name, value in vars(obj).items():
+        # Skip scratch objects and methods overridden on the instance (such as Profiler wrappers)
+        if name in scratch or (callable(value) and hasattr(type(obj), name)):
+            continue
+
+        if isinstance(value, np.ndarray):
+            arrays[prefix + name] = value
+            description["arrays"].append(name)
+        elif isinstance(value, np.dtype):
+            description["dtypes"][name] = value.str
+        elif isinstance(value, np.generic):
+            description["scalars"][name] = value.item()
+        elif value is None or isinstance(value, (bool, int, float, str)):
+            description["scalars"][name] = value
+        elif isinstance(value, list):
+            description["lists"][name] = [ _describe(value[i], "%s%s.%d." % (prefix, name, i), arrays) for i in range(0, len(value)) ]
+        elif isinstance(value, np.random.Generator):
+            description["generators"][name] = value.bit_generator.state
+        elif type(value).__module__.startswith("neo."):
+            description["objects"][name] = _describe(value, "%s%s." % (prefix, name), arrays)
+        else:
+            raise TypeError("Cannot checkpoint %s.%s of type %s" % (type(obj).__name__, name, type(value).__name__))
+
+    return description
+
+def _restore(description, npz, mapped, prefix = ""):
+    moduleName, className = description["class"].rsplit(".", 1)
+
+    cls = getattr(importlib.import_module(moduleName), className)
+
+    obj = cls.__new__(cls)
+
+    for name, value in description["scalars"].items():
+        setattr(obj, name, value)
+
+    for name, value in description["dtypes"].items():
+        setattr(obj, name, np.dtype(value))
+
+    for name in description["arrays"]:
+        key = prefix + name
+
+        setattr(obj, name, mapped[key] if key in mapped else npz[key])
+
+    for name, items in description["lists"].items():
+        setattr(obj, name, [ _restore(items[i], npz, mapped, "%s%s.%d." % (prefix, name, i)) for i in range(0, len(items)) ])
+
+    # Not written by checkpoints of earlier revisions
+    for name, item in description.get("objects", {}).items():
+        setattr(obj, name, _restore(item, npz, mapped, "%s%s." % (prefix, name)))
+
+    for name, state in description.get("generators", {}).items():
+        generator = np.random.Generator(getattr(np.random, state["bit_generator"])())
+
+        generator.bit_generator.state = state
+
+        setattr(obj, name, generator)
+
+    if hasattr(obj, "_createScratch"):
+        obj._createScratch()
+
+    return obj
+
+def _parameterKeys(description, prefix = ""):
+    keys = [ prefix + name for name in description["parameters"] ]
+
+    for name, items in description["lists"].items():
+        for i in range(0, len(items)):
+            keys += _parameterKeys(items[i], "%s%s.%d." % (prefix, name, i))
+
+    for name, item in description.get("objects", {}).items():
+        keys += _parameterKeys(item, "%s%s." % (prefix, name))
+
+    return keys
+
+def _mapParameters(path, description, mmapMode):
+    """Memory maps the parameter arrays, found by reading the member offsets from the zip headers"""
+    mapped = {}
+
+    with zipfile.ZipFile(path) as archive, open(path, "rb") as f:
+        for key in _parameterKeys(description):
+            info = archive.getinfo(key + ".npy")
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError("%s is compressed and cannot be memory mapped" % key)
+
+            # Skip the local file header, whose name and extra field lengths may differ from the central directory
+            f.seek(info.header_offset)
+
+            header = f.read(30)
+
+            nameLength, extraLength = struct.unpack("<HH", header[26:30])
+
+            f.seek(info.header_offset + 30 + nameLength + extraLength)
+
+            version = np.lib.format.read_magic(f)
+
+            if version == (1, 0):
+                shape, fortranOrder, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortranOrder, dtype = np.lib.format.read_array_header_2_0(f)
+
+            mapped[key] = np.memmap(path, dtype, mmapMode, f.tell(), shape, 'F' if fortranOrder else 'C').view(np.ndarray)
+
+    return mapped
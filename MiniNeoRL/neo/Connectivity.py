@@ -0,0 +1,49 @@
+import numpy as np
+
+class Connectivity:
+    """Receptive fields of locally connected layers, see LayerLocal
+
+    Every row (unit) of a weight matrix connects to the same number of columns,
+    given as a (numRows, numConnections) array of column indices sorted per row.
+
+    With a radius the rows are spread evenly over the columns, and each row
+    connects to the 2 * radius + 1 columns around its position (wrapping around
+    at the ends). With sampled each row connects to numConnections (default
+    2 * radius + 1) distinct columns drawn at random. Matrices with fewer
+    columns than that are fully connected.
+    """
+
+    def __init__(self, radius = 8, sampled = False, numConnections = None):
+        assert(radius >= 0)
+        assert(numConnections is None or (sampled and numConnections > 0))
+
+        self._radius = radius
+        self._sampled = sampled
+        self._numConnections = 2 * radius + 1 if numConnections is None else numConnections
+
+    def getNumConnections(self, numColumns):
+        """Connections per row of a matrix with numColumns columns"""
+        return min(self._numConnections, numColumns)
+
+    def indices(self, numRows, numColumns, generator = None):
+        """Column indices of every row, sampled from generator (or else the global np.random state)"""
+        numConnections = self.getNumConnections(numColumns)
+
+        if numConnections == numColumns:
+            return np.tile(np.arange(numColumns, dtype=np.int32), (numRows, 1))
+
+        if self._sampled:
+            random = np.random if generator is None else generator
+
+            indices = np.empty((numRows, numConnections), np.int32)
+
+            for r in range(0, numRows):
+                indices[r] = random.choice(numColumns, numConnections, replace=False)
+        else:
+            centers = ((np.arange(numRows) + 0.5) * (numColumns / numRows)).astype(np.intp)
+
+            indices = ((centers[:, np.newaxis] + np.arange(-self._radius, self._radius + 1)) % numColumns).astype(np.int32)
+
+        indices.sort(axis=1)
+
+        return indices
@@ -0,0 +1,75 @@
+import numpy as np
+
+class Encoder:
+    """Population codes of scalars in [-1, 1] as Agent/Hierarchy input vectors
+
+    Every value gets encoderSize units with centers i / encoderSize * 2 - 1. The
+    bin code (as in MiniNeoRL_RL_Demo.py) sets the unit whose center is closer
+    than 0.5 / encoderSize to the value, so values between two bins set none.
+    The Gaussian code sets every unit to exp(-sharpness * (center - value)^2).
+
+    encode takes numValues values, or a (numValues, batchSize) array of them,
+    and returns a (numValues * encoderSize, batchSize) column array with the
+    units of value 0 first. activeIndices gives the bin code in sparse form,
+    found directly from the values without visiting every unit.
+    """
+
+    def __init__(self, numValues, encoderSize, gaussian = False, sharpness = 30.0, dtype = np.float64):
+        self._numValues = numValues
+        self._encoderSize = encoderSize
+
+        self._gaussian = gaussian
+        self._sharpness = sharpness
+
+        self._dtype = dtype
+
+        self._centers = (np.arange(encoderSize) / encoderSize * 2.0 - 1.0).reshape(1, encoderSize, 1)
+
+        # First unit of every value
+        self._offsets = (np.arange(numValues) * encoderSize).reshape(numValues, 1)
+
+    def getNumOutputs(self):
+        return self._numValues * self._encoderSize
+
+    def encode(self, values, out = None):
+        """Code of values as a (numOutputs, batchSize) array, written into out if given"""
+        values = np.reshape(values, (self._numValues, -1))
+
+        if out is None:
+            out = np.empty((self.getNumOutputs(), values.shape[1]), self._dtype)
+
+        # Written through a (numValues, encoderSize, batchSize) view
+        assert(out.flags.c_contiguous)
+
+        units = out.reshape(self._numValues, self._encoderSize, values.shape[1])
+
+        np.subtract(self._centers, values[:, None, :], out=units)
+
+        if self._gaussian:
+            np.square(units, out=units)
+            units *= -self._sharpness
+            np.exp(units, out=units)
+        else:
+            np.absolute(units, out=units)
+            np.less(units, 0.5 / self._encoderSize, out=units)
+
+        return out
+
+    def activeIndices(self, values):
+        """Sparse bin code: the active unit of every value as a (numValues, batchSize) array, -1 where a value falls between bins"""
+        assert(not self._gaussian)
+
+        values = np.reshape(values, (self._numValues, -1))
+
+        # Only the nearest center can be close enough
+        bins = np.rint((values + 1.0) * (self._encoderSize / 2.0)).astype(np.intp)
+
+        np.clip(bins, 0, self._encoderSize - 1, out=bins)
+
+        active = np.abs(bins / self._encoderSize * 2.0 - 1.0 - values) < 0.5 / self._encoderSize
+
+        rows = bins + self._offsets
+
+        rows[~active] = -1
+
+        return rows
@@ -0,0 +1,68 @@
+"""Cheap forks of a Hierarchy or Agent for lookahead and what-if inference.
+
+A fork is a new model that shares every array only learning changes with its
+parent (an object's _frozenNames(): weights, biases, column offsets and the
+weight-sized eligibility traces of LayerRL and Agent), and has its own copy of
+everything else (states, previous states, predictions, inputs, small traces,
+the value estimate). Making one costs about the size of the per-step state, not
+of the model, so many forks can be stepped from the same point with infer() and
+thrown away.
+
+The shared arrays are read-only views in the fork, so forks are inference-only:
+simStep() on a fork raises instead of changing the parent's weights. While
+forks are in use, the parent's own learning changes their weights as well.
+
+Like Checkpoint, forking walks the attributes of the object tree. Scratch
+objects and views (_scratchNames, _viewNames()) are rebuilt by _createScratch,
+and a RandomStream is replaced by a child stream spawned from it, so forks
+explore independently of their parent and of each other.
+"""
+
+import numpy as np
+from neo.RandomStream import RandomStream
+
+def fork(obj, replaced = None):
+    """A fork of obj (a Hierarchy, Agent or layer) that shares its frozen arrays read-only.
+
+    replaced maps attribute names to values the fork takes as they are instead of forking the parent's.
+    """
+    if replaced is None:
+        replaced = {}
+
+    cls = type(obj)
+
+    clone = cls.__new__(cls)
+
+    skipped = tuple(getattr(obj, "_scratchNames", ()))
+
+    if hasattr(obj, "_viewNames"):
+        skipped += tuple(obj._viewNames())
+
+    frozen = obj._frozenNames() if hasattr(obj, "_frozenNames") else ()
+
+    for name, value in vars(obj).items():
+        # Skip scratch objects and methods overridden on the instance (such as Profiler wrappers)
+        if name in skipped or (callable(value) and hasattr(cls, name)):
+            continue
+
+        if name in replaced:
+            value = replaced[name]
+        elif isinstance(value, np.ndarray):
+            if name in frozen:
+                value = value.view()
+                value.flags.writeable = False
+            else:
+                value = value.copy()
+        elif isinstance(value, list):
+            value = [ fork(item) for item in value ]
+        elif isinstance(value, RandomStream):
+            value = value.spawn(1)[0]
+        elif type(value).__module__.startswith("neo."):
+            value = fork(value)
+
+        setattr(clone, name, value)
+
+    if hasattr(clone, "_createScratch"):
+        clone._createScratch()
+
+    return clone
@@ -1,60 +1,336 @@
-import numpy as np
-from neo.Layer import Layer
-
-class Hierarchy:
-    """A hierarchy of fully connected NeoRL layers"""
-
-    def __init__(self, numInputs, layerSizes, initMinWeight, initMaxWeight, activeRatio):
-        self._layers = []
-
-        # Create layers
-        for l in range(0, len(layerSizes)):
-            layer = None
-
-            if l == 0:
-                if l < len(layerSizes) - 1:
-                    layer = Layer(numInputs, layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio)
-                else:
-                    layer = Layer(numInputs, layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio)
-            else:
-                if l < len(layerSizes) - 1:
-                    layer = Layer(layerSizes[l - 1], layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio)
-                else:
-                    layer = Layer(layerSizes[l - 1], layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio)
-
-            self._layers.append(layer)
-
-    def simStep(self, input, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
-        # Up pass
-        for l in range(0, len(self._layers)):
-            if l == 0:
-                self._layers[l].upPass(input)
-            else:
-                self._layers[l].upPass(self._layers[l - 1]._states)
-
-        # Down pass
-        for l in range(0, len(self._layers)):
-            rl = len(self._layers) - 1 - l
-
-            if rl < len(self._layers) - 1:
-                self._layers[rl].downPass(self._layers[rl + 1]._predictions, rl != 0)
-            else:
-                self._layers[rl].downPass(np.matrix([[ 0 ]]), rl != 0)
-
-        # Learn
-        for l in range(0, len(self._layers)):
-            if l == 0:
-                if l < len(self._layers) - 1:
-                    self._layers[l].learn(input, self._layers[l + 1]._predictionsPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-                else:
-                    self._layers[l].learn(input, np.matrix([[ 0 ]]), learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-            else:
-                if l < len(self._layers) - 1:
-                    self._layers[l].learn(self._layers[l - 1]._states, self._layers[l + 1]._predictionsPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-                else:
-                    self._layers[l].learn(self._layers[l - 1]._states, np.matrix([[ 0 ]]), learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
-
-    def getPrediction(self):
-        return self._layers[0]._predictions
-          
-       
\ No newline at end of file
+import time
+import numpy as np
+from neo.Layer import Layer
+from neo.LayerLocal import LayerLocal
+from neo.RandomStream import RandomStream
+from neo import Checkpoint
+from neo import Fork
+from neo import Prune
+from neo import Streaming
+
+class Hierarchy:
+    """A hierarchy of fully connected NeoRL layers
+
+    With batchSize > 1, simStep takes a (numInputs, batchSize) array with one
+    column per instance and steps all instances together, see Layer.
+    sparseLearn switches every layer to the active-unit learning path, and
+    inPlace makes every layer reuse its buffers between steps, see Layer.
+    Weights, states and temporaries use dtype (e.g. np.float32), traces are
+    stored as traceDtype (e.g. np.float16) and default to dtype.
+    Given a connectivity (see Connectivity) the layers are locally connected,
+    see LayerLocal.
+    fused (dense layers only) stores the weights of every layer in two blocks,
+    see Layer.
+    Weights are initialized from the model's own RandomStream, seeded by seed.
+
+    save() and load() checkpoint the full state, see Checkpoint.
+    setProfiler() attaches a Profiler that times every phase of every layer.
+    setScheduler() runs the layers concurrently on threads, see Scheduler.
+    infer() steps without learning and rollout() predicts several steps ahead
+    without changing the hierarchy. fork() makes a cheap inference-only copy
+    that shares the weights, for what-if predictions from the current state,
+    see Fork. fit() and evaluate() run over long (e.g. memory mapped) sequences
+    in chunks, see Streaming. setLearnGate() skips the weight updates of layers
+    whose running prediction error is low, getLearnStats() counts the skips.
+    prune() makes an inference-only copy with sparse weights, see Prune.
+    """
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_profiler', '_scheduler', '_rolloutCopies', '_pipeline')
+
+    def __init__(self, numInputs, layerSizes, initMinWeight, initMaxWeight, activeRatio, batchSize = 1, sharedWeights = True, sparseLearn = False, inPlace = False, dtype = np.float64, traceDtype = None, connectivity = None, fused = False, seed = None):
+        self._layers = []
+
+        self._batchSize = batchSize
+
+        # Draws the initial weights
+        self._random = RandomStream(seed)
+
+        self._zeroFeedBack = np.zeros((1, batchSize), dtype)
+
+        self._createScratch()
+
+        # Locally connected layers when a connectivity is given
+        layerType = Layer if connectivity is None else lambda *args: LayerLocal(*args, connectivity=connectivity)
+
+        # Create layers
+        for l in range(0, len(layerSizes)):
+            layer = None
+
+            if l == 0:
+                if l < len(layerSizes) - 1:
+                    layer = layerType(numInputs, layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+                else:
+                    layer = layerType(numInputs, layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+            else:
+                if l < len(layerSizes) - 1:
+                    layer = layerType(layerSizes[l - 1], layerSizes[l], layerSizes[l], initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+                else:
+                    layer = layerType(layerSizes[l - 1], layerSizes[l], 1, initMinWeight, initMaxWeight, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused, self._random.getGenerator())
+
+            self._layers.append(layer)
+
+    def simStep(self, input, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
+        rates = (learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay)
+
+        if self._scheduler is not None and self._scheduler.getMode() == 'pipelined':
+            self._simStepPipelined(input, rates)
+
+            return
+
+        # Up pass
+        for l in range(0, len(self._layers)):
+            if l == 0:
+                self._layers[l].upPass(input)
+            else:
+                self._layers[l].upPass(self._layers[l - 1]._states)
+
+        # Down pass
+        for l in range(0, len(self._layers)):
+            rl = len(self._layers) - 1 - l
+
+            if rl < len(self._layers) - 1:
+                self._layers[rl].downPass(self._layers[rl + 1]._predictions, rl != 0)
+            else:
+                self._layers[rl].downPass(self._zeroFeedBack, rl != 0)
+
+        # Learn
+        if self._scheduler is None:
+            for l in range(0, len(self._layers)):
+                self._learnLayer(l, rates)
+        else:
+            self._scheduler.map(lambda l: self._learnLayer(l, rates), len(self._layers))
+
+    def infer(self, input):
+        """simStep without learning, for a trained hierarchy. Returns the prediction of the next input.
+
+        Skips learn() and the previous input and prediction bookkeeping that only
+        learning needs, and writes into the existing state buffers.
+        """
+        # Up pass
+        for l in range(0, len(self._layers)):
+            if l == 0:
+                self._layers[l].inferUp(input)
+            else:
+                self._layers[l].inferUp(self._layers[l - 1]._states)
+
+        # Down pass
+        for l in range(0, len(self._layers)):
+            rl = len(self._layers) - 1 - l
+
+            if rl < len(self._layers) - 1:
+                self._layers[rl].inferDown(self._layers[rl + 1]._predictions, rl != 0)
+            else:
+                self._layers[rl].inferDown(self._zeroFeedBack, rl != 0)
+
+        return self.getPrediction()
+
+    def rollout(self, numSteps, binary = True, out = None):
+        """Predictions of the next numSteps inputs as a (numSteps, numInputs, batchSize) array.
+
+        The first is the current prediction, every later one is inferred by feeding
+        the previous prediction back as input (thresholded at 0.5 if binary). The
+        per-step state is restored afterwards, so the hierarchy is left exactly as
+        it was.
+        """
+        prediction = self.getPrediction()
+
+        if out is None:
+            out = np.empty((numSteps,) + prediction.shape, prediction.dtype)
+
+        saved = self._saveInferenceState()
+
+        try:
+            for k in range(0, numSteps):
+                if k == 0:
+                    np.copyto(out[k], prediction)
+                elif binary:
+                    np.copyto(out[k], self.infer(out[k - 1] > 0.5))
+                else:
+                    np.copyto(out[k], self.infer(out[k - 1]))
+        finally:
+            self._restoreInferenceState(saved)
+
+        return out
+
+    def fork(self):
+        """A copy of the per-step state that shares the weights read-only, to be stepped with infer() or rollout(), see Fork"""
+        return Fork.fork(self)
+
+    def prune(self, method, amount):
+        """An inference-only copy with the weights pruned by 'magnitude' or 'topk' and stored as CSC matrices, see Prune"""
+        return Prune.prune(self, method, amount)
+
+    def fit(self, data, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay, chunkSize = 1024, reportInterval = 1000, callback = None):
+        """Trains on a sequence of input vectors, one simStep each, and scores every next-step prediction.
+
+        data is an array (e.g. memory mapped) or iterable of input vectors, read
+        chunkSize at a time, see Streaming. Every reportInterval steps the error
+        rates of that window are passed to callback. Returns the overall error
+        rates with the windows under 'history', see Streaming.PredictionMetrics.
+        """
+        return self._runSequence(data, lambda input: self.simStep(input, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay), chunkSize, reportInterval, callback)
+
+    def evaluate(self, data, chunkSize = 1024, reportInterval = None, callback = None):
+        """Scores the next-step predictions over a sequence like fit(), stepping with infer() so nothing is learned"""
+        return self._runSequence(data, self.infer, chunkSize, reportInterval, callback)
+
+    def getPrediction(self):
+        return self._layers[0]._predictions
+
+    def setProfiler(self, profiler):
+        """Attaches a Profiler to the layers, or detaches the current one with None"""
+        if self._profiler is not None:
+            self._profiler.detach()
+
+        self._profiler = profiler
+
+        if profiler is not None:
+            profiler.attach(self)
+
+    def setScheduler(self, scheduler):
+        """Runs the layers on the threads of a Scheduler from now on, or one after another again with None. A replaced scheduler is shut down."""
+        if self._scheduler is not None and self._scheduler is not scheduler:
+            self._scheduler.shutdown()
+
+        self._scheduler = scheduler
+
+        if scheduler is not None and scheduler.getMode() == 'pipelined':
+            self._pipeline = scheduler.createPipeline(self._layers, self._zeroFeedBack)
+        else:
+            self._pipeline = None
+
+    def setLearnGate(self, threshold, errorDecay = 0.99, learnInterval = 0):
+        """Skips the weight updates of every layer while its running squared prediction error is below threshold, see Layer.setLearnGate.
+
+        threshold is one value for all layers or a list with one per layer,
+        since higher layers predict sparse states and settle at larger errors.
+        """
+        thresholds = threshold if isinstance(threshold, (list, tuple)) else [ threshold ] * len(self._layers)
+
+        assert(len(thresholds) == len(self._layers))
+
+        for l in range(0, len(self._layers)):
+            self._layers[l].setLearnGate(thresholds[l], errorDecay, learnInterval)
+
+    def getLearnStats(self):
+        """The running 'averageSquaredError' (updated only while a learn gate is set) and the 'learned' and 'skipped' weight update counts of every layer"""
+        stats = []
+
+        for layer in self._layers:
+            learned, skipped = layer.getLearnCounts()
+
+            stats.append({ 'averageSquaredError': layer.getAverageSquaredError(), 'learned': learned, 'skipped': skipped })
+
+        return stats
+
+    def save(self, path):
+        """Writes the weights, traces, states and random state to a checkpoint file"""
+        Checkpoint.save(self, path)
+
+    @staticmethod
+    def load(path, mmapMode = None):
+        """Reads a Hierarchy written by save(), optionally memory mapping the weights ('r' or 'c')"""
+        hierarchy = Checkpoint.load(path, mmapMode)
+
+        assert(isinstance(hierarchy, Hierarchy))
+
+        return hierarchy
+
+    def _createScratch(self):
+        self._profiler = None
+
+        self._scheduler = None
+
+        # Signals of the previous step for a pipelined scheduler, see setScheduler
+        self._pipeline = None
+
+        # Reused by rollout to save the per-step state
+        self._rolloutCopies = {}
+
+    def _runSequence(self, data, step, chunkSize, reportInterval, callback):
+        metrics = Streaming.PredictionMetrics(reportInterval, callback)
+
+        predictions = np.empty((chunkSize,) + self.getPrediction().shape, dtype=bool)
+
+        # Prediction made at the end of the previous chunk
+        pending = np.empty(self.getPrediction().shape, dtype=bool)
+        hasPending = False
+
+        for chunk in Streaming.chunks(data, chunkSize, self._zeroFeedBack.dtype):
+            count = len(chunk)
+
+            start = time.perf_counter()
+
+            for t in range(0, count):
+                step(chunk[t])
+
+                np.greater(self.getPrediction(), 0.5, out=predictions[t])
+
+            duration = time.perf_counter() - start
+
+            if hasPending:
+                metrics.add(pending[None], chunk[:1], duration / count)
+
+            metrics.add(predictions[:count - 1], chunk[1:count], duration * (count - 1) / count)
+
+            np.copyto(pending, predictions[count - 1])
+            hasPending = True
+
+        return metrics.finish()
+
+    def _saveInferenceState(self):
+        """Copies of the arrays infer() changes, together with the arrays themselves (infer swaps some of them)"""
+        saved = []
+
+        for l in range(0, len(self._layers)):
+            layer = self._layers[l]
+
+            for name in ('_input', '_states', '_statesPrev', '_predictions'):
+                array = getattr(layer, name)
+
+                copy = self._rolloutCopies.get((l, name))
+
+                if copy is None or copy.shape != array.shape:
+                    copy = np.empty_like(array)
+
+                    self._rolloutCopies[(l, name)] = copy
+
+                np.copyto(copy, array)
+
+                saved.append((layer, name, array, copy))
+
+            # Replaced rather than changed by inferUp
+            saved.append((layer, '_activeIndices', layer._activeIndices, None))
+
+        return saved
+
+    def _restoreInferenceState(self, saved):
+        for layer, name, array, copy in saved:
+            setattr(layer, name, array)
+
+            if copy is not None:
+                np.copyto(array, copy)
+
+    def _learnLayer(self, l, rates):
+        if l == 0:
+            target = self._layers[l]._input
+        else:
+            target = self._layers[l - 1]._states
+
+        if l < len(self._layers) - 1:
+            feedBackPrev = self._layers[l + 1]._predictionsPrev
+        else:
+            feedBackPrev = self._zeroFeedBack
+
+        self._layers[l].learn(target, feedBackPrev, *rates)
+
+    def _simStepPipelined(self, input, rates):
+        """Steps all layers at once, each on the states below and predictions above from the previous step"""
+        def learnLayer(l, feedBackPrev):
+            self._layers[l].learn(self._layers[l]._input, feedBackPrev, *rates)
+
+        self._scheduler.mapPipelined(self._layers, self._pipeline, input, learnLayer)
+
+    def _profiledPhases(self):
+        return ()
@@ -0,0 +1,333 @@
+"""Asynchronous population training of one Agent over worker processes (Hogwild).
+
+The learned arrays of the agent (the weights of every layer and of the value
+estimate, the biases and, with sparseLearn, the column offsets) are copied into
+one shared memory block, see SharedParameters. Every worker process loads its
+own copy of the agent (states, traces, workspace and random stream stay
+private), points the learned arrays at the shared block and runs its own Pong
+games with bin encoded observations, as in the RL demo. All workers update the
+same weights in place without any locking, so an update may overwrite part of
+a concurrent one; with sparse, small updates this costs little and every worker
+runs at full speed. With useLocks the learn() of every layer and the value
+update each take a lock of their own instead, so the writes to one set of
+weights never overlap (reads in the passes still do not wait).
+
+The agent needs sharedWeights. Each worker steps agent.batchSize games at once.
+
+train() is the coordinator: it starts the workers, and every reportInterval
+seconds reads their step and reward counters into a window of the global step
+count, the average reward and the throughput. It stops the workers once
+numSteps environment steps are done, the average reward of a window reaches
+targetReward or timeLimit seconds have passed, and copies the shared weights
+back into the agent.
+"""
+
+import multiprocessing
+import os
+import tempfile
+import time
+from multiprocessing import shared_memory
+import numpy as np
+from neo import Sweep
+
+# Offsets of the arrays in the shared block are multiples of this
+alignment = 64
+
+def _sharedNames(obj):
+    """Attributes of an Agent or layer that all workers learn together"""
+    names = list(obj._parameterNames())
+
+    if hasattr(obj, '_biases'):
+        names.append('_biases')
+
+    if getattr(obj, '_sparseLearn', False):
+        names += [ '_feedForwardOffsets', '_recurrentOffsets' ]
+
+    return names
+
+def _sharedObjects(agent):
+    """The agent followed by its layers, indexed as in a SharedParameters layout"""
+    return [ agent ] + agent._layers
+
+class SharedParameters:
+    """The learned arrays of an Agent copied into one shared memory block
+
+    The layout lists (object index, attribute, offset, shape, dtype) for every
+    array, with the agent as object 0 and its layers after it.
+    """
+
+    def __init__(self, agent):
+        objects = _sharedObjects(agent)
+
+        self._layout = []
+
+        size = 0
+
+        for o in range(0, len(objects)):
+            for name in _sharedNames(objects[o]):
+                array = getattr(objects[o], name)
+
+                self._layout.append((o, name, size, array.shape, array.dtype.str))
+
+                size += -(-array.nbytes // alignment) * alignment
+
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, size))
+
+        for o, name, offset, shape, dtype in self._layout:
+            np.copyto(self._view(o, name, offset, shape, dtype), getattr(objects[o], name))
+
+    def getDescriptor(self):
+        """(name, layout) to pass to attach in a worker"""
+        return (self._memory.name, self._layout)
+
+    def copyTo(self, agent):
+        """Copies the shared arrays into the (unattached) arrays of agent"""
+        objects = _sharedObjects(agent)
+
+        for o, name, offset, shape, dtype in self._layout:
+            np.copyto(getattr(objects[o], name), self._view(o, name, offset, shape, dtype))
+
+    def release(self):
+        self._memory.close()
+        self._memory.unlink()
+
+    def _view(self, o, name, offset, shape, dtype):
+        return np.ndarray(shape, dtype, buffer=self._memory.buf, offset=offset)
+
+    @staticmethod
+    def attach(agent, descriptor):
+        """Points the learned arrays of agent at the shared block, returns the shared memory, which must be kept alive as long as the agent"""
+        memoryName, layout = descriptor
+
+        memory = shared_memory.SharedMemory(name=memoryName)
+
+        objects = _sharedObjects(agent)
+
+        for o, name, offset, shape, dtype in layout:
+            assert(getattr(objects[o], name).shape == tuple(shape))
+
+            setattr(objects[o], name, np.ndarray(shape, dtype, buffer=memory.buf, offset=offset))
+
+        # Views into fused blocks must follow the blocks
+        for layer in agent._layers:
+            if layer._fused:
+                layer._splitWeights()
+
+        return memory
+
+def _lockMethod(obj, methodName, lock):
+    """Makes obj.methodName hold lock while it runs"""
+    method = getattr(obj, methodName)
+
+    def wrapper(*args, **kwargs):
+        with lock:
+            return method(*args, **kwargs)
+
+    setattr(obj, methodName, wrapper)
+
+def _runWorker(index, checkpointPath, descriptor, countersDescriptor, seed, config, locks, stop, blasThreads, checkInterval):
+    from neo.Agent import Agent
+    from neo.Encoder import Encoder
+    from neo.Pong import Pong
+    from neo.RandomStream import RandomStream
+
+    Sweep.limitBlasThreads(blasThreads)
+
+    # The weights are replaced by the shared ones, so they are only mapped
+    agent = Agent.load(checkpointPath, 'c')
+
+    memory = SharedParameters.attach(agent, descriptor)
+
+    counters, countersMemory = Sweep.SharedArray.attach(countersDescriptor, True)
+
+    # Independent streams for the exploration and the environment
+    agentSeed, envSeed = seed.spawn(2)
+
+    agent._random = RandomStream(agentSeed)
+
+    if locks is not None:
+        layerLocks, qLock = locks
+
+        for l in range(0, len(agent._layers)):
+            _lockMethod(agent._layers[l], 'learn', layerLocks[l])
+
+        _lockMethod(agent, '_updateQ', qLock)
+
+    batchSize = agent._batchSize
+
+    env = Pong(batchSize, envSeed)
+    encoder = Encoder(Pong.numObservations, config['encoderSize'])
+
+    encoded = np.zeros((encoder.getNumOutputs(), batchSize))
+
+    assert(encoder.getNumOutputs() == agent._numInputs)
+
+    row = counters[index]
+
+    numSteps = 0
+    rewardSum = 0.0
+
+    while not stop.is_set():
+        for t in range(0, checkInterval):
+            observations, rewards = env.step(agent.getActions()[0])
+
+            rewardSum += np.sum(rewards)
+
+            agent.simStep(rewards, config['qAlpha'], config['qGamma'], config['exploration'], encoder.encode(observations, out=encoded),
+                config['learnEncoderRate'], config['learnRecurrentRate'], config['learnDecoderRate'], config['learnBiasRate'], config['traceDecay'])
+
+        numSteps += checkInterval * batchSize
+
+        # Only this worker writes its row
+        row[0] = numSteps
+        row[1] = rewardSum
+
+    del row, counters
+
+    countersMemory.close()
+
+    # The agent's arrays still point into the block
+    del agent
+
+    memory.close()
+
+def train(agent, numWorkers, config = None, numSteps = None, targetReward = None, timeLimit = None, useLocks = False, reportInterval = 1.0, seed = None, callback = None, blasThreads = 1, checkInterval = 100):
+    """Trains agent on Pong with numWorkers worker processes until one of the stopping conditions holds.
+
+    config holds the encoder size, value learning and layer learning parameters
+    of Sweep.pongDefaults (the default). seed seeds the workers' exploration and
+    games. Every reportInterval seconds a window with the 'time', global 'steps',
+    'averageReward' and 'stepsPerSecond' (environment steps of all workers) is
+    added to the history and passed to callback, if given. Workers report every
+    checkInterval steps.
+
+    Returns the metrics: the windows under 'history', the total 'steps',
+    'seconds', 'averageReward' and 'stepsPerSecond', the 'steps' of every worker
+    under 'workerSteps', and the time at which targetReward was reached under
+    'timeToTarget' (None if it was not).
+    """
+    assert(numWorkers > 0)
+    assert(numSteps is not None or targetReward is not None or timeLimit is not None)
+    assert(all(layer._sharedWeights for layer in agent._layers))
+
+    config = Sweep.pongDefaults if config is None else config
+
+    context = multiprocessing.get_context('spawn')
+
+    seeds = np.random.SeedSequence(seed).spawn(numWorkers)
+
+    parameters = SharedParameters(agent)
+
+    # Steps and summed reward of every worker
+    counters = Sweep.SharedArray(np.zeros((numWorkers, 2)))
+    totals, countersMemory = Sweep.SharedArray.attach(counters.getDescriptor())
+
+    locks = None
+
+    if useLocks:
+        locks = ([ context.Lock() for l in range(0, len(agent._layers)) ], context.Lock())
+
+    stop = context.Event()
+
+    directory = tempfile.TemporaryDirectory()
+
+    checkpointPath = os.path.join(directory.name, 'agent.npz')
+
+    agent.save(checkpointPath)
+
+    workers = [ context.Process(target=_runWorker, args=(i, checkpointPath, parameters.getDescriptor(), counters.getDescriptor(), seeds[i], config, locks, stop, blasThreads, checkInterval))
+        for i in range(0, numWorkers) ]
+
+    history = []
+    timeToTarget = None
+
+    try:
+        with Sweep.blasThreadEnvironment(blasThreads):
+            for worker in workers:
+                worker.start()
+
+        start = time.perf_counter()
+
+        windowStart = start
+        windowTotals = np.zeros(2)
+
+        while True:
+            time.sleep(reportInterval)
+
+            now = time.perf_counter()
+
+            # A worker may be between writing its two counters, which evens out over the next window
+            steps, rewardSum = np.sum(totals, axis=0)
+
+            windowSteps = steps - windowTotals[0]
+
+            window = {
+                'time': now - start,
+                'steps': int(steps),
+                'averageReward': float((rewardSum - windowTotals[1]) / windowSteps) if windowSteps > 0 else 0.0,
+                'stepsPerSecond': float(windowSteps / (now - windowStart))
+            }
+
+            history.append(window)
+
+            if callback is not None:
+                callback(window)
+
+            windowStart = now
+            windowTotals[:] = (steps, rewardSum)
+
+            for worker in workers:
+                if worker.exitcode is not None:
+                    raise RuntimeError("Hogwild worker exited with code %d" % worker.exitcode)
+
+            if numSteps is not None and steps >= numSteps:
+                break
+
+            if targetReward is not None and windowSteps > 0 and window['averageReward'] >= targetReward:
+                timeToTarget = window['time']
+
+                break
+
+            if timeLimit is not None and window['time'] >= timeLimit:
+                break
+
+        stop.set()
+
+        for worker in workers:
+            worker.join()
+
+        seconds = time.perf_counter() - start
+
+        workerSteps = totals[:, 0].astype(np.int64).tolist()
+        steps = int(np.sum(totals[:, 0]))
+        rewardSum = float(np.sum(totals[:, 1]))
+
+        parameters.copyTo(agent)
+    finally:
+        stop.set()
+
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+
+            if worker.pid is not None:
+                worker.join()
+
+        del totals
+
+        countersMemory.close()
+        counters.release()
+
+        parameters.release()
+
+        directory.cleanup()
+
+    return {
+        'history': history,
+        'steps': steps,
+        'seconds': seconds,
+        'averageReward': rewardSum / steps if steps > 0 else 0.0,
+        'stepsPerSecond': steps / seconds,
+        'workerSteps': workerSteps,
+        'timeToTarget': timeToTarget
+    }
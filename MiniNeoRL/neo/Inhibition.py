@@ -0,0 +1,94 @@
+"""k-winners-take-all inhibition shared by the NeoRL layers.
+
+Winners are found with a selection (np.partition) instead of a full sort, so
+inhibition is O(n) per column. Ties at the selection threshold are broken
+towards the higher unit index, which matches the previous stable sort that
+took its winners from the end of an ascending (activation, index) ordering.
+"""
+
+import numpy as np
+
+class Inhibitor:
+    """k-winners-take-all for a fixed (numUnits, batchSize) shape that reuses its buffers between calls"""
+
+    def __init__(self, shape, dtype = np.float64):
+        self._partitioned = np.empty(shape, dtype)
+
+        self._mask = np.empty(shape, dtype=bool)
+        self._ties = np.empty(shape, dtype=bool)
+        self._fill = np.empty(shape, dtype=bool)
+
+        self._tieRanks = np.empty(shape, dtype=np.intp)
+
+    def winnerMask(self, activations, numActive):
+        """Boolean mask of the numActive largest activations in each column, valid until the next call"""
+        numUnits = activations.shape[0]
+
+        if numActive <= 0:
+            self._mask.fill(False)
+
+            return self._mask
+
+        if numActive >= numUnits:
+            self._mask.fill(True)
+
+            return self._mask
+
+        # Value of the numActive'th largest activation in each column
+        np.copyto(self._partitioned, activations)
+
+        self._partitioned.partition(numUnits - numActive, axis=0)
+
+        threshold = self._partitioned[numUnits - numActive]
+
+        np.greater(activations, threshold, out=self._mask)
+
+        # Fill the remaining places from the tied units, highest index first
+        if np.count_nonzero(self._mask) < numActive * self._mask[0].size:
+            np.equal(activations, threshold, out=self._ties)
+
+            numMissing = numActive - np.count_nonzero(self._mask, axis=0)
+
+            np.cumsum(self._ties[::-1], axis=0, out=self._tieRanks[::-1])
+            np.less_equal(self._tieRanks, numMissing, out=self._fill)
+
+            self._ties &= self._fill
+            self._mask |= self._ties
+
+        return self._mask
+
+    def inhibit(self, activations, numActive, out):
+        """Writes the 0/1 states with ones at the numActive largest activations into out"""
+        np.copyto(out, self.winnerMask(activations, numActive))
+
+        return out
+
+def winnerMask(activations, numActive):
+    """Boolean mask of the numActive largest activations in each column"""
+    activations = np.asarray(activations)
+
+    return Inhibitor(activations.shape, activations.dtype).winnerMask(activations, numActive)
+
+def kWinners(activations, numActive):
+    """Sorted indices of the numActive largest activations.
+
+    A column vector (or 1-D array) gives a 1-D index array, a (numUnits, batchSize)
+    array gives a (numActive, batchSize) array with one column per batch entry.
+    """
+    mask = winnerMask(activations, numActive)
+
+    if mask.ndim == 1 or mask.shape[1] == 1:
+        return np.flatnonzero(mask)
+
+    return np.nonzero(mask.T)[1].reshape(mask.shape[1], -1).T
+
+def inhibit(activations, numActive, out = None):
+    """Dense 0/1 state array with ones at the numActive largest activations"""
+    mask = winnerMask(activations, numActive)
+
+    if out is None:
+        out = np.zeros(mask.shape)
+
+    np.copyto(out, mask)
+
+    return out
@@ -1,96 +1,344 @@
-import numpy as np
-from operator import itemgetter, attrgetter, methodcaller
-
-class Layer:
-    """A fully-connected NeoRL layer"""
-
-    def __init__(self, numInputs, numHidden, numFeedBack, initMinWeight, initMaxWeight, activeRatio):
-        self._input = np.zeros((numInputs, 1))
-        self._inputPrev = np.zeros((numInputs, 1))
-
-        self._feedForwardWeights = np.random.rand(numHidden, numInputs) * (initMaxWeight - initMinWeight) + initMinWeight
-  
-        self._recurrentWeights = np.random.rand(numHidden, numHidden) * (initMaxWeight - initMinWeight) + initMinWeight
-
-        self._predictiveWeights = np.random.rand(numInputs, numHidden) * (initMaxWeight - initMinWeight) + initMinWeight
-  
-        self._feedBackWeights = np.random.rand(numInputs, numFeedBack) * (initMaxWeight - initMinWeight) + initMinWeight
-
-        self._stateTraces = np.zeros((numHidden, 1))
-
-        self._inputTraces = np.zeros((numInputs, 1))
-
-        self._biases = np.zeros((numHidden, 1))#np.random.rand(numHidden, 1) * (initMaxWeight - initMinWeight) + initMinWeight
-
-        self._states = np.zeros((numHidden, 1))
-        self._statesPrev = np.zeros((numHidden, 1))
-
-        self._feedForwardLearn = np.zeros((numHidden, 1))
-        self._recurrentLearn = np.zeros((numHidden, 1))
-
-        self._predictions = np.zeros((numInputs, 1))
-        self._predictionsPrev = np.zeros((numInputs, 1))
-
-        self._averageSquaredError = np.zeros((numHidden, 1))
-
-        self._activeRatio = activeRatio
-
-    def upPass(self, input):
-        self._inputPrev = self._input
-
-        self._input = input
-
-        self._statesPrev = self._states
-
-        numActive = int(self._activeRatio * len(self._states))
-  
-        # Activate
-        activations = self._biases + np.dot(self._feedForwardWeights, input) + np.dot(self._recurrentWeights, self._statesPrev)
-       
-        # Generate tuples for sorting
-        activationsPairs = []
-
-        for i in range(0, len(self._states)):
-            activationsPairs.append((activations[i], i))
-
-        # Sort
-        activationsPairs = sorted(activationsPairs, key=itemgetter(0))
-
-        # Use sorted information for inhibition
-        self._states = np.zeros((len(self._states), 1))
-
-        for i in range(0, numActive):
-            self._states[activationsPairs[len(activationsPairs) - 1 - i][1]] = 1.0
- 
-    def downPass(self, feedBack, thresholdedPred = True):
-        self._predictionsPrev = self._predictions
-
-        # Find states
-        self._predictions = np.dot(self._predictiveWeights, self._states) + np.dot(self._feedBackWeights, feedBack)
-
-        if thresholdedPred:
-            self._predictions[self._predictions > 0.5] = 1.0
-            self._predictions[self._predictions <= 0.5] = 0.0
-
-    def learn(self, target, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
-        # Find prediction error
-        predError = target - self._predictionsPrev
-
-        # Propagate error
-        hiddenError = np.dot(self._predictiveWeights.T, predError)
-
-        hiddenError = np.multiply(hiddenError, self._statesPrev)
-
-        # Update feed forward and recurrent weights        
-        self._inputTraces = self._inputTraces * traceDecay + self._input
-        self._stateTraces = self._stateTraces * traceDecay + self._statesPrev
-
-        self._feedForwardWeights += learnEncoderRate * (np.dot(self._states, self._inputTraces.T) - np.dot(self._states.T, self._feedForwardWeights))
-        self._recurrentWeights += learnRecurrentRate * (np.dot(self._states, self._statesPrev.T) - np.dot(self._states.T, self._recurrentWeights))
-        
-        # Update predictive and feed back weights
-        self._predictiveWeights += learnDecoderRate * np.dot(predError, self._statesPrev.T)
-        self._feedBackWeights += learnDecoderRate * np.dot(predError, feedBackPrev.T)
-
-        # Update thresholds
-        self._biases += learnBiasRate * (self._activeRatio - self._states)
\ No newline at end of file
+import numpy as np
+from neo.Inhibition import Inhibitor
+from neo.Workspace import Workspace
+from neo import Batch
+from neo import SparseLearn
+
+class Layer:
+    """A fully-connected NeoRL layer
+
+    Steps batchSize independent instances at once. All column vectors become
+    (size, batchSize) arrays. With sharedWeights the instances share one set of
+    weights whose updates are averaged over the batch, otherwise every instance
+    has its own weights stacked into 3-D (batchSize, rows, columns) arrays.
+
+    With sparseLearn (single shared instance only) learn() only visits the rows
+    and columns of active units, see SparseLearn. The feed forward and recurrent
+    weights are then the stored weights plus their column offsets.
+
+    Temporaries live in a Workspace and are reused every step. With inPlace the
+    input, state and prediction arrays are double buffered as well: each step
+    writes into the buffer that held the previous value, so a step allocates
+    (almost) nothing, but arrays obtained from the layer are only valid until
+    the step after next. Without inPlace every step returns fresh arrays.
+
+    setLearnGate() skips the weight updates of learn() while the running
+    prediction error of the layer stays below a threshold.
+
+    With fused the feed forward and recurrent weights are stored side by side in
+    one [feed forward | recurrent] block, and the predictive and feed back
+    weights in one [predictive | feed back] block. Each pass and each dense
+    learning update is then a single product over its inputs copied into one
+    concatenated buffer, and the four weight attributes are views into the
+    blocks. This saves call overhead, which matters for small layers; results
+    match the separate layout up to rounding.
+    """
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_inhibitor', '_workspace')
+
+    def __init__(self, numInputs, numHidden, numFeedBack, initMinWeight, initMaxWeight, activeRatio, batchSize = 1, sharedWeights = True, sparseLearn = False, inPlace = False, dtype = np.float64, traceDtype = None, fused = False, generator = None):
+        assert(not sparseLearn or (batchSize == 1 and sharedWeights))
+
+        dtype = np.dtype(dtype)
+        traceDtype = dtype if traceDtype is None else np.dtype(traceDtype)
+
+        self._feedForwardWeights = Batch.initWeights(batchSize, sharedWeights, numHidden, numInputs, initMinWeight, initMaxWeight, dtype, generator)
+  
+        self._recurrentWeights = Batch.initWeights(batchSize, sharedWeights, numHidden, numHidden, initMinWeight, initMaxWeight, dtype, generator)
+
+        self._predictiveWeights = Batch.initWeights(batchSize, sharedWeights, numInputs, numHidden, initMinWeight, initMaxWeight, dtype, generator)
+  
+        self._feedBackWeights = Batch.initWeights(batchSize, sharedWeights, numInputs, numFeedBack, initMinWeight, initMaxWeight, dtype, generator)
+
+        self._initState(numInputs, numHidden, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused)
+
+        # Column offsets shared by all rows of the feed forward and recurrent weights, see SparseLearn
+        self._feedForwardOffsets = np.zeros((1, numInputs), dtype)
+        self._recurrentOffsets = np.zeros((1, numHidden), dtype)
+
+        if fused:
+            self._fuseWeights()
+
+        self._createScratch()
+
+    def upPass(self, input):
+        input = self._swap('_input', '_inputPrev', input)
+
+        states = self._swap('_states', '_statesPrev')
+
+        self._activate(input, states)
+
+        if self._sparseLearn:
+            self._activeIndicesPrev = self._activeIndices
+            self._activeIndices = np.flatnonzero(states)
+ 
+    def downPass(self, feedBack, thresholdedPred = True):
+        predictions = self._swap('_predictions', '_predictionsPrev')
+
+        self._predict(feedBack, predictions, thresholdedPred)
+
+    def inferUp(self, input):
+        """upPass without the bookkeeping only learn() needs: the input and states are written into the existing buffers"""
+        np.copyto(self._input, np.reshape(input, self._input.shape))
+
+        # The previous states are still needed for the recurrent input
+        self._statesPrev, self._states = self._states, self._statesPrev
+
+        self._activate(self._input, self._states)
+
+        if self._sparseLearn:
+            self._activeIndices = np.flatnonzero(self._states)
+
+    def inferDown(self, feedBack, thresholdedPred = True):
+        """downPass that overwrites the predictions instead of keeping the previous ones"""
+        self._predict(feedBack, self._predictions, thresholdedPred)
+
+    def learn(self, target, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
+        # Find prediction error
+        predError = np.subtract(target, self._predictionsPrev, out=self._workspace.like('predError', self._predictionsPrev))
+
+        # Update feed forward and recurrent weights        
+        self._inputTraces *= traceDecay
+        self._inputTraces += self._input
+
+        self._stateTraces *= traceDecay
+        self._stateTraces += self._statesPrev
+
+        if self._passLearnGate(predError):
+            if self._sparseLearn:
+                SparseLearn.learnCompetitive(self._feedForwardWeights, self._feedForwardOffsets, self._activeIndices, self._inputTraces, learnEncoderRate, self._workspace)
+                SparseLearn.learnCompetitive(self._recurrentWeights, self._recurrentOffsets, self._activeIndices, self._statesPrev, learnRecurrentRate, self._workspace)
+
+                # Update predictive and feed back weights
+                SparseLearn.learnOuter(self._predictiveWeights, predError, self._statesPrev, learnDecoderRate, self._activeIndicesPrev, self._workspace)
+                SparseLearn.learnOuter(self._feedBackWeights, predError, feedBackPrev, learnDecoderRate, None, self._workspace)
+            elif self._fused:
+                # One update per block, the feed forward and recurrent columns at their own rates
+                Batch.learnCompetitiveColumns(self._upWeights, self._states, Batch.concatenate(self._inputTraces, self._statesPrev, self._workspace, 'upLearnInput'), self._upRates(learnEncoderRate, learnRecurrentRate), self._workspace)
+
+                Batch.learnOuter(self._downWeights, predError, Batch.concatenate(self._statesPrev, feedBackPrev, self._workspace, 'downLearnInput'), learnDecoderRate, self._workspace)
+            else:
+                Batch.learnCompetitive(self._feedForwardWeights, self._states, self._inputTraces, learnEncoderRate, self._workspace)
+                Batch.learnCompetitive(self._recurrentWeights, self._states, self._statesPrev, learnRecurrentRate, self._workspace)
+
+                # Update predictive and feed back weights
+                Batch.learnOuter(self._predictiveWeights, predError, self._statesPrev, learnDecoderRate, self._workspace)
+                Batch.learnOuter(self._feedBackWeights, predError, feedBackPrev, learnDecoderRate, self._workspace)
+
+        # Update thresholds
+        biasUpdate = np.subtract(self._activeRatio, self._states, out=self._workspace.like('biasUpdate', self._states))
+        biasUpdate = Batch.meanColumns(biasUpdate, self._biases)
+        biasUpdate *= learnBiasRate
+
+        self._biases += biasUpdate
+
+    def setLearnGate(self, threshold, errorDecay = 0.99, learnInterval = 0):
+        """Skips the weight updates of learn() while the running squared prediction error is below threshold.
+
+        The error is averaged with weight 1 - errorDecay per step, over all inputs
+        and instances, and kept up to date on skipped steps as well, so learning
+        resumes as soon as it rises past threshold again. The traces and biases
+        are always updated. learnInterval > 0 still updates the weights every
+        learnInterval-th gated step instead of never. threshold None turns the
+        gate off, and the running error is only updated while a gate is set.
+        """
+        self._learnGateThreshold = threshold
+        self._errorDecay = errorDecay
+        self._learnInterval = learnInterval
+
+    def getAverageSquaredError(self):
+        """The running squared prediction error, updated only while a learn gate is set"""
+        return self._averageSquaredError.item(0)
+
+    def getLearnCounts(self):
+        """(weight updates done, weight updates skipped) by learn() so far"""
+        return self._numLearnSteps, self._numSkippedSteps
+
+    def foldOffsets(self):
+        """Moves the column offsets accumulated by sparse learning into the feed forward and recurrent weights"""
+        SparseLearn.fold(self._feedForwardWeights, self._feedForwardOffsets)
+        SparseLearn.fold(self._recurrentWeights, self._recurrentOffsets)
+
+    def _initState(self, numInputs, numHidden, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused):
+        """Everything but the weights: inputs, traces, biases, states, predictions, the learn gate and the settings"""
+        self._input = np.zeros((numInputs, batchSize), dtype)
+        self._inputPrev = np.zeros((numInputs, batchSize), dtype)
+
+        self._stateTraces = np.zeros((numHidden, batchSize), traceDtype)
+
+        self._inputTraces = np.zeros((numInputs, batchSize), traceDtype)
+
+        self._biases = np.zeros((numHidden, 1 if sharedWeights else batchSize), dtype)#np.random.rand(numHidden, 1) * (initMaxWeight - initMinWeight) + initMinWeight
+
+        self._states = np.zeros((numHidden, batchSize), dtype)
+        self._statesPrev = np.zeros((numHidden, batchSize), dtype)
+
+        self._feedForwardLearn = np.zeros((numHidden, 1), dtype)
+        self._recurrentLearn = np.zeros((numHidden, 1), dtype)
+
+        self._predictions = np.zeros((numInputs, batchSize), dtype)
+        self._predictionsPrev = np.zeros((numInputs, batchSize), dtype)
+
+        # Running mean of the squared prediction error, starting high so the gate opens at first, see setLearnGate
+        self._averageSquaredError = np.ones((1, 1), dtype)
+
+        self._learnGateThreshold = None
+        self._errorDecay = 0.99
+        self._learnInterval = 0
+
+        self._numLearnSteps = 0
+        self._numSkippedSteps = 0
+
+        # Steps below the threshold, counted for learnInterval
+        self._numGatedSteps = 0
+
+        self._activeRatio = activeRatio
+
+        self._batchSize = batchSize
+        self._sharedWeights = sharedWeights
+
+        self._sparseLearn = sparseLearn
+
+        self._activeIndices = np.zeros(0, dtype=np.intp)
+        self._activeIndicesPrev = np.zeros(0, dtype=np.intp)
+
+        self._inPlace = inPlace
+
+        self._dtype = dtype
+        self._traceDtype = traceDtype
+
+        self._fused = fused
+
+    def _passLearnGate(self, predError):
+        """Updates the running prediction error and returns whether this learn() step updates the weights"""
+        # Without a gate every step learns and the error is not tracked, which keeps the ungated learn() as cheap as before
+        if self._learnGateThreshold is None:
+            self._numLearnSteps += 1
+
+            return True
+
+        squaredError = np.vdot(predError, predError) / predError.size
+
+        self._averageSquaredError *= self._errorDecay
+        self._averageSquaredError += (1.0 - self._errorDecay) * squaredError
+
+        passed = self._averageSquaredError.item(0) >= self._learnGateThreshold
+
+        # Subsampled learning below the threshold
+        if not passed:
+            self._numGatedSteps += 1
+
+            passed = self._learnInterval > 0 and self._numGatedSteps % self._learnInterval == 0
+
+        if passed:
+            self._numLearnSteps += 1
+        else:
+            self._numSkippedSteps += 1
+
+        return passed
+
+    def _parameterNames(self):
+        """Attributes that hold learned weights, which a checkpoint can memory map"""
+        if self._fused:
+            return ('_upWeights', '_downWeights')
+
+        return ('_feedForwardWeights', '_recurrentWeights', '_predictiveWeights', '_feedBackWeights')
+
+    def _frozenNames(self):
+        """Attributes only learning changes, which a fork shares read-only"""
+        return tuple(self._parameterNames()) + ('_biases', '_feedForwardOffsets', '_recurrentOffsets')
+
+    def _viewNames(self):
+        """Attributes that are views into other arrays, rebuilt by _createScratch instead of being checkpointed"""
+        if self._fused:
+            return ('_feedForwardWeights', '_recurrentWeights', '_predictiveWeights', '_feedBackWeights')
+
+        return ()
+
+    def _createScratch(self):
+        self._inhibitor = Inhibitor(self._states.shape, self._dtype)
+
+        self._workspace = Workspace(self._dtype)
+
+        if self._fused:
+            self._splitWeights()
+
+    def _fuseWeights(self):
+        """Moves the weights into the [feed forward | recurrent] and [predictive | feed back] blocks, split again by _createScratch"""
+        self._upWeights = np.concatenate((self._feedForwardWeights, self._recurrentWeights), axis=-1)
+        self._downWeights = np.concatenate((self._predictiveWeights, self._feedBackWeights), axis=-1)
+
+    def _splitWeights(self):
+        """Points the weight attributes at their columns of the fused blocks"""
+        numInputs = self._input.shape[0]
+        numHidden = self._states.shape[0]
+
+        self._feedForwardWeights = self._upWeights[..., :numInputs]
+        self._recurrentWeights = self._upWeights[..., numInputs:]
+        self._predictiveWeights = self._downWeights[..., :numHidden]
+        self._feedBackWeights = self._downWeights[..., numHidden:]
+
+    def _upRates(self, learnEncoderRate, learnRecurrentRate):
+        """Learning rate of every column of the [feed forward | recurrent] block"""
+        rates = self._workspace.get('upRates', (1, self._upWeights.shape[-1]))
+
+        rates[:, :len(self._input)] = learnEncoderRate
+        rates[:, len(self._input):] = learnRecurrentRate
+
+        return rates
+
+    def _activate(self, input, states):
+        numActive = int(self._activeRatio * len(states))
+  
+        # Activate
+        if self._fused:
+            activations = Batch.matVec(self._upWeights, Batch.concatenate(input, self._statesPrev, self._workspace, 'upInput'), out=self._workspace.like('activations', states))
+            activations += self._biases
+        else:
+            activations = Batch.matVec(self._feedForwardWeights, input, out=self._workspace.like('activations', states))
+            activations += self._biases
+            activations += Batch.matVec(self._recurrentWeights, self._statesPrev, out=self._workspace.like('recurrent', states))
+
+        if self._sparseLearn:
+            offsetSum = np.dot(self._feedForwardOffsets, input, out=self._workspace.get('offsetSum', (1, self._batchSize)))
+            offsetSum += np.dot(self._recurrentOffsets, self._statesPrev, out=self._workspace.get('recurrentOffsetSum', (1, self._batchSize)))
+
+            activations += offsetSum
+       
+        # Inhibition
+        self._inhibitor.inhibit(activations, numActive, states)
+
+    def _predict(self, feedBack, predictions, thresholdedPred):
+        # Find states
+        if self._fused:
+            Batch.matVec(self._downWeights, Batch.concatenate(self._states, feedBack, self._workspace, 'downInput'), out=predictions)
+        else:
+            Batch.matVec(self._predictiveWeights, self._states, out=predictions)
+
+            predictions += Batch.matVec(self._feedBackWeights, feedBack, out=self._workspace.like('feedBack', predictions))
+
+        self._output(predictions, thresholdedPred)
+
+    def _output(self, predictions, thresholdedPred):
+        """Thresholds the predictions in place when thresholdedPred is set"""
+        if thresholdedPred:
+            np.greater(predictions, 0.5, out=predictions)
+
+    def _swap(self, name, prevName, value = None):
+        """Moves a double-buffered array to its previous slot and returns the buffer for its next value.
+
+        In place the stale previous buffer is reused, otherwise a new array is made. If
+        value is given it is copied into the new buffer.
+        """
+        current = getattr(self, name)
+
+        buffer = getattr(self, prevName) if self._inPlace else np.empty_like(current)
+
+        if value is not None:
+            np.copyto(buffer, np.reshape(value, buffer.shape))
+
+        setattr(self, prevName, current)
+        setattr(self, name, buffer)
+
+        return buffer
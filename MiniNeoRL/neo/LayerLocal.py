@@ -0,0 +1,50 @@
+import numpy as np
+from neo.Layer import Layer
+from neo.LocalConnections import LocalConnections
+from neo import Batch
+from neo import LocalLearn
+
+class LayerLocal(LocalConnections, Layer):
+    """A locally connected NeoRL layer
+
+    Works as Layer, but every unit only connects to a few inputs, hidden units
+    and feed back units given by a Connectivity (a fixed radius around the
+    unit's position, or a random sample). The feed forward, recurrent,
+    predictive and feed back weights are stored as index and weight arrays with
+    a row per unit (see LocalLearn), so memory and work per step grow linearly
+    with the layer sizes instead of with their products.
+
+    Weights are shared by the batch (sharedWeights=False is not supported) and
+    learning visits all connections (sparseLearn is not supported). The
+    connections are not fused.
+    """
+
+    def learn(self, target, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
+        # Find prediction error
+        predError = np.subtract(target, self._predictionsPrev, out=self._workspace.like('predError', self._predictionsPrev))
+
+        # Update feed forward and recurrent weights
+        self._inputTraces *= traceDecay
+        self._inputTraces += self._input
+
+        self._stateTraces *= traceDecay
+        self._stateTraces += self._statesPrev
+
+        if self._passLearnGate(predError):
+            LocalLearn.learnCompetitive(self._feedForwardIndices, self._feedForwardWeights, self._states, self._inputTraces, learnEncoderRate, self._workspace)
+            LocalLearn.learnCompetitive(self._recurrentIndices, self._recurrentWeights, self._states, self._statesPrev, learnRecurrentRate, self._workspace)
+
+            # Update predictive and feed back weights
+            LocalLearn.learnOuter(self._predictiveIndices, self._predictiveWeights, predError, self._statesPrev, learnDecoderRate, self._workspace)
+            LocalLearn.learnOuter(self._feedBackIndices, self._feedBackWeights, predError, feedBackPrev, learnDecoderRate, self._workspace)
+
+        # Update thresholds
+        biasUpdate = np.subtract(self._activeRatio, self._states, out=self._workspace.like('biasUpdate', self._states))
+        biasUpdate = Batch.meanColumns(biasUpdate, self._biases)
+        biasUpdate *= learnBiasRate
+
+        self._biases += biasUpdate
+
+    def _frozenNames(self):
+        """Attributes only learning changes (the connections never do), which a fork shares read-only"""
+        return self._parameterNames() + ('_biases',)
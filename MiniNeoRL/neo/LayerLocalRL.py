@@ -0,0 +1,49 @@
+import numpy as np
+from neo.LayerRL import LayerRL
+from neo.LocalConnections import LocalConnections
+from neo import Batch
+from neo import LocalLearn
+
+class LayerLocalRL(LocalConnections, LayerRL):
+    """A locally connected NeoRL layer for RL
+
+    Works as LayerRL with the connections and weight layout of LayerLocal. The
+    predictive and feed back traces have the layout of their weights, kept per
+    instance as (batchSize, rows, connections) arrays when batchSize > 1.
+    """
+
+    def learn(self, reinforce, targetExp, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
+        # Find prediction error
+        predErrorExp = np.subtract(targetExp, self._predictionsPrev, out=self._workspace.like('predError', self._predictionsPrev))
+
+        # Update feed forward and recurrent weights
+        self._inputTraces *= traceDecay
+        self._inputTraces += self._input
+
+        self._stateTraces *= traceDecay
+        self._stateTraces += self._statesPrev
+
+        LocalLearn.learnCompetitive(self._feedForwardIndices, self._feedForwardWeights, self._states, self._inputTraces, learnEncoderRate, self._workspace)
+        LocalLearn.learnCompetitive(self._recurrentIndices, self._recurrentWeights, self._states, self._statesPrev, learnRecurrentRate, self._workspace)
+
+        # Update predictive and feed back traces, lazily decayed as in LayerRL
+        self._traceScale = Batch.decayTraces([ self._predictiveTraces, self._feedBackTraces ], self._traceScale, traceDecay)
+
+        LocalLearn.learnOuter(self._predictiveIndices, self._predictiveTraces, predErrorExp, self._statesPrev, 1.0 / self._traceScale, self._workspace)
+        LocalLearn.learnOuter(self._feedBackIndices, self._feedBackTraces, predErrorExp, feedBackPrev, 1.0 / self._traceScale, self._workspace)
+
+        # Update predictive and feed back weights, nothing to add when no instance is reinforced
+        if np.any(reinforce):
+            self._predictiveWeights += Batch.weightedSum(learnDecoderRate * self._traceScale, reinforce, self._predictiveTraces, self._predictiveWeights, out=self._workspace.view('update', self._predictiveWeights.shape))
+            self._feedBackWeights += Batch.weightedSum(learnDecoderRate * self._traceScale, reinforce, self._feedBackTraces, self._feedBackWeights, out=self._workspace.view('update', self._feedBackWeights.shape))
+
+        # Update thresholds
+        biasUpdate = np.subtract(self._activeRatio, self._states, out=self._workspace.like('biasUpdate', self._states))
+        biasUpdate = Batch.meanColumns(biasUpdate, self._biases)
+        biasUpdate *= learnBiasRate
+
+        self._biases += biasUpdate
+
+    def _frozenNames(self):
+        """Attributes only learning changes (the connections never do), which a fork shares read-only"""
+        return self._parameterNames() + ('_biases', '_predictiveTraces', '_feedBackTraces')
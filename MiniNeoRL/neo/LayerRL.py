@@ -1,103 +1,294 @@
-import numpy as np
-from operator import itemgetter, attrgetter, methodcaller
-
-class LayerRL:
-    """A fully-connected NeoRL layer for RL"""
-
-    def __init__(self, numInputs, numHidden, numFeedBack, initMinWeight, initMaxWeight, activeRatio):
-        self._input = np.zeros((numInputs, 1))
-
-        self._feedForwardWeights = np.random.rand(numHidden, numInputs) * (initMaxWeight - initMinWeight) + initMinWeight
- 
-        self._recurrentWeights = np.random.rand(numHidden, numHidden) * (initMaxWeight - initMinWeight) + initMinWeight
-
-        self._stateTraces = np.zeros((numHidden, 1))
-
-        self._inputTraces = np.zeros((numInputs, 1))
-
-        self._predictiveWeights = np.random.rand(numInputs, numHidden) * (initMaxWeight - initMinWeight) + initMinWeight
-        self._predictiveTraces = np.zeros((numInputs, numHidden))
-  
-        self._feedBackWeights = np.random.rand(numInputs, numFeedBack) * (initMaxWeight - initMinWeight) + initMinWeight
-        self._feedBackTraces = np.zeros((numInputs, numFeedBack))
-  
-        self._biases = np.zeros((numHidden, 1))#np.random.rand(numHidden, 1) * (initMaxWeight - initMinWeight) + initMinWeight
-
-        self._statesRecurrent = np.zeros((numHidden, 1))
-        self._statesRecurrentPrev = np.zeros((numHidden, 1))
-
-        self._statesFeedForward = np.zeros((numHidden, 1))
-
-        self._states = np.zeros((numHidden, 1))
-        self._statesPrev = np.zeros((numHidden, 1))
-
-        self._feedForwardLearn = np.zeros((numHidden, 1))
-        self._recurrentLearn = np.zeros((numHidden, 1))
-
-        self._predictions = np.zeros((numInputs, 1))
-        self._predictionsPrev = np.zeros((numInputs, 1))
-
-        self._activeRatio = activeRatio
-
-    def upPass(self, input):
-        self._input = input
-        self._statesPrev = self._states
-        self._statesRecurrentPrev = self._statesRecurrent
-
-        numActive = int(self._activeRatio * len(self._states))
-  
-        # Activate
-        activations = self._biases + np.dot(self._feedForwardWeights, input) + np.dot(self._recurrentWeights, self._statesPrev)
-       
-        # Generate tuples for sorting
-        activationsPairs = []
-
-        for i in range(0, len(self._states)):
-            activationsPairs.append((activations[i], i))
-
-        # Sort
-        activationsPairs = sorted(activationsPairs, key=itemgetter(0))
-
-        # Use sorted information for inhibition
-        self._states = np.zeros((len(self._states), 1))
-
-        for i in range(0, numActive):
-            self._states[activationsPairs[len(activationsPairs) - 1 - i][1]] = 1.0
-
-    def downPass(self, feedBack, thresholdedPred = True):
-        self._predictionsPrev = self._predictions
-
-        # Find states
-        self._predictions = np.dot(self._predictiveWeights, self._states) + np.dot(self._feedBackWeights, feedBack)
-
-        if thresholdedPred:
-            self._predictions[self._predictions > 0.5] = 1.0
-            self._predictions[self._predictions <= 0.5] = 0.0
-        else:
-            self._predictions = np.tanh(self._predictions)
-
-    def learn(self, reinforce, targetExp, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
-        # Find prediction error
-        predErrorExp = targetExp - self._predictionsPrev
-
-        # Propagate error
-        hiddenError = np.dot(self._predictiveWeights.T, predErrorExp)
-
-        hiddenError = np.multiply(hiddenError, self._statesPrev)
-
-        # Update feed forward and recurrent weights 
-        self._inputTraces = self._inputTraces * traceDecay + self._input
-        self._stateTraces = self._stateTraces * traceDecay + self._statesPrev
-
-        self._feedForwardWeights += learnEncoderRate * (np.dot(self._states, self._inputTraces.T) - np.dot(self._states.T, self._feedForwardWeights))
-        self._recurrentWeights += learnRecurrentRate * (np.dot(self._states, self._statesPrev.T) - np.dot(self._states.T, self._recurrentWeights))
-        
-        # Update predictive and feed back weights
-        self._predictiveTraces = self._predictiveTraces * traceDecay + np.dot(predErrorExp, self._statesPrev.T)
-        self._feedBackTraces = self._feedBackTraces * traceDecay + np.dot(predErrorExp, feedBackPrev.T)
-
-        self._predictiveWeights += learnDecoderRate * reinforce * self._predictiveTraces
-        self._feedBackWeights += learnDecoderRate * reinforce * self._feedBackTraces
-
-        # Update thresholds
-        self._biases += learnBiasRate * (self._activeRatio - self._states)
\ No newline at end of file
+import numpy as np
+from neo.Inhibition import Inhibitor
+from neo.Workspace import Workspace
+from neo import Batch
+from neo import SparseLearn
+
+class LayerRL:
+    """A fully-connected NeoRL layer for RL
+
+    Batching works as in Layer. The eligibility traces always belong to a single
+    instance, so with batchSize > 1 they are kept per instance as 3-D arrays even
+    when the weights are shared. The predictive and feed back traces decay lazily
+    through a shared scale factor, so a step only writes the entries that get new
+    contributions (see Batch.decayTraces).
+
+    sparseLearn works as in Layer, and additionally adds the new trace
+    contributions only to the columns of the previously active units.
+
+    inPlace double buffers the input, state and prediction arrays and fused
+    stores the weights in two blocks as in Layer.
+    """
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_inhibitor', '_workspace')
+
+    def __init__(self, numInputs, numHidden, numFeedBack, initMinWeight, initMaxWeight, activeRatio, batchSize = 1, sharedWeights = True, sparseLearn = False, inPlace = False, dtype = np.float64, traceDtype = None, fused = False, generator = None):
+        assert(not sparseLearn or (batchSize == 1 and sharedWeights))
+
+        dtype = np.dtype(dtype)
+        traceDtype = dtype if traceDtype is None else np.dtype(traceDtype)
+
+        self._feedForwardWeights = Batch.initWeights(batchSize, sharedWeights, numHidden, numInputs, initMinWeight, initMaxWeight, dtype, generator)
+ 
+        self._recurrentWeights = Batch.initWeights(batchSize, sharedWeights, numHidden, numHidden, initMinWeight, initMaxWeight, dtype, generator)
+
+        self._predictiveWeights = Batch.initWeights(batchSize, sharedWeights, numInputs, numHidden, initMinWeight, initMaxWeight, dtype, generator)
+  
+        self._feedBackWeights = Batch.initWeights(batchSize, sharedWeights, numInputs, numFeedBack, initMinWeight, initMaxWeight, dtype, generator)
+
+        self._initState(numInputs, numHidden, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused)
+
+        # Column offsets shared by all rows of the feed forward and recurrent weights, see SparseLearn
+        self._feedForwardOffsets = np.zeros((1, numInputs), dtype)
+        self._recurrentOffsets = np.zeros((1, numHidden), dtype)
+
+        if fused:
+            self._fuseWeights()
+
+        self._createScratch()
+
+    def upPass(self, input):
+        input = self._swap('_input', '_inputPrev', input)
+
+        states = self._swap('_states', '_statesPrev')
+
+        self._statesRecurrentPrev = self._statesRecurrent
+
+        self._activate(input, states)
+
+        if self._sparseLearn:
+            self._activeIndicesPrev = self._activeIndices
+            self._activeIndices = np.flatnonzero(states)
+
+    def downPass(self, feedBack, thresholdedPred = True):
+        predictions = self._swap('_predictions', '_predictionsPrev')
+
+        self._predict(feedBack, predictions, thresholdedPred)
+
+    def inferUp(self, input):
+        """upPass without the bookkeeping only learn() needs: the input and states are written into the existing buffers"""
+        np.copyto(self._input, np.reshape(input, self._input.shape))
+
+        # The previous states are still needed for the recurrent input
+        self._statesPrev, self._states = self._states, self._statesPrev
+
+        self._activate(self._input, self._states)
+
+        if self._sparseLearn:
+            self._activeIndices = np.flatnonzero(self._states)
+
+    def inferDown(self, feedBack, thresholdedPred = True):
+        """downPass that overwrites the predictions instead of keeping the previous ones"""
+        self._predict(feedBack, self._predictions, thresholdedPred)
+
+    def learn(self, reinforce, targetExp, feedBackPrev, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay):
+        # Find prediction error
+        predErrorExp = np.subtract(targetExp, self._predictionsPrev, out=self._workspace.like('predError', self._predictionsPrev))
+
+        # Update feed forward and recurrent weights 
+        self._inputTraces *= traceDecay
+        self._inputTraces += self._input
+
+        self._stateTraces *= traceDecay
+        self._stateTraces += self._statesPrev
+
+        # Decay predictive and feed back traces, only their scale changes
+        self._traceScale = Batch.decayTraces([ self._predictiveTraces, self._feedBackTraces ], self._traceScale, traceDecay)
+
+        if self._sparseLearn:
+            SparseLearn.learnCompetitive(self._feedForwardWeights, self._feedForwardOffsets, self._activeIndices, self._inputTraces, learnEncoderRate, self._workspace)
+            SparseLearn.learnCompetitive(self._recurrentWeights, self._recurrentOffsets, self._activeIndices, self._statesPrev, learnRecurrentRate, self._workspace)
+
+            # Update predictive and feed back traces
+            SparseLearn.learnOuter(self._predictiveTraces, predErrorExp, self._statesPrev, 1.0 / self._traceScale, self._activeIndicesPrev, self._workspace)
+            SparseLearn.learnOuter(self._feedBackTraces, predErrorExp, feedBackPrev, 1.0 / self._traceScale, None, self._workspace)
+        elif self._fused:
+            # One update per block, see Layer
+            Batch.learnCompetitiveColumns(self._upWeights, self._states, Batch.concatenate(self._inputTraces, self._statesPrev, self._workspace, 'upLearnInput'), self._upRates(learnEncoderRate, learnRecurrentRate), self._workspace)
+
+            Batch.learnOuter(self._downTraces, predErrorExp, Batch.concatenate(self._statesPrev, feedBackPrev, self._workspace, 'downLearnInput'), 1.0 / self._traceScale, self._workspace)
+        else:
+            Batch.learnCompetitive(self._feedForwardWeights, self._states, self._inputTraces, learnEncoderRate, self._workspace)
+            Batch.learnCompetitive(self._recurrentWeights, self._states, self._statesPrev, learnRecurrentRate, self._workspace)
+        
+            # Update predictive and feed back traces
+            Batch.learnOuter(self._predictiveTraces, predErrorExp, self._statesPrev, 1.0 / self._traceScale, self._workspace)
+            Batch.learnOuter(self._feedBackTraces, predErrorExp, feedBackPrev, 1.0 / self._traceScale, self._workspace)
+
+        # Update predictive and feed back weights, nothing to add when no instance is reinforced
+        if np.any(reinforce):
+            if self._fused:
+                self._downWeights += Batch.weightedSum(learnDecoderRate * self._traceScale, reinforce, self._downTraces, self._downWeights, out=self._workspace.view('update', self._downWeights.shape))
+            else:
+                self._predictiveWeights += Batch.weightedSum(learnDecoderRate * self._traceScale, reinforce, self._predictiveTraces, self._predictiveWeights, out=self._workspace.view('update', self._predictiveWeights.shape))
+                self._feedBackWeights += Batch.weightedSum(learnDecoderRate * self._traceScale, reinforce, self._feedBackTraces, self._feedBackWeights, out=self._workspace.view('update', self._feedBackWeights.shape))
+
+        # Update thresholds
+        biasUpdate = np.subtract(self._activeRatio, self._states, out=self._workspace.like('biasUpdate', self._states))
+        biasUpdate = Batch.meanColumns(biasUpdate, self._biases)
+        biasUpdate *= learnBiasRate
+
+        self._biases += biasUpdate
+
+    def foldOffsets(self):
+        """Moves the column offsets accumulated by sparse learning into the feed forward and recurrent weights"""
+        SparseLearn.fold(self._feedForwardWeights, self._feedForwardOffsets)
+        SparseLearn.fold(self._recurrentWeights, self._recurrentOffsets)
+
+    def _initState(self, numInputs, numHidden, activeRatio, batchSize, sharedWeights, sparseLearn, inPlace, dtype, traceDtype, fused):
+        """Everything but the weights: inputs, traces (the predictive and feed back ones shaped like their weights), biases, states, predictions and the settings"""
+        self._input = np.zeros((numInputs, batchSize), dtype)
+        self._inputPrev = np.zeros((numInputs, batchSize), dtype)
+
+        self._stateTraces = np.zeros((numHidden, batchSize), traceDtype)
+
+        self._inputTraces = np.zeros((numInputs, batchSize), traceDtype)
+
+        self._predictiveTraces = Batch.perInstanceZeros(batchSize, sharedWeights, *self._predictiveWeights.shape[-2:], traceDtype)
+        self._feedBackTraces = Batch.perInstanceZeros(batchSize, sharedWeights, *self._feedBackWeights.shape[-2:], traceDtype)
+
+        # The predictive and feed back traces are stored divided by this, see Batch.decayTraces
+        self._traceScale = 1.0
+  
+        self._biases = np.zeros((numHidden, 1 if sharedWeights else batchSize), dtype)#np.random.rand(numHidden, 1) * (initMaxWeight - initMinWeight) + initMinWeight
+
+        self._statesRecurrent = np.zeros((numHidden, batchSize), dtype)
+        self._statesRecurrentPrev = np.zeros((numHidden, batchSize), dtype)
+
+        self._statesFeedForward = np.zeros((numHidden, batchSize), dtype)
+
+        self._states = np.zeros((numHidden, batchSize), dtype)
+        self._statesPrev = np.zeros((numHidden, batchSize), dtype)
+
+        self._feedForwardLearn = np.zeros((numHidden, 1), dtype)
+        self._recurrentLearn = np.zeros((numHidden, 1), dtype)
+
+        self._predictions = np.zeros((numInputs, batchSize), dtype)
+        self._predictionsPrev = np.zeros((numInputs, batchSize), dtype)
+
+        self._activeRatio = activeRatio
+
+        self._batchSize = batchSize
+        self._sharedWeights = sharedWeights
+
+        self._sparseLearn = sparseLearn
+
+        self._activeIndices = np.zeros(0, dtype=np.intp)
+        self._activeIndicesPrev = np.zeros(0, dtype=np.intp)
+
+        self._inPlace = inPlace
+
+        self._dtype = dtype
+        self._traceDtype = traceDtype
+
+        self._fused = fused
+
+    def _parameterNames(self):
+        """Attributes that hold learned weights, which a checkpoint can memory map"""
+        if self._fused:
+            return ('_upWeights', '_downWeights')
+
+        return ('_feedForwardWeights', '_recurrentWeights', '_predictiveWeights', '_feedBackWeights')
+
+    def _frozenNames(self):
+        """Attributes only learning changes, which a fork shares read-only"""
+        traces = ('_downTraces',) if self._fused else ('_predictiveTraces', '_feedBackTraces')
+
+        return tuple(self._parameterNames()) + ('_biases', '_feedForwardOffsets', '_recurrentOffsets') + traces
+
+    def _viewNames(self):
+        """Attributes that are views into other arrays, rebuilt by _createScratch instead of being checkpointed"""
+        if self._fused:
+            return ('_feedForwardWeights', '_recurrentWeights', '_predictiveWeights', '_feedBackWeights', '_predictiveTraces', '_feedBackTraces')
+
+        return ()
+
+    def _createScratch(self):
+        self._inhibitor = Inhibitor(self._states.shape, self._dtype)
+
+        self._workspace = Workspace(self._dtype)
+
+        if self._fused:
+            self._splitWeights()
+
+    def _fuseWeights(self):
+        """Moves the weights into the [feed forward | recurrent] and [predictive | feed back] blocks and the traces into a
+        [predictive | feed back] block, split again by _createScratch"""
+        self._upWeights = np.concatenate((self._feedForwardWeights, self._recurrentWeights), axis=-1)
+        self._downWeights = np.concatenate((self._predictiveWeights, self._feedBackWeights), axis=-1)
+        self._downTraces = np.concatenate((self._predictiveTraces, self._feedBackTraces), axis=-1)
+
+    def _splitWeights(self):
+        """Points the weight attributes at their columns of the fused blocks"""
+        numInputs = self._input.shape[0]
+        numHidden = self._states.shape[0]
+
+        self._feedForwardWeights = self._upWeights[..., :numInputs]
+        self._recurrentWeights = self._upWeights[..., numInputs:]
+        self._predictiveWeights = self._downWeights[..., :numHidden]
+        self._feedBackWeights = self._downWeights[..., numHidden:]
+        self._predictiveTraces = self._downTraces[..., :numHidden]
+        self._feedBackTraces = self._downTraces[..., numHidden:]
+
+    def _upRates(self, learnEncoderRate, learnRecurrentRate):
+        """Learning rate of every column of the [feed forward | recurrent] block"""
+        rates = self._workspace.get('upRates', (1, self._upWeights.shape[-1]))
+
+        rates[:, :len(self._input)] = learnEncoderRate
+        rates[:, len(self._input):] = learnRecurrentRate
+
+        return rates
+
+    def _activate(self, input, states):
+        numActive = int(self._activeRatio * len(states))
+  
+        # Activate
+        if self._fused:
+            activations = Batch.matVec(self._upWeights, Batch.concatenate(input, self._statesPrev, self._workspace, 'upInput'), out=self._workspace.like('activations', states))
+            activations += self._biases
+        else:
+            activations = Batch.matVec(self._feedForwardWeights, input, out=self._workspace.like('activations', states))
+            activations += self._biases
+            activations += Batch.matVec(self._recurrentWeights, self._statesPrev, out=self._workspace.like('recurrent', states))
+
+        if self._sparseLearn:
+            offsetSum = np.dot(self._feedForwardOffsets, input, out=self._workspace.get('offsetSum', (1, self._batchSize)))
+            offsetSum += np.dot(self._recurrentOffsets, self._statesPrev, out=self._workspace.get('recurrentOffsetSum', (1, self._batchSize)))
+
+            activations += offsetSum
+       
+        # Inhibition
+        self._inhibitor.inhibit(activations, numActive, states)
+
+    def _predict(self, feedBack, predictions, thresholdedPred):
+        # Find states
+        if self._fused:
+            Batch.matVec(self._downWeights, Batch.concatenate(self._states, feedBack, self._workspace, 'downInput'), out=predictions)
+        else:
+            Batch.matVec(self._predictiveWeights, self._states, out=predictions)
+
+            predictions += Batch.matVec(self._feedBackWeights, feedBack, out=self._workspace.like('feedBack', predictions))
+
+        self._output(predictions, thresholdedPred)
+
+    def _output(self, predictions, thresholdedPred):
+        """Thresholds the predictions in place when thresholdedPred is set, and squashes them with tanh otherwise"""
+        if thresholdedPred:
+            np.greater(predictions, 0.5, out=predictions)
+        else:
+            np.tanh(predictions, out=predictions)
+
+    def _swap(self, name, prevName, value = None):
+        """Moves a double-buffered array to its previous slot and returns the buffer for its next value, see Layer"""
+        current = getattr(self, name)
+
+        buffer = getattr(self, prevName) if self._inPlace else np.empty_like(current)
+
+        if value is not None:
+            np.copyto(buffer, np.reshape(value, buffer.shape))
+
+        setattr(self, prevName, current)
+        setattr(self, name, buffer)
+
+        return buffer
@@ -0,0 +1,125 @@
+import numpy as np
+from neo.CSC import CSC
+from neo.Inhibition import Inhibitor
+from neo.Layer import Layer
+from neo.LayerLocal import LayerLocal
+from neo.Workspace import Workspace
+from neo import LocalLearn
+
+class LayerSparse:
+    """An inference-only copy of a trained Layer with its weights in CSC form
+
+    Made from a dense (or locally connected) layer with shared weights, or from
+    another LayerSparse to prune it further, and one keep mask per weight
+    matrix, see Prune. Only the kept nonzero weights are stored, see CSC, and
+    the layer steps with inferUp and inferDown as a Layer does. The biases and
+    the per-step state are copied from the original layer, so inference
+    continues from the same point. Column offsets of sparse learning are folded
+    into the stored weights.
+
+    Pruning always saves memory, but only speeds inference up for large layers.
+    Every product costs several numpy calls, which outweighs the work saved on
+    small layers: at the demo sizes (40 units) a pruned hierarchy infers at
+    about 0.6-0.8 times the dense speed whatever is pruned. With 800-unit layers
+    it breaks even at about 90% pruned (10% of the weights kept), and is about
+    1.4 times as fast at 95% and 5 times at 99%. The products skip inactive
+    inputs, but a trained layer keeps most of its large weights in the columns
+    of often active units, so that saves less than the density suggests.
+    """
+
+    # Rebuilt by _createScratch instead of being checkpointed
+    _scratchNames = ('_inhibitor', '_workspace')
+
+    # Weight attributes of Layer and the CSC matrices they become
+    _weightNames = (('_feedForwardWeights', '_feedForwardMatrix'), ('_recurrentWeights', '_recurrentMatrix'),
+        ('_predictiveWeights', '_predictiveMatrix'), ('_feedBackWeights', '_feedBackMatrix'))
+
+    def __init__(self, layer, masks):
+        assert(isinstance(layer, LayerSparse) or (isinstance(layer, Layer) and layer._sharedWeights))
+
+        for name, matrixName in self._weightNames:
+            setattr(self, matrixName, CSC.fromDense(LayerSparse.denseWeights(layer, name), masks.get(name)))
+
+        self._biases = layer._biases.copy()
+
+        self._input = layer._input.copy()
+        self._states = layer._states.copy()
+        self._statesPrev = layer._statesPrev.copy()
+        self._predictions = layer._predictions.copy()
+
+        self._activeIndices = layer._activeIndices.copy()
+
+        self._activeRatio = layer._activeRatio
+
+        self._batchSize = layer._batchSize
+
+        self._dtype = layer._dtype
+
+        self._createScratch()
+
+    @staticmethod
+    def denseWeights(layer, name):
+        """The full (rows, columns) matrix of a weight attribute of a dense, local or sparse layer, with any column offsets added"""
+        if isinstance(layer, LayerSparse):
+            return getattr(layer, dict(LayerSparse._weightNames)[name]).toDense()
+
+        weights = getattr(layer, name)
+
+        if isinstance(layer, LayerLocal):
+            indices = getattr(layer, name.replace('Weights', 'Indices'))
+
+            numColumns = { '_feedForwardWeights': len(layer._input), '_recurrentWeights': len(layer._states), '_predictiveWeights': len(layer._states), '_feedBackWeights': layer._numFeedBack }[name]
+
+            return LocalLearn.toDense(indices, weights, numColumns)
+
+        if layer._sparseLearn and name == '_feedForwardWeights':
+            return weights + layer._feedForwardOffsets
+
+        if layer._sparseLearn and name == '_recurrentWeights':
+            return weights + layer._recurrentOffsets
+
+        return weights
+
+    def inferUp(self, input):
+        np.copyto(self._input, np.reshape(input, self._input.shape))
+
+        # The previous states are still needed for the recurrent input
+        self._statesPrev, self._states = self._states, self._statesPrev
+
+        numActive = int(self._activeRatio * len(self._states))
+
+        activations = self._feedForwardMatrix.matVec(self._input, self._workspace.like('activations', self._states))
+        activations += self._biases
+        activations += self._recurrentMatrix.matVec(self._statesPrev, self._workspace.like('recurrent', self._states))
+
+        # Inhibition
+        self._inhibitor.inhibit(activations, numActive, self._states)
+
+    def inferDown(self, feedBack, thresholdedPred = True):
+        predictions = self._predictiveMatrix.matVec(self._states, self._predictions)
+
+        predictions += self._feedBackMatrix.matVec(feedBack, self._workspace.like('feedBack', predictions))
+
+        if thresholdedPred:
+            np.greater(predictions, 0.5, out=predictions)
+
+    def getWeightBytes(self):
+        """Bytes of the four CSC weight matrices"""
+        return sum(getattr(self, matrixName).getNumBytes() for name, matrixName in self._weightNames)
+
+    def getNumWeights(self):
+        """Stored weights of the four matrices"""
+        return sum(getattr(self, matrixName).getNumEntries() for name, matrixName in self._weightNames)
+
+    def _parameterNames(self):
+        """None of its own, the CSC matrices list the arrays a checkpoint can memory map"""
+        return ()
+
+    def _frozenNames(self):
+        """Attributes a fork shares read-only, see Fork"""
+        return ('_biases',)
+
+    def _createScratch(self):
+        self._inhibitor = Inhibitor(self._states.shape, self._dtype)
+
+        self._workspace = Workspace(self._dtype)
@@ -0,0 +1,68 @@
+import numpy as np
+from neo.Connectivity import Connectivity
+from neo import Batch
+from neo import LocalLearn
+
+class LocalConnections:
+    """The local connections of LayerLocal and LayerLocalRL
+
+    Mixed in before Layer or LayerRL, it builds the index and weight arrays of
+    the four connections from a Connectivity and replaces the dense activation
+    and prediction products with local ones (see LocalLearn). Learning and the
+    output of the predictions (see _output) stay with the layer.
+    """
+
+    def __init__(self, numInputs, numHidden, numFeedBack, initMinWeight, initMaxWeight, activeRatio, batchSize = 1, sharedWeights = True, sparseLearn = False, inPlace = False, dtype = np.float64, traceDtype = None, fused = False, generator = None, connectivity = None):
+        assert(sharedWeights and not sparseLearn and not fused)
+
+        if connectivity is None:
+            connectivity = Connectivity()
+
+        dtype = np.dtype(dtype)
+        traceDtype = dtype if traceDtype is None else np.dtype(traceDtype)
+
+        self._feedForwardIndices = connectivity.indices(numHidden, numInputs, generator)
+        self._feedForwardWeights = Batch.initWeights(batchSize, True, numHidden, self._feedForwardIndices.shape[1], initMinWeight, initMaxWeight, dtype, generator)
+
+        self._recurrentIndices = connectivity.indices(numHidden, numHidden, generator)
+        self._recurrentWeights = Batch.initWeights(batchSize, True, numHidden, self._recurrentIndices.shape[1], initMinWeight, initMaxWeight, dtype, generator)
+
+        self._predictiveIndices = connectivity.indices(numInputs, numHidden, generator)
+        self._predictiveWeights = Batch.initWeights(batchSize, True, numInputs, self._predictiveIndices.shape[1], initMinWeight, initMaxWeight, dtype, generator)
+
+        self._feedBackIndices = connectivity.indices(numInputs, numFeedBack, generator)
+        self._feedBackWeights = Batch.initWeights(batchSize, True, numInputs, self._feedBackIndices.shape[1], initMinWeight, initMaxWeight, dtype, generator)
+
+        # The feed back weights do not tell how many units they connect to
+        self._numFeedBack = numFeedBack
+
+        self._initState(numInputs, numHidden, activeRatio, batchSize, True, False, inPlace, dtype, traceDtype, False)
+
+        self._createScratch()
+
+    def foldOffsets(self):
+        """Nothing to fold, local layers learn without column offsets"""
+        pass
+
+    def _parameterNames(self):
+        """Attributes that hold learned weights and the (fixed) connections, which a checkpoint can memory map"""
+        return ('_feedForwardWeights', '_recurrentWeights', '_predictiveWeights', '_feedBackWeights',
+            '_feedForwardIndices', '_recurrentIndices', '_predictiveIndices', '_feedBackIndices')
+
+    def _activate(self, input, states):
+        numActive = int(self._activeRatio * len(states))
+
+        # Activate
+        activations = LocalLearn.matVec(self._feedForwardIndices, self._feedForwardWeights, input, self._workspace, out=self._workspace.like('activations', states))
+        activations += self._biases
+        activations += LocalLearn.matVec(self._recurrentIndices, self._recurrentWeights, self._statesPrev, self._workspace, out=self._workspace.like('recurrent', states))
+
+        # Inhibition
+        self._inhibitor.inhibit(activations, numActive, states)
+
+    def _predict(self, feedBack, predictions, thresholdedPred):
+        LocalLearn.matVec(self._predictiveIndices, self._predictiveWeights, self._states, self._workspace, out=predictions)
+
+        predictions += LocalLearn.matVec(self._feedBackIndices, self._feedBackWeights, feedBack, self._workspace, out=self._workspace.like('feedBack', predictions))
+
+        self._output(predictions, thresholdedPred)
@@ -0,0 +1,70 @@
+"""Products and learning rules of locally connected weights (ELLPACK layout).
+
+A locally connected matrix with numRows rows and numColumns columns is stored
+as two (numRows, numConnections) arrays: the column indices of every row (see
+Connectivity) and the weights of those connections. Memory and work per step
+then grow with numRows * numConnections instead of numRows * numColumns.
+
+Vectors are (numUnits, batchSize) column arrays as in Batch. Weights are shared
+by the batch and their updates averaged over it; per-instance matrices such as
+eligibility traces are stacked into (batchSize, numRows, numConnections) arrays.
+The learning rules are those of Batch restricted to the existing connections.
+"""
+
+import numpy as np
+
+def gather(indices, vectors, workspace, name = 'gathered'):
+    """The connected entries of every column of vectors as a (numRows, numConnections, batchSize) array"""
+    out = workspace.view(name, indices.shape + (vectors.shape[1],), vectors.dtype)
+
+    return np.take(vectors, indices, axis=0, out=out)
+
+def matVec(indices, weights, vectors, workspace, out = None):
+    """weights times each column of vectors, giving a (numRows, batchSize) array"""
+    return np.einsum('rk,rkb->rb', weights, gather(indices, vectors, workspace), out=out)
+
+def learnCompetitive(indices, weights, post, pre, rate, workspace):
+    """In place weights += rate * (post * pre.T - post.T * weights) on the existing connections"""
+    update = workspace.view('update', weights.shape, weights.dtype)
+
+    np.einsum('rb,rkb->rk', post, gather(indices, pre, workspace), out=update)
+
+    # post.T * weights, summed over the rows connected to each column
+    scaled = np.multiply(weights, np.sum(post, axis=1, keepdims=True), out=workspace.view('scaled', weights.shape, weights.dtype))
+
+    projected = np.bincount(indices.ravel(), weights=scaled.ravel(), minlength=pre.shape[0])
+
+    update -= projected[indices]
+
+    if post.shape[1] > 1:
+        update /= post.shape[1]
+
+    update *= rate
+
+    weights += update
+
+def learnOuter(indices, weights, post, pre, rate, workspace):
+    """In place weights += rate * post * pre.T on the existing connections, one product per instance for 3-D weights"""
+    update = workspace.view('update', weights.shape, np.result_type(weights, post, pre))
+
+    gathered = gather(indices, pre, workspace)
+
+    if weights.ndim == 3:
+        np.einsum('rb,rkb->brk', post, gathered, out=update)
+    else:
+        np.einsum('rb,rkb->rk', post, gathered, out=update)
+
+        if post.shape[1] > 1:
+            update /= post.shape[1]
+
+    update *= rate
+
+    weights += update
+
+def toDense(indices, weights, numColumns):
+    """The (numRows, numColumns) dense matrix, zero where there is no connection"""
+    dense = np.zeros((len(indices), numColumns), weights.dtype)
+
+    np.put_along_axis(dense, indices, weights, axis=1)
+
+    return dense
@@ -0,0 +1,147 @@
+import numpy as np
+
+class Pong:
+    """The single player Pong of MiniNeoRL_RL_Demo.py for numGames games at once, without any rendering
+
+    Positions are in [0, 1] with the paddle at the bottom. Every game keeps its
+    own ball, paddle and reward/punishment timers in arrays of length numGames.
+    A step moves the paddles, counts down the timers and advances the balls.
+    Hitting the ball starts the reward timer, and missing it starts the
+    punishment timer and serves a new ball. The reward is 1 while the reward
+    timer runs.
+
+    Observations are (numObservations, numGames) columns of the paddle
+    position, ball position and ball velocity, scaled to about [-1, 1] as in the
+    demo. See PongRenderer for drawing a game.
+    """
+
+    numObservations = 5
+
+    # Sizes relative to the 600 pixel wide demo window
+    ballRadius = 16.0 / 600.0
+    paddleRadius = 64.0 / 600.0
+    paddleHeight = 32.0 / 600.0
+
+    ballSpeed = 0.04
+    ballSlope = 0.353
+
+    paddleSpeed = 0.2
+
+    rewardPunishmentTime = 2.0
+
+    def __init__(self, numGames = 1, seed = None):
+        self._numGames = numGames
+
+        self._random = np.random.default_rng(seed)
+
+        self._ballX = np.zeros(numGames)
+        self._ballY = np.zeros(numGames)
+
+        self._ballVelocityX = np.full(numGames, self.ballSlope * self.ballSpeed)
+        self._ballVelocityY = np.full(numGames, self.ballSpeed)
+
+        self._paddleX = np.full(numGames, 0.5)
+
+        self._rewardTimers = np.zeros(numGames)
+        self._punishmentTimers = np.zeros(numGames)
+
+        self._rewards = np.zeros(numGames)
+        self._observations = np.zeros((self.numObservations, numGames))
+
+        # Scratch masks
+        self._mask = np.zeros(numGames, dtype=bool)
+        self._hit = np.zeros(numGames, dtype=bool)
+
+        # The first ball of every game starts to the right, as in the demo
+        self._serve(np.ones(numGames, dtype=bool))
+
+        self._ballVelocityX.fill(self.ballSlope * self.ballSpeed)
+
+        self._observe()
+
+    def step(self, moves):
+        """Advances every game by one frame and returns its (observations, rewards).
+
+        moves holds one paddle movement in [-1, 1] per game. The returned arrays
+        are reused by the next step.
+        """
+        moves = np.reshape(moves, self._numGames)
+
+        # Paddles and timers
+        self._paddleX += self.paddleSpeed * moves
+        np.clip(self._paddleX, 0.0, 1.0, out=self._paddleX)
+
+        self._rewardTimers -= self._rewardTimers > 0.0
+        self._punishmentTimers -= self._punishmentTimers > 0.0
+
+        # Physics
+        self._ballX += self._ballVelocityX
+        self._ballY += self._ballVelocityY
+
+        # Side walls
+        np.less(self._ballX, 0.0, out=self._mask)
+        np.greater(self._ballX, 1.0, out=self._hit)
+        self._mask |= self._hit
+
+        np.clip(self._ballX, 0.0, 1.0, out=self._ballX)
+        self._ballVelocityX[self._mask] *= -1.0
+
+        # Top wall
+        np.greater(self._ballY, 1.0, out=self._mask)
+
+        self._ballY[self._mask] = 1.0
+        self._ballVelocityY[self._mask] *= -1.0
+
+        # Paddle line, bounce when the ball overlaps the paddle and serve a new ball otherwise
+        np.less(self._ballY, self.paddleHeight, out=self._mask)
+
+        np.less(np.abs(self._ballX - self._paddleX), self.ballRadius + self.paddleRadius, out=self._hit)
+        self._hit &= self._mask
+
+        self._rewardTimers[self._hit] = self.rewardPunishmentTime
+        self._ballY[self._hit] = self.paddleHeight
+        self._ballVelocityY[self._hit] *= -1.0
+
+        self._mask &= ~self._hit
+
+        self._punishmentTimers[self._mask] = self.rewardPunishmentTime
+
+        if np.any(self._mask):
+            self._serve(self._mask)
+
+        np.greater(self._rewardTimers, 0.0, out=self._rewards)
+
+        return self._observe(), self._rewards
+
+    def getObservations(self):
+        return self._observations
+
+    def getRewards(self):
+        return self._rewards
+
+    def getPunishments(self):
+        """1 while the punishment timer of a game runs, 0 otherwise"""
+        return (self._punishmentTimers > 0.0).astype(np.float64)
+
+    def _serve(self, games):
+        """Puts a new ball at a random position in the upper half of the selected games"""
+        count = np.count_nonzero(games)
+
+        self._ballX[games] = self._random.random(count)
+        self._ballY[games] = self._random.random(count) * 0.5 + 0.5
+
+        self._ballVelocityX[games] = np.where(self._random.random(count) < 0.5, self.ballSlope, -self.ballSlope) * self.ballSpeed
+        self._ballVelocityY[games] = self.ballSpeed
+
+    def _observe(self):
+        observations = self._observations
+
+        np.multiply(self._paddleX, 2.0, out=observations[0])
+        np.multiply(self._ballX, 2.0, out=observations[1])
+        np.multiply(self._ballY, 2.0, out=observations[2])
+        observations[:3] -= 1.0
+
+        np.multiply(self._ballVelocityX, 30.0, out=observations[3])
+        np.multiply(self._ballVelocityY, 30.0, out=observations[4])
+
+        return observations
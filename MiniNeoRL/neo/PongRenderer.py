@@ -0,0 +1,56 @@
+import os
+
+class PongRenderer:
+    """Draws one game of a Pong environment in a pygame window
+
+    pygame is only imported when a renderer is created, so Pong itself runs
+    without it. The ball and paddle images are those of the demos.
+    """
+
+    def __init__(self, displayWidth = 600, displayHeight = 600, fps = 60):
+        import pygame
+
+        self._pygame = pygame
+
+        self._displayWidth = displayWidth
+        self._displayHeight = displayHeight
+
+        self._fps = fps
+
+        # Resources
+        resourceDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+        self._ballImage = pygame.image.load(os.path.join(resourceDir, "ball.png"))
+        self._paddleImage = pygame.image.load(os.path.join(resourceDir, "paddle.png"))
+
+        pygame.init()
+
+        self._display = pygame.display.set_mode((displayWidth, displayHeight))
+        self._clock = pygame.time.Clock()
+
+    def render(self, pong, game = 0):
+        """Draws the given game and waits for the next frame at fps (if set). Returns False once the window is closed"""
+        return self.renderPositions(pong._paddleX[game], pong._ballX[game], pong._ballY[game])
+
+    def renderPositions(self, paddleX, ballX, ballY):
+        """render() from the paddle and ball positions of a game, such as a copy taken by another thread"""
+        pygame = self._pygame
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+
+        self._display.fill((255,255,255))
+
+        self._display.blit(self._paddleImage, (self._displayWidth * paddleX - 64.0, self._displayHeight - 32.0))
+        self._display.blit(self._ballImage, (self._displayWidth * ballX - 16.0, self._displayHeight * (1.0 - ballY) - 16.0))
+
+        pygame.display.flip()
+
+        if self._fps:
+            self._clock.tick(self._fps)
+
+        return True
+
+    def close(self):
+        self._pygame.quit()
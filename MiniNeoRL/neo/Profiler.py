@@ -0,0 +1,226 @@
+"""Opt-in timing and allocation statistics for Hierarchy and Agent.
+
+A Profiler attached to a model replaces the phase methods of the model and its
+layers (upPass, downPass, learn, and for an Agent the Q update and action
+selection) with timed wrappers on the instances themselves. Detaching removes
+the wrappers again, so an unprofiled model runs exactly the code it would
+without this module and pays nothing for it.
+
+With trackAllocations every wrapped phase also records, through tracemalloc,
+the peak memory it allocates above what was allocated when it started, and the
+memory it leaves allocated when it returns. tracemalloc slows the steps down
+considerably, so timings taken with it are only good for comparing phases with
+each other.
+
+With countAllocations every wrapped phase also records the number of memory
+blocks it leaves allocated: the difference in the number of traces of a
+tracemalloc snapshot taken before and after it. Temporaries a phase allocates
+and frees again do not change that count, they show in its peak bytes. Taking
+the snapshots costs milliseconds per phase, so this is meant for finding the
+phases that keep allocating from step to step, not for timing.
+"""
+
+import time
+import tracemalloc
+
+def _numTracedBlocks():
+    """Number of memory blocks tracemalloc currently traces"""
+    return len(tracemalloc.take_snapshot().traces)
+
+class PhaseStats:
+    """Statistics of one phase of one layer (layer is None for whole-model phases)"""
+
+    def __init__(self, phase, layer):
+        self.phase = phase
+        self.layer = layer
+
+        self.count = 0
+
+        self.totalTime = 0.0
+        self.minTime = float("inf")
+        self.maxTime = 0.0
+
+        self.totalAllocatedBytes = 0
+        self.peakAllocatedBytes = 0
+        self.netAllocatedBytes = 0
+        self.netAllocatedBlocks = 0
+
+    def meanTime(self):
+        return self.totalTime / self.count if self.count > 0 else 0.0
+
+    def _add(self, duration):
+        self.count += 1
+
+        self.totalTime += duration
+
+        if duration < self.minTime:
+            self.minTime = duration
+
+        if duration > self.maxTime:
+            self.maxTime = duration
+
+class Profiler:
+    """Collects PhaseStats for the models it is attached to.
+
+    callback, if given, is called as callback(profiler) after every simStep.
+    """
+
+    def __init__(self, trackAllocations = False, callback = None, countAllocations = False):
+        self._trackAllocations = trackAllocations
+        self._countAllocations = countAllocations
+        self._callback = callback
+
+        self._stats = {}
+
+        # (object, method name) pairs with a wrapper installed
+        self._instrumented = []
+
+        self._startedTracing = False
+
+        self._numSteps = 0
+
+    def attach(self, model):
+        """Instruments a Hierarchy or Agent and its layers"""
+        if (self._trackAllocations or self._countAllocations) and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+            self._startedTracing = True
+
+        for l in range(0, len(model._layers)):
+            layer = model._layers[l]
+
+            self._instrument(layer, 'upPass', 'upPass', l)
+            self._instrument(layer, 'downPass', 'downPass', l)
+            self._instrument(layer, 'learn', 'learn', l)
+
+        for methodName, phase in model._profiledPhases():
+            self._instrument(model, methodName, phase, None)
+
+        self._instrumentStep(model)
+
+    def detach(self):
+        """Removes all wrappers, keeping the statistics"""
+        for obj, methodName in self._instrumented:
+            delattr(obj, methodName)
+
+        self._instrumented = []
+
+        if self._startedTracing:
+            tracemalloc.stop()
+
+            self._startedTracing = False
+
+    def reset(self):
+        self._stats = {}
+
+        self._numSteps = 0
+
+    def getStats(self):
+        """Dictionary of PhaseStats keyed by (phase, layer)"""
+        return self._stats
+
+    def getNumSteps(self):
+        return self._numSteps
+
+    def report(self):
+        """Table of the statistics, one line per phase and layer"""
+        lines = [ "%-16s %5s %8s %10s %10s %10s %12s %12s %12s" % ("phase", "layer", "calls", "total ms", "mean us", "max us", "peak bytes", "net bytes", "net blocks") ]
+
+        for stats in self._stats.values():
+            lines.append("%-16s %5s %8d %10.2f %10.2f %10.2f %12d %12d %12d" % (stats.phase, "-" if stats.layer is None else stats.layer, stats.count,
+                stats.totalTime * 1e3, stats.meanTime() * 1e6, stats.maxTime * 1e6, stats.peakAllocatedBytes, stats.netAllocatedBytes, stats.netAllocatedBlocks))
+
+        return "\n".join(lines)
+
+    def _phaseStats(self, phase, layer):
+        key = (phase, layer)
+
+        stats = self._stats.get(key)
+
+        if stats is None:
+            stats = PhaseStats(phase, layer)
+
+            self._stats[key] = stats
+
+        return stats
+
+    def _install(self, obj, methodName, wrapper):
+        setattr(obj, methodName, wrapper)
+
+        self._instrumented.append((obj, methodName))
+
+    def _instrument(self, obj, methodName, phase, layer):
+        method = getattr(obj, methodName)
+
+        profiler = self
+        perfCounter = time.perf_counter
+
+        trackAllocations = self._trackAllocations
+        countAllocations = self._countAllocations
+
+        if not (trackAllocations or countAllocations):
+            def wrapper(*args, **kwargs):
+                start = perfCounter()
+
+                result = method(*args, **kwargs)
+
+                profiler._phaseStats(phase, layer)._add(perfCounter() - start)
+
+                return result
+        else:
+            def wrapper(*args, **kwargs):
+                # Counted outside the traced bytes, as taking the snapshot allocates itself
+                if countAllocations:
+                    numBlocks = _numTracedBlocks()
+
+                if trackAllocations:
+                    tracemalloc.reset_peak()
+
+                    allocated = tracemalloc.get_traced_memory()[0]
+
+                start = perfCounter()
+
+                result = method(*args, **kwargs)
+
+                duration = perfCounter() - start
+
+                stats = profiler._phaseStats(phase, layer)
+
+                stats._add(duration)
+
+                if trackAllocations:
+                    current, peak = tracemalloc.get_traced_memory()
+
+                    stats.totalAllocatedBytes += peak - allocated
+                    stats.peakAllocatedBytes = max(stats.peakAllocatedBytes, peak - allocated)
+                    stats.netAllocatedBytes += current - allocated
+
+                if countAllocations:
+                    stats.netAllocatedBlocks += _numTracedBlocks() - numBlocks
+
+                return result
+
+        self._install(obj, methodName, wrapper)
+
+    def _instrumentStep(self, model):
+        """Times whole steps (their allocations are those of the phases) and calls the callback"""
+        method = model.simStep
+
+        profiler = self
+        perfCounter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perfCounter()
+
+            result = method(*args, **kwargs)
+
+            profiler._phaseStats('simStep', None)._add(perfCounter() - start)
+
+            profiler._numSteps += 1
+
+            if profiler._callback is not None:
+                profiler._callback(profiler)
+
+            return result
+
+        self._install(model, 'simStep', wrapper)
@@ -0,0 +1,78 @@
+"""Pruning the weights of a trained Hierarchy for smaller sparse inference.
+
+Two ways to choose the weights to keep in every weight matrix:
+
+    magnitude   drop the fraction amount of the weights with the smallest
+                magnitude (amount 0.9 keeps the largest 10%)
+    topk        keep the amount weights of largest magnitude in every row
+
+prune() turns every layer into a LayerSparse holding the kept weights in CSC
+form and returns an inference-only Hierarchy of them, which continues from the
+state of the original. It steps with infer(), rollout() and evaluate(), and can
+be saved and loaded as any Hierarchy, but not trained. A pruned Hierarchy can be
+pruned again; the fractions of magnitude pruning always count all entries of
+the full matrices, including the ones pruned before.
+
+Pruning saves memory at any layer size, but only speeds up inference of large
+layers pruned to about 10% of their weights or fewer, see LayerSparse.
+"""
+
+import numpy as np
+from neo.LayerSparse import LayerSparse
+from neo import Fork
+
+def magnitudeMask(weights, amount):
+    """Keeps all but the fraction amount of the entries with the smallest magnitude"""
+    assert(0.0 <= amount < 1.0)
+
+    magnitudes = np.abs(weights)
+
+    numDropped = int(amount * magnitudes.size)
+
+    if numDropped == 0:
+        return np.ones(weights.shape, dtype=bool)
+
+    threshold = np.partition(magnitudes, numDropped - 1, axis=None)[numDropped - 1]
+
+    return magnitudes > threshold
+
+def topKMask(weights, amount):
+    """Keeps the amount entries of largest magnitude in every row"""
+    assert(amount >= 1)
+
+    magnitudes = np.abs(weights)
+
+    if amount >= weights.shape[1]:
+        return np.ones(weights.shape, dtype=bool)
+
+    mask = np.zeros(weights.shape, dtype=bool)
+
+    np.put_along_axis(mask, np.argpartition(-magnitudes, amount - 1, axis=1)[:, :amount], True, axis=1)
+
+    return mask
+
+maskFunctions = { 'magnitude': magnitudeMask, 'topk': topKMask }
+
+def pruneLayer(layer, method, amount):
+    """A LayerSparse of layer with the weights chosen by method and amount"""
+    masks = { name: maskFunctions[method](LayerSparse.denseWeights(layer, name), amount) for name, matrixName in LayerSparse._weightNames }
+
+    return LayerSparse(layer, masks)
+
+def prune(hierarchy, method, amount):
+    """An inference-only copy of hierarchy with its weights pruned by method and amount and stored in CSC form"""
+    assert(method in maskFunctions)
+
+    return Fork.fork(hierarchy, { '_layers': [ pruneLayer(layer, method, amount) for layer in hierarchy._layers ] })
+
+def weightBytes(hierarchy):
+    """Bytes taken by the weights of a dense, local or pruned hierarchy"""
+    total = 0
+
+    for layer in hierarchy._layers:
+        if isinstance(layer, LayerSparse):
+            total += layer.getWeightBytes()
+        else:
+            total += sum(getattr(layer, name).nbytes for name in layer._parameterNames())
+
+    return total
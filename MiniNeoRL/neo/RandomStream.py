@@ -0,0 +1,64 @@
+import numpy as np
+
+class RandomStream:
+    """A seeded random number generator owned by one Hierarchy or Agent
+
+    Wraps a np.random.Generator (PCG64) created from a SeedSequence. Streams
+    made by spawn() are statistically independent of their parent and of each
+    other, so parallel workers (or any other set of models) can each get their
+    own reproducible stream from one seed.
+
+    random() hands out uniform numbers from a block drawn ahead of time, so
+    small per-step draws do not each pay for a call into the generator.
+
+    seed is an int, a SeedSequence, or None to take a seed from the global
+    np.random state (so scripts that call np.random.seed stay reproducible).
+    """
+
+    def __init__(self, seed = None, blockSize = 4096):
+        if seed is None:
+            seed = int(np.random.randint(0, 2**63 - 1, dtype=np.int64))
+
+        seedSequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+
+        # Kept as plain values so that a checkpoint can hold them
+        self._entropy = seedSequence.entropy
+        self._spawnKey = np.array(seedSequence.spawn_key, np.int64)
+        self._numSpawned = seedSequence.n_children_spawned
+
+        self._generator = np.random.Generator(np.random.PCG64(seedSequence))
+
+        self._blockSize = blockSize
+
+        self._block = np.empty(blockSize)
+        self._position = blockSize
+
+    def getGenerator(self):
+        """The underlying Generator, for draws that do not go through the block (such as weight initialization)"""
+        return self._generator
+
+    def random(self, count):
+        """count uniform numbers in [0, 1) as a view of the block, valid until the next call"""
+        if count > self._blockSize:
+            return self._generator.random(count)
+
+        if self._position + count > self._blockSize:
+            self._generator.random(out=self._block)
+
+            self._position = 0
+
+        values = self._block[self._position:self._position + count]
+
+        self._position += count
+
+        return values
+
+    def spawn(self, count):
+        """count new independent streams"""
+        seedSequence = np.random.SeedSequence(self._entropy, spawn_key=tuple(int(k) for k in self._spawnKey), n_children_spawned=self._numSpawned)
+
+        children = seedSequence.spawn(count)
+
+        self._numSpawned = seedSequence.n_children_spawned
+
+        return [ RandomStream(child, self._blockSize) for child in children ]
@@ -0,0 +1,116 @@
+"""Runs the layers of a Hierarchy or Agent concurrently on a thread pool.
+
+NumPy releases the GIL inside its array operations, so layers can run on
+several cores at once. Two modes are supported:
+
+    concurrentLearn   The up and down passes run one layer after another as
+                      before, then the learn calls of all layers run at the same
+                      time. A layer's learn only changes that layer and only
+                      reads the (fixed) states and predictions of its
+                      neighbours, so results are exactly those of simStep
+                      without a scheduler.
+
+    pipelined         Every layer takes its input (the states of the layer
+                      below) and its feed back (the predictions of the layer
+                      above) from the previous step, so all layers run their
+                      whole step at the same time. Signals then travel one layer
+                      per step up and down the hierarchy, which delays the
+                      predictions of deep hierarchies by a few steps; the layer 0
+                      input is not delayed. Results differ from simStep without a
+                      scheduler. An Agent runs its up and down passes pipelined,
+                      updates Q, then runs all learn calls at the same time.
+
+Whether this pays off depends on the layer sizes, the depth and the number of
+cores, since every step hands work to the threads and waits for them (and
+NumPy's BLAS may already use several cores for large layers). Measure with
+MiniNeoRL_Benchmark.py --schedulers.
+
+A model that is given a scheduler with setScheduler() owns it: the scheduler is
+shut down when it is replaced or removed.
+"""
+
+import os
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+class Scheduler:
+    """A thread pool that runs one function per layer and waits for all of them"""
+
+    modes = ('concurrentLearn', 'pipelined')
+
+    def __init__(self, mode = 'concurrentLearn', numThreads = None):
+        assert(mode in Scheduler.modes)
+
+        self._mode = mode
+
+        self._executor = ThreadPoolExecutor(numThreads if numThreads is not None else os.cpu_count())
+
+    def getMode(self):
+        return self._mode
+
+    def map(self, function, count):
+        """Calls function(i) for i in range(count) concurrently, running i = 0 on the calling thread"""
+        futures = [ self._executor.submit(function, i) for i in range(1, count) ]
+
+        try:
+            if count > 0:
+                function(0)
+        finally:
+            # Wait for every call before passing on the first error
+            for future in futures:
+                future.exception()
+
+        for future in futures:
+            future.result()
+
+    def createPipeline(self, layers, zeroFeedBack):
+        """Per layer (input, feedBack, feedBackPrev) copies of the signals of the previous step for mapPipelined.
+
+        The input of layer 0 is None, the top layer's feed back is zeroFeedBack.
+        """
+        pipeline = []
+
+        for l in range(0, len(layers)):
+            input = np.empty_like(layers[l - 1]._states) if l > 0 else None
+
+            if l < len(layers) - 1:
+                feedBack = np.empty_like(layers[l + 1]._predictions)
+                feedBackPrev = np.empty_like(layers[l + 1]._predictions)
+            else:
+                feedBack = feedBackPrev = zeroFeedBack
+
+            pipeline.append((input, feedBack, feedBackPrev))
+
+        return pipeline
+
+    def mapPipelined(self, layers, pipeline, input, learnLayer = None):
+        """Runs the up and down passes of all layers at once on the signals of the previous step.
+
+        input is the layer 0 input of this step. learnLayer, if given, is called
+        as learnLayer(l, feedBackPrev) right after the passes of layer l on the
+        same thread.
+        """
+        # Copy the signals of the previous step, since the layers overwrite their own while the others run
+        for l in range(0, len(layers)):
+            layerInput, feedBack, feedBackPrev = pipeline[l]
+
+            if l > 0:
+                np.copyto(layerInput, layers[l - 1]._states)
+
+            if l < len(layers) - 1:
+                np.copyto(feedBack, layers[l + 1]._predictions)
+                np.copyto(feedBackPrev, layers[l + 1]._predictionsPrev)
+
+        def stepLayer(l):
+            layerInput, feedBack, feedBackPrev = pipeline[l]
+
+            layers[l].upPass(input if l == 0 else layerInput)
+            layers[l].downPass(feedBack, l != 0)
+
+            if learnLayer is not None:
+                learnLayer(l, feedBackPrev)
+
+        self.map(stepLayer, len(layers))
+
+    def shutdown(self):
+        self._executor.shutdown()
@@ -0,0 +1,48 @@
+"""Fixed input sequences shared by the demos, benchmarks and checks"""
+
+# The repeating 4-bit sequence learned by MiniNeoRL_Pred_Demo.py
+demoSequence = [
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 0.0, 0.0, 1.0, 1.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 1.0, 0.0 ],
+        [ 0.0, 0.0, 0.0, 1.0 ],
+        [ 1.0, 0.0, 0.0, 0.0 ],
+        [ 0.0, 1.0, 0.0, 0.0 ]
+    ]
+
@@ -0,0 +1,73 @@
+"""Learning updates restricted to the active units of a layer.
+
+Hidden states are binary with only activeRatio of the units on, so most of the
+dense outer products in learn() are zero. These helpers only touch the rows and
+columns that belong to active (or otherwise nonzero) units, so their cost scales
+with the number of active units rather than with the layer size.
+
+The feed forward and recurrent rules also subtract states.T * weights from every
+row of the weights. That term is identical for all rows, so it is accumulated in
+a separate (1, numColumns) row of offsets instead, and the effective weights are
+weights + offsets. Folding the offsets back in gives the dense weights.
+"""
+
+import numpy as np
+from neo.Workspace import Workspace
+
+def learnCompetitive(weights, offsets, active, pre, rate, workspace = None):
+    """Sparse form of weights += rate * (states * pre.T - states.T * weights) for binary states active at active"""
+    if len(active) == 0:
+        return
+
+    if workspace is None:
+        workspace = Workspace(weights.dtype)
+
+    activeRows = workspace.get('activeRows', (len(active), weights.shape[1]), weights.dtype)
+    projected = workspace.like('projected', offsets)
+
+    np.take(weights, active, axis=0, out=activeRows)
+
+    # states.T * (weights + offsets), taken before the update
+    np.sum(activeRows, axis=0, keepdims=True, out=projected)
+
+    projected += len(active) * offsets
+
+    activeRows += rate * pre.T
+
+    weights[active] = activeRows
+
+    projected *= rate
+
+    offsets -= projected
+
+def learnOuter(weights, post, pre, rate, columns = None, workspace = None):
+    """Sparse form of weights += rate * post * pre.T, only visiting the nonzero entries (columns) of pre"""
+    if columns is None:
+        columns = np.flatnonzero(pre)
+
+    if len(columns) == 0:
+        return
+
+    if workspace is None:
+        workspace = Workspace(weights.dtype)
+
+    activeColumns = workspace.get('activeColumns', (weights.shape[0], len(columns)), weights.dtype)
+    scaled = workspace.like('scaled', post)
+
+    np.take(weights, columns, axis=1, out=activeColumns)
+
+    np.multiply(post, rate, out=scaled)
+
+    product = workspace.get('product', activeColumns.shape, np.result_type(post, pre))
+
+    np.multiply(scaled, pre[columns].T, out=product)
+
+    activeColumns += product
+
+    weights[:, columns] = activeColumns
+
+def fold(weights, offsets):
+    """Moves the accumulated offsets into the weights"""
+    weights += offsets
+
+    offsets[:] = 0.0
@@ -0,0 +1,154 @@
+"""Chunked reading of long input sequences and next-step prediction metrics.
+
+Sequences are read in chunks of input vectors, so a memory mapped array (e.g.
+np.load(path, mmap_mode='r')) of any length is only paged in one chunk at a time,
+and any iterable of vectors is collected into one reused chunk buffer.
+
+PredictionMetrics scores the thresholded predictions of a whole chunk at once.
+Every reportInterval steps it closes a window of rolling metrics.
+"""
+
+import numpy as np
+
+def chunks(data, chunkSize, dtype = np.float64):
+    """Yields consecutive (count, ...) arrays of at most chunkSize input vectors.
+
+    data is an array (read one slice at a time) or an iterable of vectors. Chunks
+    of an iterable share one buffer, so each is only valid until the next.
+    """
+    if isinstance(data, np.ndarray):
+        for start in range(0, len(data), chunkSize):
+            yield np.asarray(data[start:start + chunkSize], dtype)
+
+        return
+
+    buffer = None
+    count = 0
+
+    for item in data:
+        if buffer is None:
+            buffer = np.empty((chunkSize,) + np.shape(item), dtype)
+
+        buffer[count] = item
+
+        count += 1
+
+        if count == chunkSize:
+            yield buffer
+
+            count = 0
+
+    if count > 0:
+        yield buffer[:count]
+
+class PredictionMetrics:
+    """Error rates of thresholded next-step predictions, totalled and per window of reportInterval steps
+
+    A step of a batched hierarchy counts one sample per instance. A sample is
+    wrong if any of its thresholded predictions differs from the (thresholded)
+    input it predicts, a bit is wrong if that prediction differs. callback, if
+    given, is called with the metrics of every closed window.
+    """
+
+    def __init__(self, reportInterval = None, callback = None, threshold = 0.5):
+        self._reportInterval = reportInterval
+        self._callback = callback
+        self._threshold = threshold
+
+        self._numBits = 0
+
+        # Steps scored so far
+        self._step = 0
+
+        self._total = np.zeros(4, np.int64)
+        self._window = np.zeros(4, np.int64)
+
+        self._history = []
+
+        self._totalTime = 0.0
+        self._windowTime = 0.0
+
+    def add(self, predictions, targets, duration = 0.0):
+        """Scores (count, ...) boolean predictions against the (count, ...) inputs they predict, made in duration seconds"""
+        count = len(predictions)
+
+        if count == 0:
+            return
+
+        wrong = predictions != (np.reshape(targets, predictions.shape) > self._threshold)
+
+        # (count, numInputs, numInstances)
+        wrong = wrong.reshape(count, wrong[0].shape[0], -1)
+
+        self._numBits = wrong.shape[1]
+
+        bitErrors = np.count_nonzero(wrong, axis=1)
+
+        # Steps, samples, wrong samples and wrong bits of every step
+        counts = np.empty((count, 4), np.int64)
+
+        counts[:, 0] = 1
+        counts[:, 1] = wrong.shape[2]
+        counts[:, 2] = np.count_nonzero(bitErrors, axis=1)
+        counts[:, 3] = np.sum(bitErrors, axis=1)
+
+        self._total += np.sum(counts, axis=0)
+        self._totalTime += duration
+
+        if self._reportInterval is None:
+            self._step += count
+
+            return
+
+        # Close windows at every report interval within the chunk
+        start = 0
+
+        while start < count:
+            end = min(count, start + self._reportInterval - self._window[0])
+
+            self._window += np.sum(counts[start:end], axis=0)
+
+            self._step += end - start
+
+            self._windowTime += duration * (end - start) / count
+
+            if self._window[0] == self._reportInterval:
+                self._closeWindow()
+
+            start = end
+
+    def finish(self):
+        """Closes the last (partial) window and returns the totals, with the windows under 'history'"""
+        if self._window[0] > 0:
+            self._closeWindow()
+
+        metrics = self._metrics(self._total, self._totalTime)
+
+        metrics['history'] = self._history
+
+        return metrics
+
+    def _metrics(self, counts, duration):
+        steps, samples, wrongSamples, wrongBits = counts
+
+        numBits = samples * self._numBits if samples > 0 else 0
+
+        return {
+            'step': int(self._step),
+            'steps': int(steps),
+            'errorRate': float(wrongSamples / samples) if samples > 0 else 0.0,
+            'bitErrorRate': float(wrongBits / numBits) if numBits > 0 else 0.0,
+            'stepsPerSecond': float(steps / duration) if duration > 0.0 else 0.0
+        }
+
+    def _closeWindow(self):
+        metrics = self._metrics(self._window, self._windowTime)
+
+        self._history.append(metrics)
+
+        if self._callback is not None:
+            self._callback(metrics)
+
+        self._window[:] = 0
+
+        self._windowTime = 0.0
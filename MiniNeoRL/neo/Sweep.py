@@ -0,0 +1,269 @@
+"""Runs Hierarchy and Agent configurations in parallel worker processes.
+
+A sweep is a list of configurations (parameter dictionaries, usually the grid
+of some parameters around the defaults below), each run once per seed. The
+runs are spread over a pool of worker processes:
+
+    pred    Hierarchy.fit on an input sequence, the curve is the error rate of
+            every report window
+    pong    Agent on Pong with bin encoded observations as in the RL demo, the
+            curve is the average reward of every report window
+
+The input sequence and the seeds are copied into shared memory once, and the
+workers read them from there instead of receiving a pickled copy per run.
+Workers are started fresh (spawn) with the BLAS thread count environment
+variables set to blasThreads, so that numProcesses workers do not oversubscribe
+the cores. threadpoolctl, when installed, limits the threads as well.
+
+Every run seeds its own models (see RandomStream), so its results depend only on
+its configuration and seed, not on the worker or the order it ran in.
+
+The per-seed curves of a configuration are averaged into one row of the results
+table, see writeCsv.
+"""
+
+import contextlib
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+import numpy as np
+
+blasThreadVariables = ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS', 'VECLIB_MAXIMUM_THREADS', 'NUMEXPR_NUM_THREADS')
+
+# Parameters of the demos
+predDefaults = {
+    'layerSizes': [ 40, 40, 40 ], 'initMinWeight': -0.01, 'initMaxWeight': 0.01, 'activeRatio': 0.1,
+    'learnEncoderRate': 0.0001, 'learnRecurrentRate': 0.0001, 'learnDecoderRate': 0.001, 'learnBiasRate': 0.001, 'traceDecay': 0.95
+}
+
+pongDefaults = {
+    'layerSizes': [ 50, 50 ], 'initMinWeight': -0.1, 'initMaxWeight': 0.1, 'activeRatio': 0.1, 'encoderSize': 10,
+    'qAlpha': 0.001, 'qGamma': 0.95, 'exploration': 0.05,
+    'learnEncoderRate': 0.001, 'learnRecurrentRate': 0.001, 'learnDecoderRate': 0.01, 'learnBiasRate': 0.01, 'traceDecay': 0.92
+}
+
+defaults = { 'pred': predDefaults, 'pong': pongDefaults }
+
+def gridConfigurations(workload, grid):
+    """Every combination of the values in grid (parameter name to list of values), with the other parameters at their defaults"""
+    for name in grid:
+        assert(name in defaults[workload])
+
+    names = list(grid.keys())
+
+    return [ dict(defaults[workload], **dict(zip(names, values))) for values in itertools.product(*grid.values()) ]
+
+@contextlib.contextmanager
+def blasThreadEnvironment(blasThreads):
+    """Sets the BLAS thread count environment variables for worker processes started inside the with block"""
+    # Spawned workers read the thread counts when they import numpy
+    savedEnvironment = { name: os.environ.get(name) for name in blasThreadVariables }
+
+    for name in blasThreadVariables:
+        os.environ[name] = str(blasThreads)
+
+    try:
+        yield
+    finally:
+        for name, value in savedEnvironment.items():
+            if value is None:
+                del os.environ[name]
+            else:
+                os.environ[name] = value
+
+# threadpoolctl limits of a worker process, see limitBlasThreads
+_blasLimits = []
+
+def limitBlasThreads(blasThreads):
+    """Limits the BLAS threads of the calling worker process with threadpoolctl, when installed"""
+    try:
+        import threadpoolctl
+    except ImportError:
+        return
+
+    # Kept referenced so the limit stays in place
+    _blasLimits.append(threadpoolctl.threadpool_limits(blasThreads))
+
+class SharedArray:
+    """A copy of an array in a named shared memory block, which worker processes attach to by name"""
+
+    def __init__(self, array):
+        array = np.ascontiguousarray(array)
+
+        self._memory = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+
+        self._descriptor = (self._memory.name, array.shape, array.dtype.str)
+
+        np.copyto(np.ndarray(array.shape, array.dtype, buffer=self._memory.buf), array)
+
+    def getDescriptor(self):
+        """(name, shape, dtype) to pass to attach in a worker"""
+        return self._descriptor
+
+    def release(self):
+        self._memory.close()
+        self._memory.unlink()
+
+    @staticmethod
+    def attach(descriptor, writeable = False):
+        """View of a shared array (read-only unless writeable) and the shared memory it lives in, which must be kept alive as long as the view"""
+        name, shape, dtype = descriptor
+
+        memory = shared_memory.SharedMemory(name=name)
+
+        array = np.ndarray(shape, dtype, buffer=memory.buf)
+
+        array.flags.writeable = writeable
+
+        return array, memory
+
+# Shared arrays of a worker process, attached by _initWorker
+_workerArrays = {}
+_workerMemory = []
+
+def _initWorker(descriptors, blasThreads):
+    limitBlasThreads(blasThreads)
+
+    for name, descriptor in descriptors.items():
+        array, memory = SharedArray.attach(descriptor)
+
+        _workerArrays[name] = array
+
+        _workerMemory.append(memory)
+
+def _runPred(config, seed, numSteps, reportInterval):
+    from neo.Hierarchy import Hierarchy
+
+    data = _workerArrays['data']
+
+    h = Hierarchy(data.shape[1], config['layerSizes'], config['initMinWeight'], config['initMaxWeight'], config['activeRatio'], seed=seed)
+
+    metrics = h.fit(data[:numSteps], config['learnEncoderRate'], config['learnRecurrentRate'], config['learnDecoderRate'], config['learnBiasRate'], config['traceDecay'], reportInterval=reportInterval)
+
+    return [ window['errorRate'] for window in metrics['history'] ]
+
+def _runPong(config, seed, numSteps, reportInterval):
+    from neo.Agent import Agent
+    from neo.Encoder import Encoder
+    from neo.Pong import Pong
+
+    # Independent streams for the agent and the environment
+    agentSeed, envSeed = np.random.SeedSequence(seed).spawn(2)
+
+    env = Pong(1, envSeed)
+    encoder = Encoder(Pong.numObservations, config['encoderSize'])
+
+    a = Agent(encoder.getNumOutputs(), 1, config['layerSizes'], config['initMinWeight'], config['initMaxWeight'], config['activeRatio'], seed=agentSeed)
+
+    encoded = np.zeros((encoder.getNumOutputs(), 1))
+
+    rewards = np.zeros(numSteps)
+
+    for t in range(0, numSteps):
+        observations, reward = env.step(a.getActions()[0])
+
+        rewards[t] = reward[0]
+
+        a.simStep(reward[0], config['qAlpha'], config['qGamma'], config['exploration'], encoder.encode(observations, out=encoded),
+            config['learnEncoderRate'], config['learnRecurrentRate'], config['learnDecoderRate'], config['learnBiasRate'], config['traceDecay'])
+
+    return [ float(np.mean(rewards[start:start + reportInterval])) for start in range(0, numSteps, reportInterval) ]
+
+_runners = { 'pred': _runPred, 'pong': _runPong }
+
+def _runTask(task):
+    workload, configIndex, config, seedIndex, numSteps, reportInterval = task
+
+    seed = int(_workerArrays['seeds'][seedIndex])
+
+    start = time.perf_counter()
+
+    curve = _runners[workload](config, seed, numSteps, reportInterval)
+
+    return configIndex, seedIndex, curve, time.perf_counter() - start
+
+def runSweep(workload, configurations, seeds, numSteps, reportInterval = 1000, data = None, numProcesses = None, blasThreads = 1, callback = None):
+    """Runs every configuration once per seed and returns one result row per configuration.
+
+    data is the (numSteps, numInputs) input sequence of the pred workload. Each
+    row holds the configuration, the seed-averaged 'curve', its last value as
+    'final' with its standard deviation over the seeds as 'finalStd', and the
+    summed run time in 'seconds'. callback, if given, is called with
+    (numDone, numTasks) after every finished run.
+    """
+    assert(workload in _runners)
+    assert(workload != 'pred' or (data is not None and len(data) >= numSteps))
+
+    shared = { 'seeds': SharedArray(np.asarray(seeds, np.int64)) }
+
+    if workload == 'pred':
+        shared['data'] = SharedArray(np.asarray(data[:numSteps], np.float64))
+
+    descriptors = { name: array.getDescriptor() for name, array in shared.items() }
+
+    tasks = [ (workload, c, configurations[c], s, numSteps, reportInterval) for c in range(0, len(configurations)) for s in range(0, len(seeds)) ]
+
+    curves = [ [ None ] * len(seeds) for c in range(0, len(configurations)) ]
+    seconds = np.zeros(len(configurations))
+
+    with blasThreadEnvironment(blasThreads):
+        pool = multiprocessing.get_context('spawn').Pool(numProcesses, _initWorker, (descriptors, blasThreads))
+
+    try:
+        numDone = 0
+
+        for configIndex, seedIndex, curve, duration in pool.imap_unordered(_runTask, tasks):
+            curves[configIndex][seedIndex] = curve
+            seconds[configIndex] += duration
+
+            numDone += 1
+
+            if callback is not None:
+                callback(numDone, len(tasks))
+    finally:
+        pool.close()
+        pool.join()
+
+        for array in shared.values():
+            array.release()
+
+    rows = []
+
+    for c in range(0, len(configurations)):
+        seedCurves = np.array(curves[c])
+
+        row = dict(configurations[c])
+
+        row['curve'] = seedCurves.mean(axis=0).tolist()
+        row['final'] = float(seedCurves[:, -1].mean())
+        row['finalStd'] = float(seedCurves[:, -1].std())
+        row['seeds'] = len(seeds)
+        row['seconds'] = float(seconds[c])
+
+        rows.append(row)
+
+    return rows
+
+def writeCsv(rows, path):
+    """Writes result rows as a CSV table, with layer sizes joined by 'x' and the curve as space separated values"""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+
+        names = list(rows[0].keys())
+
+        writer.writerow(names)
+
+        for row in rows:
+            writer.writerow([ formatValue(row[name]) for name in names ])
+
+def formatValue(value):
+    if isinstance(value, list) and all(isinstance(v, int) for v in value):
+        return "x".join(str(v) for v in value)
+
+    if isinstance(value, list):
+        return " ".join("%.4f" % v for v in value)
+
+    return value
@@ -0,0 +1,179 @@
+"""Recording the (input, reward, action) stream of an Agent and replaying it offline.
+
+A trajectory file is a small header followed by fixed size records, one per
+Agent.simStep: the (numInputs, batchSize) input, the batchSize rewards and the
+(numActions, batchSize) exploratory actions the agent took after that step. All
+values are stored as dtype: float32 by default, half the size of float64, in
+which case a float64 agent replays the actions up to their rounding. The writer
+only ever appends whole records, so a file can be extended by later runs, and a
+record cut off by a crash is ignored on reading.
+
+A reader memory maps the records, so replay() only pages in the part it is
+stepping through. replay() feeds the inputs and rewards through an Agent as fast
+as it can step, forcing the logged actions instead of drawing its own (see
+Agent.simStep), so the agent learns as if it had acted in the recorded run.
+"""
+
+import os
+import struct
+import time
+import numpy as np
+
+formatMagic = b"NEOTRAJ\0"
+formatVersion = 1
+
+# Magic, version, numInputs, numActions, batchSize and dtype
+headerFormat = "<8sIIII8s"
+headerSize = struct.calcsize(headerFormat)
+
+def recordDtype(numInputs, numActions, batchSize, dtype):
+    """The structured dtype of one record"""
+    return np.dtype([ ('input', dtype, (numInputs, batchSize)), ('reward', dtype, (batchSize,)), ('actions', dtype, (numActions, batchSize)) ])
+
+def _readHeader(f):
+    magic, version, numInputs, numActions, batchSize, dtype = struct.unpack(headerFormat, f.read(headerSize))
+
+    if magic != formatMagic:
+        raise ValueError("not a MiniNeoRL trajectory")
+
+    if version > formatVersion:
+        raise ValueError("trajectory format version %d is newer than the supported version %d" % (version, formatVersion))
+
+    return numInputs, numActions, batchSize, np.dtype(dtype.rstrip(b"\0").decode())
+
+class TrajectoryWriter:
+    """Appends the steps of an Agent to a trajectory file
+
+    Records are collected in a buffer of bufferSize records and written when it
+    is full, on flush() and on close(). If path already holds a trajectory, its
+    shape and dtype must match and the new records are appended to it.
+    """
+
+    def __init__(self, path, numInputs, numActions, batchSize = 1, dtype = np.float32, bufferSize = 1024):
+        dtype = np.dtype(dtype)
+
+        self._recordDtype = recordDtype(numInputs, numActions, batchSize, dtype)
+
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                assert(_readHeader(f) == (numInputs, numActions, batchSize, dtype))
+
+            # Drop a record cut off by a crash
+            numRecords = (os.path.getsize(path) - headerSize) // self._recordDtype.itemsize
+
+            self._file = open(path, "r+b")
+            self._file.truncate(headerSize + numRecords * self._recordDtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            self._file.write(struct.pack(headerFormat, formatMagic, formatVersion, numInputs, numActions, batchSize, dtype.str.encode()))
+
+        self._buffer = np.zeros(bufferSize, self._recordDtype)
+        self._count = 0
+
+    def write(self, input, reward, actions):
+        """Adds one step: the input and reward passed to simStep and the actions the agent took after it (Agent.getActions())"""
+        record = self._buffer[self._count]
+
+        record['input'] = np.reshape(input, record['input'].shape)
+        record['reward'] = np.reshape(reward, record['reward'].shape)
+        record['actions'] = np.reshape(actions, record['actions'].shape)
+
+        self._count += 1
+
+        if self._count == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records"""
+        self._buffer[:self._count].tofile(self._file)
+        self._file.flush()
+
+        self._count = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+class TrajectoryReader:
+    """Memory mapped records of a trajectory file"""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._numInputs, self._numActions, self._batchSize, self._dtype = _readHeader(f)
+
+        dtype = recordDtype(self._numInputs, self._numActions, self._batchSize, self._dtype)
+
+        numRecords = (os.path.getsize(path) - headerSize) // dtype.itemsize
+
+        self._records = np.memmap(path, dtype, 'r', headerSize, (numRecords,)) if numRecords > 0 else np.zeros(0, dtype)
+
+    def getNumRecords(self):
+        return len(self._records)
+
+    def getNumInputs(self):
+        return self._numInputs
+
+    def getNumActions(self):
+        return self._numActions
+
+    def getBatchSize(self):
+        return self._batchSize
+
+    def getInputs(self):
+        """(numRecords, numInputs, batchSize) inputs"""
+        return self._records['input']
+
+    def getRewards(self):
+        """(numRecords, batchSize) rewards"""
+        return self._records['reward']
+
+    def getActions(self):
+        """(numRecords, numActions, batchSize) actions"""
+        return self._records['actions']
+
+def replay(agent, reader, qAlpha, qGamma, learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay, start = 0, count = None, chunkSize = 1024):
+    """Steps agent through count records of reader from start on (all remaining by default) with the logged actions.
+
+    The records are converted to the agent's dtype chunkSize at a time. Returns
+    the number of 'steps', the 'seconds' they took, 'stepsPerSecond' and the
+    'actionError', the mean absolute difference between the agent's own
+    (unexplored) actions and the logged ones, which shows how far its policy is
+    from the recorded one.
+    """
+    assert(reader.getNumInputs() == agent._numInputs and reader.getNumActions() == agent._numActions and reader.getBatchSize() == agent._batchSize)
+
+    end = reader.getNumRecords() if count is None else min(reader.getNumRecords(), start + count)
+
+    actionError = 0.0
+
+    startTime = time.perf_counter()
+
+    for chunkStart in range(start, end, chunkSize):
+        chunkEnd = min(end, chunkStart + chunkSize)
+
+        inputs = np.asarray(reader.getInputs()[chunkStart:chunkEnd], agent._dtype)
+        rewards = np.asarray(reader.getRewards()[chunkStart:chunkEnd], agent._dtype)
+        actions = np.asarray(reader.getActions()[chunkStart:chunkEnd], agent._dtype)
+
+        for t in range(0, chunkEnd - chunkStart):
+            agent.simStep(rewards[t], qAlpha, qGamma, 0.0, inputs[t], learnEncoderRate, learnRecurrentRate, learnDecoderRate, learnBiasRate, traceDecay, actions[t])
+
+            actionError += np.mean(np.abs(agent._actions - actions[t]))
+
+    seconds = time.perf_counter() - startTime
+
+    steps = max(0, end - start)
+
+    return {
+        'steps': steps,
+        'seconds': seconds,
+        'stepsPerSecond': steps / seconds if seconds > 0.0 else 0.0,
+        'actionError': float(actionError / steps) if steps > 0 else 0.0
+    }
@@ -0,0 +1,45 @@
+import math
+import numpy as np
+
+class Workspace:
+    """Scratch arrays that are allocated on first use and reused by later steps"""
+
+    def __init__(self, dtype = np.float64):
+        self._dtype = dtype
+
+        self._arrays = {}
+
+    def get(self, name, shape, dtype = None):
+        """Array of the given shape, one per (name, shape, dtype)"""
+        dtype = np.dtype(self._dtype if dtype is None else dtype)
+
+        key = (name, shape, dtype)
+
+        array = self._arrays.get(key)
+
+        if array is None:
+            array = np.empty(shape, dtype)
+
+            self._arrays[key] = array
+
+        return array
+
+    def like(self, name, array):
+        return self.get(name, array.shape, array.dtype)
+
+    def view(self, name, shape, dtype = None):
+        """Array of the given shape carved out of one flat buffer per name, so it shares memory with every other view of that name"""
+        dtype = np.dtype(self._dtype if dtype is None else dtype)
+
+        size = math.prod(shape)
+
+        key = (name, dtype)
+
+        buffer = self._arrays.get(key)
+
+        if buffer is None or buffer.size < size:
+            buffer = np.empty(size, dtype)
+
+            self._arrays[key] = buffer
+
+        return buffer[:size].reshape(shape)
@@ -0,0 +1,22 @@
+import numpy as np
+from neo.Hierarchy import Hierarchy
+from neo.Profiler import Profiler
+
+def test_tracksBytesAndCountsBlocks():
+    h = Hierarchy(4, [ 20, 20 ], -0.01, 0.01, 0.1, inPlace=False, seed=0)
+
+    profiler = Profiler(trackAllocations=True, countAllocations=True)
+
+    h.setProfiler(profiler)
+
+    for i in range(0, 5):
+        h.simStep(np.ones((4, 1)), 0.0001, 0.0001, 0.001, 0.001, 0.95)
+
+    h.setProfiler(None)
+
+    stats = [ s for s in profiler.getStats().values() if s.phase != 'simStep' ]
+
+    assert(sum(s.totalAllocatedBytes for s in stats) > 0)
+    assert(max(s.peakAllocatedBytes for s in stats) > 0)
+    assert(sum(s.netAllocatedBytes for s in stats) != 0)
+    assert(sum(abs(s.netAllocatedBlocks) for s in stats) > 0)